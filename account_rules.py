@@ -0,0 +1,46 @@
+import random
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+
+# ==================== Account Opening Rules ====================
+# Field checks shared by the BankApp forms and bulk_open.py, so a customer
+# or account accepted in bulk would also pass the form.
+
+ACCOUNT_TYPES = ("Savings", "Current")
+GENDERS = ("Male", "Female", "Other")
+MAX_AMOUNT = Decimal("99999999.99")     # what a DECIMAL(10,2) column holds
+CENT = Decimal("0.01")
+
+
+def generate_ifsc():
+    return f"IFSC{random.randint(1000, 9999)}"
+
+
+def is_valid_date(date_text):
+    try:
+        datetime.strptime(date_text, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+
+def is_positive_amount(text):
+    # Finite, in whole paise and small enough for the balance column
+    try:
+        val = Decimal(str(text).strip())
+    except InvalidOperation:
+        return False
+    return val.is_finite() and 0 < val <= MAX_AMOUNT and val == val.quantize(CENT)
+
+
+def sanitize_amount(text):
+    return f"{Decimal(str(text).strip()):.2f}"
+
+
+def is_valid_mobile(m):
+    return m.isdigit() and len(m) == 10
+
+
+def is_valid_pin(pin):
+    return pin.isdigit() and 4 <= len(pin) <= 10
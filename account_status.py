@@ -0,0 +1,214 @@
+import sys
+import uuid
+import getpass
+import argparse
+
+import audit
+import storage
+import outbox
+
+
+# ==================== Account Status Changes ====================
+# Blocks or unblocks many accounts at once (a fraud incident) as well as the
+# single account on the employee form. Accounts are picked by a selector or
+# a list, then changed CHUNK_SIZE at a time, one transaction per chunk:
+# the chunk's rows are locked, every real change is written to status_audit
+# under one batch id, and a set-based UPDATE flips them. Each change is also
+# published as a StatusChanged event (see outbox.py) for downstream
+# consumers, and listeners in this process are told at once. A BankApp in
+# another process finds out when its customer next opens a page (it reads
+# accounts.status again there), not immediately.
+#
+#   python account_status.py block --ifsc IFSC1234 --reason "Branch breach"
+#   python account_status.py block --paid-to BNK12345 --reason "Mule account"
+#   python account_status.py block --file flagged.txt --reason "Case 88"
+#   python account_status.py undo <batch id>
+
+CHUNK_SIZE = 500
+STATUSES = ("Active", "Blocked")
+
+# name -> predicate on accounts
+SELECTORS = {
+    "ifsc": "ifsc = %s",
+    "customer": "cust_id = %s",
+    # accounts with a transfer to the given one recorded in payees, i.e.
+    # made since payees was added: the ledger does not say who older
+    # transfers went to (see velocity.py)
+    "paid_to": "account_no IN (SELECT account_no FROM payees WHERE payee_no = %s)",
+}
+
+_listeners = []
+
+
+def subscribe(fn):
+    # fn(account_nos, status) runs after each committed chunk
+    _listeners.append(fn)
+
+
+def unsubscribe(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def _notify(accounts, status):
+    for fn in list(_listeners):
+        try:
+            fn(accounts, status)
+        except Exception as e:
+            print("Status listener failed:", e)
+
+
+def select(db, selector, value, chunk=CHUNK_SIZE):
+    # Matching account numbers, read in keyset pages so no query runs long
+    where = SELECTORS[selector]
+    cur = db.cursor()
+    last = ""
+    while True:
+        cur.execute(f"SELECT account_no FROM accounts WHERE {where} AND account_no > %s "
+                    f"ORDER BY account_no LIMIT %s", (value, last, chunk))
+        page = [r[0] for r in cur.fetchall()]
+        db.commit()
+        if not page:
+            return
+        yield from page
+        last = page[-1]
+
+
+def read_accounts(path):
+    # One account number per line (or the first CSV column); # starts a comment
+    accounts = []
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            acc = line.split("#", 1)[0].split(",", 1)[0].strip()
+            if acc:
+                accounts.append(acc)
+    return accounts
+
+
+def _chunks(accounts, size):
+    chunk = []
+    for acc in accounts:
+        chunk.append(acc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def apply(db, status, accounts, reason, actor, chunk=CHUNK_SIZE, batch_id=None, on_chunk=None, only_from=None):
+    # Returns (batch_id, changed, unchanged, missing). With only_from, just
+    # the accounts currently in that status change; the rest count as unchanged.
+    if status not in STATUSES:
+        raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+    batch_id = batch_id or uuid.uuid4().hex[:16]
+    changed = unchanged = missing = 0
+    cur = db.cursor()
+    for part in _chunks(dict.fromkeys(accounts), chunk):
+        marks = ",".join(["%s"] * len(part))
+        try:
+            cur.execute(f"SELECT account_no, status FROM accounts WHERE account_no IN ({marks}) FOR UPDATE", part)
+            current = dict(cur.fetchall())
+            flip = [(acc, old) for acc, old in current.items()
+                    if old != status and (only_from is None or old == only_from)]
+            if flip:
+                cur.executemany("""
+                    INSERT INTO status_audit(batch_id, account_no, old_status, new_status, reason, actor)
+                    VALUES (%s,%s,%s,%s,%s,%s)
+                """, [(batch_id, acc, old, status, reason, actor) for acc, old in flip])
+                accs = [acc for acc, _ in flip]
+                cur.execute(f"UPDATE accounts SET status=%s WHERE account_no IN ({','.join(['%s'] * len(accs))})",
+                            [status] + accs)
+                outbox.publish_many(cur, [("StatusChanged", acc, {"old": old, "new": status, "reason": reason,
+                                                                  "batch": batch_id})
+                                          for acc, old in flip])
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        changed += len(flip)
+        unchanged += len(current) - len(flip)
+        missing += len(part) - len(current)
+        if flip:
+            audit.record("status_change", actor, batch_id, status=status, accounts=len(flip), reason=reason,
+                         first=flip[0][0])
+            _notify([acc for acc, _ in flip], status)
+        if on_chunk:
+            on_chunk(changed, unchanged, missing)
+    return batch_id, changed, unchanged, missing
+
+
+def undo(db, batch_id, actor, chunk=CHUNK_SIZE):
+    # Puts the accounts of a batch back to the status they had before. An
+    # account changed again since (by another batch or the employee form)
+    # keeps its newer status. Returns (undo batch id, restored, skipped).
+    cur = db.cursor()
+    cur.execute("SELECT account_no, old_status, new_status FROM status_audit WHERE batch_id=%s", (batch_id,))
+    rows = cur.fetchall()
+    db.commit()
+    if not rows:
+        raise ValueError(f"No status changes recorded for batch {batch_id}")
+    by_change = {}
+    for acc, old, new in rows:
+        by_change.setdefault((old, new), []).append(acc)
+    undo_id = uuid.uuid4().hex[:16]
+    restored = skipped = 0
+    for (old, new), accounts in by_change.items():
+        _, changed, unchanged, missing = apply(db, old, accounts, f"undo {batch_id}", actor, chunk, undo_id,
+                                               only_from=new)
+        restored += changed
+        skipped += unchanged + missing
+    return undo_id, restored, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Block or unblock accounts in bulk")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for cmd in ("block", "unblock"):
+        p = sub.add_parser(cmd, help=f"{cmd} the selected accounts")
+        pick = p.add_mutually_exclusive_group(required=True)
+        pick.add_argument("--ifsc")
+        pick.add_argument("--customer", type=int, metavar="CUST_ID")
+        pick.add_argument("--paid-to", metavar="ACCOUNT",
+                          help="accounts with a transfer to this one since payees were recorded")
+        pick.add_argument("--file", help="account numbers, one per line")
+        pick.add_argument("--accounts", nargs="+")
+        p.add_argument("--reason", help="recorded in status_audit (required unless --dry-run)")
+        p.add_argument("--dry-run", action="store_true", help="only count the selected accounts")
+        p.add_argument("--chunk", type=int, default=CHUNK_SIZE)
+    p = sub.add_parser("undo", help="restore the statuses a batch changed")
+    p.add_argument("batch")
+    parser.add_argument("--actor", default=getpass.getuser())
+    args = parser.parse_args(argv)
+    if args.cmd in ("block", "unblock") and not args.dry_run and not args.reason:
+        parser.error("--reason is required")
+
+    db = storage.connect()
+    try:
+        if args.cmd == "undo":
+            undo_id, restored, skipped = undo(db, args.batch, args.actor)
+            print(f"Batch {undo_id}: {restored:,} accounts restored, {skipped:,} changed since and left as they are")
+            return 0
+        status = "Blocked" if args.cmd == "block" else "Active"
+        if args.file:
+            accounts = read_accounts(args.file)
+        elif args.accounts:
+            accounts = args.accounts
+        else:
+            selector = next(s for s in SELECTORS if getattr(args, s) is not None)
+            accounts = list(select(db, selector, getattr(args, selector), args.chunk))
+        if args.dry_run:
+            print(f"{len(accounts):,} accounts selected")
+            return 0
+        batch_id, changed, unchanged, missing = apply(
+            db, status, accounts, args.reason, args.actor, args.chunk,
+            on_chunk=lambda c, u, m: print(f"  {c:,} changed, {u:,} already {status}, {m:,} not found"))
+    finally:
+        db.close()
+    print(f"Batch {batch_id}: {changed:,} accounts {status.lower()}, {unchanged:,} already {status.lower()}, "
+          f"{missing:,} not found")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
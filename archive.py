@@ -0,0 +1,149 @@
+import sys
+import time
+import argparse
+
+import storage
+import statements
+import rollups
+
+
+# ==================== Ledger Archival ====================
+# transactions only grows, so cold rows are moved to transactions_archive in
+# txn_id ranges. The highest archived txn_id is kept in rollup_watermark
+# under WATERMARK: every row at or below it lives in the archive, every row
+# above it in transactions. History reads go through the functions below,
+# which read the hot table first and only touch the archive when the
+# answer needs older rows.
+#
+# Partitioning transactions itself is not an option on MySQL: InnoDB does
+# not partition tables that carry foreign keys.
+#
+#   python archive.py --days 90          # move rows older than 90 days
+#   python archive.py --days 90 --dry-run
+
+WATERMARK = "transactions_archive"
+ARCHIVE_AFTER_DAYS = 180
+BATCH_SIZE = 10000
+
+_COLUMNS = "txn_id, account_no, cust_name, txn_type, amount, txn_date"
+
+
+def watermark(db):
+    cur = db.cursor()
+    cur.execute("SELECT last_txn_id FROM rollup_watermark WHERE name=%s", (WATERMARK,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def _batch_end(cur, last, batch, cutoff, limit):
+    # Last txn_id of the next batch that is older than cutoff
+    cur.execute("SELECT txn_id FROM transactions WHERE txn_id > %s ORDER BY txn_id LIMIT 1 OFFSET %s",
+                (last, batch - 1))
+    row = cur.fetchone()
+    upper = row[0] if row else limit
+    upper = min(upper, limit)
+    if upper <= last:
+        return None
+    cur.execute("SELECT MAX(txn_id) FROM transactions WHERE txn_id > %s AND txn_id <= %s AND txn_date < %s",
+                (last, upper, cutoff))
+    return cur.fetchone()[0]
+
+
+def archive(db, days=ARCHIVE_AFTER_DAYS, batch=BATCH_SIZE, dry_run=False, on_batch=None):
+    # Returns (rows moved, seconds)
+    t0 = time.perf_counter()
+    cutoff = storage.epoch_to_db_time(time.time() - days * 86400)
+    # Rollups fold by txn_id from transactions: never archive past their watermark
+    rollups.refresh(db)
+    cur = db.cursor()
+    cur.execute("SELECT last_txn_id FROM rollup_watermark WHERE name=%s", (rollups.WATERMARK,))
+    row = cur.fetchone()
+    limit = row[0] if row else 0
+
+    moved, last = 0, None
+    while True:
+        locked = rollups.lock_watermark(cur, WATERMARK)
+        if last is None or not dry_run:
+            last = locked
+        hi = _batch_end(cur, last, batch, cutoff, limit)
+        if hi is None:
+            db.commit()
+            break
+        if dry_run:
+            cur.execute("SELECT COUNT(*) FROM transactions WHERE txn_id > %s AND txn_id <= %s", (last, hi))
+            count = cur.fetchone()[0]
+            db.rollback()
+        else:
+            cur.execute(f"""
+                INSERT INTO transactions_archive({_COLUMNS})
+                SELECT {_COLUMNS} FROM transactions WHERE txn_id > %s AND txn_id <= %s
+            """, (last, hi))
+            count = cur.rowcount
+            cur.execute("DELETE FROM transactions WHERE txn_id > %s AND txn_id <= %s", (last, hi))
+            cur.execute("UPDATE rollup_watermark SET last_txn_id=%s WHERE name=%s", (hi, WATERMARK))
+            db.commit()
+        moved += count
+        last = hi
+        if on_batch:
+            on_batch(hi, moved)
+    return moved, time.perf_counter() - t0
+
+
+# ==================== History reads ====================
+def account_history(db, account_no):
+    # Full history of one account, oldest first, across archive and hot rows
+    rows = statements.fetch_all(db, "account_history", (account_no,))
+    if watermark(db):
+        rows = statements.fetch_all(db, "account_history_archive", (account_no,)) + list(rows)
+    return rows
+
+
+def recent_history(db, account_no, n=5):
+    # Latest n (txn_type, amount, txn_date) of one account, newest first
+    rows = list(statements.fetch_all(db, "recent_history", (account_no, n)))
+    if len(rows) < n and watermark(db):
+        rows += statements.fetch_all(db, "recent_history_archive", (account_no, n - len(rows)))
+    return rows
+
+
+def all_history(db, limit=200):
+    # Oldest `limit` ledger rows, for the unfiltered transactions page
+    cur = db.cursor()
+    rows = []
+    if watermark(db):
+        cur.execute(f"""
+            SELECT {_COLUMNS} FROM transactions_archive
+            ORDER BY txn_date ASC, txn_id ASC
+            LIMIT %s
+        """, (limit,))
+        rows = cur.fetchall()
+    if len(rows) < limit:
+        cur.execute(f"""
+            SELECT {_COLUMNS} FROM transactions
+            ORDER BY txn_date ASC, txn_id ASC
+            LIMIT %s
+        """, (limit - len(rows),))
+        rows = list(rows) + cur.fetchall()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move cold transactions to transactions_archive")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive rows older than this")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="count the rows without moving them")
+    args = parser.parse_args(argv)
+
+    db = storage.connect()
+    try:
+        moved, seconds = archive(db, args.days, args.batch, args.dry_run,
+                                 lambda hi, n: print(f"  up to txn {hi}: {n:,} rows"))
+    finally:
+        db.close()
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"{verb} {moved:,} rows in {seconds:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+import tracing
+import banking
+import statements
+import benchmark
+
+
+# ==================== Async Data Access ====================
+# asyncio front end for the blocking drivers. Calls are handed to a thread
+# pool the size of the connection pool, so only that many run against the
+# database at a time, while any number of coroutines can be waiting on them.
+# Backpressure is explicit: at most max_inflight calls are admitted (running
+# or queued for a thread); past that, callers wait up to admit_timeout
+# seconds and then get Overloaded instead of growing the queue without
+# bound. No async MySQL driver is needed.
+#
+#   db = AsyncBank()
+#   await db.post(acc, name, pin, "100", "Deposit", key=key)
+#   rows = await db.history(acc)
+
+class Overloaded(banking.Unavailable):
+    pass
+
+
+class AsyncBank:
+    def __init__(self, backend=None, threads=None, max_inflight=1000, admit_timeout=5.0, engine=None):
+        self.backend = backend or storage.get_backend()
+        if threads is None:
+            threads = self.backend.pool.size if self.backend.pool else 8
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="async-db")
+        self.max_inflight = max_inflight
+        self.admit_timeout = admit_timeout
+        self.engine = engine
+        self._admit = None
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.rejected = 0
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    # -------------------- Plumbing --------------------
+    def _call(self, fn, args, kwargs):
+        # Runs on a pool thread with its own connection
+        try:
+            db = tracing.connect(self.backend.connect)
+        except storage.DB_ERRORS as e:
+            raise banking.Unavailable(f"Database unreachable: {e}")
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    async def run(self, fn, *args, **kwargs):
+        # fn(db, *args, **kwargs) on a pool thread, behind the admission limit
+        if self._admit is None:
+            self._admit = asyncio.Semaphore(self.max_inflight)
+        try:
+            await asyncio.wait_for(self._admit.acquire(), self.admit_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(f"Too many operations in flight ({self.max_inflight})")
+        self.inflight += 1
+        self.peak_inflight = max(self.peak_inflight, self.inflight)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._call, fn, args, kwargs)
+        finally:
+            self.inflight -= 1
+            self._admit.release()
+
+    # -------------------- Queries --------------------
+    async def fetch_one(self, name, params):
+        return await self.run(statements.fetch_one, name, params)
+
+    async def fetch_all(self, name, params):
+        return await self.run(statements.fetch_all, name, params)
+
+    async def account_identity(self, acc):
+        return await self.fetch_one("account_identity", (acc,))
+
+    async def balance(self, acc, pin):
+        return await self.run(banking.balance, acc, pin)
+
+    async def history(self, acc=None, limit=200):
+        return await self.run(banking.history, acc, limit)
+
+    # -------------------- Postings --------------------
+    async def post(self, acc, name, pin, amount, op, key=None, message=None):
+        return await self.run(banking.post, acc, name, pin, amount, op,
+                              key=key, engine=self.engine, message=message)
+
+    async def transfer(self, acc_from, name, pin, acc_to, amount, key=None):
+        return await self.run(banking.transfer, acc_from, name, pin, acc_to, amount,
+                              key=key, engine=self.engine)
+
+
+# ==================== Benchmark ====================
+# Same mix of operations, `concurrency` callers at once: one OS thread per
+# caller (the blocking path) against one coroutine per caller on AsyncBank.
+
+def _operation(rnd, accounts):
+    kind = rnd.random()
+    acc = rnd.choice(accounts)
+    if kind < 0.5:
+        return banking.post, (acc, "Bench", benchmark.BENCH_PIN, "1.00", "Deposit")
+    if kind < 0.8:
+        return banking.balance, (acc, benchmark.BENCH_PIN)
+    return banking.history, (acc, 20)
+
+
+def run_threaded(backend, accounts, ops, concurrency, seed=42):
+    rnd = random.Random(seed)
+    work = [_operation(rnd, accounts) for _ in range(ops)]
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    it = iter(work)
+
+    def caller():
+        while True:
+            with lock:
+                item = next(it, None)
+            if item is None:
+                return
+            fn, args = item
+            t0 = time.perf_counter()
+            try:
+                db = backend.connect()
+                try:
+                    fn(db, *args)
+                finally:
+                    db.close()
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            with lock:
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=caller) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0, latencies, errors[0], concurrency
+
+
+async def _run_async(backend, accounts, ops, concurrency, threads, seed):
+    rnd = random.Random(seed)
+    work = [_operation(rnd, accounts) for _ in range(ops)]
+    bank = AsyncBank(backend, threads=threads, max_inflight=concurrency, admit_timeout=60)
+    latencies, errors = [], 0
+    it = iter(work)
+
+    async def caller():
+        nonlocal errors
+        for fn, args in it:
+            t0 = time.perf_counter()
+            try:
+                await bank.run(fn, *args)
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    bank.close()
+    return elapsed, latencies, errors, bank.threads
+
+
+def run_async(backend, accounts, ops, concurrency, threads, seed=42):
+    return asyncio.run(_run_async(backend, accounts, ops, concurrency, threads, seed))
+
+
+def _summary(name, result):
+    elapsed, lat, errors, threads = result
+    lat = sorted(lat)
+    n = len(lat)
+    p = lambda q: lat[min(int(q * n), n - 1)] if n else 0.0
+    print(f"{name:<10}{threads:>8}{n / elapsed:>10,.0f}{p(0.5):>9.1f}{p(0.99):>9.1f}{errors:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the async access path with one thread per caller")
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=1000, help="callers in flight")
+    parser.add_argument("--threads", type=int, default=8, help="DB threads behind AsyncBank")
+    parser.add_argument("--accounts", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    backend = storage.get_backend()
+    accounts = benchmark.seed(backend, args.accounts)
+    print(f"{args.ops:,} ops, {args.concurrency:,} callers in flight")
+    print(f"{'path':<10}{'threads':>8}{'ops/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    _summary("threaded", run_threaded(backend, accounts, args.ops, args.concurrency))
+    _summary("async", run_async(backend, accounts, args.ops, args.concurrency, args.threads))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
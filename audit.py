@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+from collections import deque
+
+import config
+import storage
+
+
+# ==================== Audit Log ====================
+# Who did what and when: logins, PIN and status changes, postings.
+# record() is the only thing the hot paths call. It appends one tuple to an
+# in-memory deque (append/popleft are atomic, so no lock is taken) and never
+# does I/O or raises. A background thread drains the deque every
+# flush_ms in batches into the append-only audit_log table or a rotated
+# JSON-lines file. If the table cannot be written, the batch goes to the
+# file instead of being lost. The buffer is bounded: past MAX_BUFFERED
+# entries new ones are counted in `dropped` rather than slowing the caller.
+#
+#   [audit]
+#   sink = table        # table, file or off
+#   path = audit.log
+#
+#   python audit.py tail --limit 50
+
+BATCH_SIZE = 1000
+MAX_BUFFERED = 100000
+
+_cfg = config.get().audit
+_enabled = _cfg.sink != "off"
+_buffer = deque()
+_flusher = None
+_start_lock = threading.Lock()
+dropped = 0
+
+
+def record(action, actor=None, target=None, outcome="ok", **details):
+    global dropped
+    if not _enabled:
+        return
+    if _flusher is None:
+        start()
+    if len(_buffer) >= MAX_BUFFERED:
+        dropped += 1
+        return
+    _buffer.append((time.time(), actor, action, target, outcome, details or None))
+
+
+def pending():
+    return len(_buffer)
+
+
+# -------------------- Sinks --------------------
+class TableSink:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def write(self, entries):
+        db = self.backend.connect()
+        try:
+            cur = db.cursor()
+            cur.executemany("""
+                INSERT INTO audit_log(logged_at, actor, action, target, outcome, details)
+                VALUES (%s,%s,%s,%s,%s,%s)
+            """, [(storage.epoch_to_db_time(ts, self.backend), actor, action, target, outcome[:100],
+                   json.dumps(details, default=str) if details else None)
+                  for ts, actor, action, target, outcome, details in entries])
+            db.commit()
+        finally:
+            db.close()
+
+
+class RotatingFileSink:
+    # JSON lines; path -> path.1 -> ... -> path.<backups> once max_bytes is reached
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, entries):
+        data = "".join(json.dumps({"at": round(ts, 6), "actor": actor, "action": action, "target": target,
+                                   "outcome": outcome, "details": details}, default=str) + "\n"
+                       for ts, actor, action, target, outcome, details in entries).encode("utf-8")
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# -------------------- Flusher --------------------
+class Flusher(threading.Thread):
+    def __init__(self, sink, interval, fallback=None):
+        super().__init__(name="audit-flusher", daemon=True)
+        self.sink = sink
+        self.fallback = fallback
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.written = 0
+
+    def flush(self):
+        # Only this thread takes from the buffer
+        while _buffer:
+            batch = []
+            try:
+                while len(batch) < BATCH_SIZE:
+                    batch.append(_buffer.popleft())
+            except IndexError:
+                pass
+            try:
+                self.sink.write(batch)
+            except (OSError,) + storage.DB_ERRORS as e:
+                if self.fallback is None:
+                    _buffer.extendleft(reversed(batch))   # retry on the next tick
+                    print("Audit flush failed:", e)
+                    return
+                self.fallback.write(batch)
+            self.written += len(batch)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print("Audit flush failed:", e)
+        self.flush()
+
+
+def _default_sinks():
+    file_sink = RotatingFileSink(_cfg.path, _cfg.max_bytes, _cfg.backups)
+    if _cfg.sink == "file":
+        return file_sink, None
+    return TableSink(storage.get_backend()), file_sink
+
+
+def start(sink=None, fallback=None):
+    # Called by the first record(); an explicit sink also turns recording on
+    global _flusher, _enabled
+    with _start_lock:
+        if _flusher is not None:
+            return _flusher
+        if sink is None:
+            sink, fallback = _default_sinks()
+        else:
+            _enabled = True
+        _flusher = Flusher(sink, _cfg.flush_ms / 1000, fallback)
+        _flusher.start()
+        atexit.register(stop)
+        return _flusher
+
+
+def stop():
+    # Flushes what is left; safe to call more than once
+    global _flusher
+    with _start_lock:
+        flusher, _flusher = _flusher, None
+    if flusher is not None:
+        flusher.stop()
+        flusher.join()
+
+
+# -------------------- Reading --------------------
+def tail(db, limit=50, action=None, actor=None):
+    cur = db.cursor()
+    where, params = [], []
+    if action:
+        where.append("action=%s")
+        params.append(action)
+    if actor:
+        where.append("actor=%s")
+        params.append(actor)
+    cur.execute(f"""
+        SELECT logged_at, actor, action, target, outcome, details FROM audit_log
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY audit_id DESC LIMIT %s
+    """, params + [limit])
+    return cur.fetchall()[::-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read the audit log")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("tail", help="show the latest entries from the audit_log table")
+    p.add_argument("--limit", type=int, default=50)
+    p.add_argument("--action")
+    p.add_argument("--actor")
+    args = parser.parse_args(argv)
+
+    db = storage.connect()
+    try:
+        for logged_at, actor, action, target, outcome, details in tail(db, args.limit, args.action, args.actor):
+            print(f"{logged_at}  {actor or '-':<24}{action:<18}{target or '-':<18}{outcome}"
+                  + (f"  {details}" if details else ""))
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+from decimal import Decimal, InvalidOperation
+
+import audit
+import storage
+import statements
+import idempotency
+import outbox
+import velocity
+import archive
+import hot_accounts
+
+
+# ==================== Banking Operations ====================
+# The teller money path without any Tk: every function takes an open
+# connection, raises BankError with the message a teller should see, and
+# returns the success message (or the stored one for a replayed key).
+# BankApp uses these through LocalBank; the teller server (teller_server.py)
+# runs the same functions for remote terminals.
+
+class BankError(Exception):
+    # True when raised after the PIN was accepted (see teller_server.py)
+    authenticated = False
+
+
+class PostingHeld(BankError):
+    # The posting was parked in held_postings (and committed) until a
+    # reviewer releases or rejects it (see held_postings.py)
+    pass
+
+
+class AuthError(BankError):
+    # Wrong account, name or PIN (or a blocked account): what login
+    # throttling counts as a failed attempt (see throttle.py)
+    pass
+
+
+class Unavailable(BankError):
+    # The database or the teller server could not be reached
+    pass
+
+
+def parse_amount(text):
+    try:
+        value = Decimal(str(text).strip())
+    except InvalidOperation:
+        raise BankError("Amount must be positive")
+    if not value.is_finite() or value <= 0:
+        raise BankError("Amount must be positive")
+    return f"{value:.2f}"
+
+
+def _check_identity(db, acc, name, pin, label="Account", for_account=""):
+    row = statements.fetch_one(db, "account_identity", (acc,))
+    if not row:
+        raise AuthError(f"{label} not found")
+    db_name, status, real_pin, bal = row
+    if status != "Active":
+        raise AuthError(f"{label} is blocked")
+    if db_name.strip().lower() != name.strip().lower():
+        raise AuthError(f"Name does not match {for_account or 'account'}")
+    if real_pin != pin:
+        raise AuthError(f"Incorrect PIN{' for ' + for_account if for_account else ''}")
+    return db_name, bal
+
+
+def _gate(db, cur, key, engine, acc, op, amt, payee=None):
+    # The returned decision holds the amount the engine reserved: confirm it
+    # after the commit, release it after a rollback
+    if engine is None:
+        return None
+    decision = engine.check(acc, op, amt, payee)
+    if decision.action == velocity.REJECT:
+        raise BankError(decision.reason)
+    if decision.action == velocity.HOLD:
+        velocity.hold_posting(cur, acc, op, amt, payee, decision.reason)
+        outbox.publish(cur, "Held", acc, op=op, amount=amt, payee=payee, reason=decision.reason)
+        result = f"Held for review: {decision.reason}"
+        if key:
+            idempotency.record_result(cur, key, result)
+        db.commit()
+        raise PostingHeld(result)
+    return decision
+
+
+def _rollback(db, engine, decision):
+    db.rollback()
+    if engine is not None:
+        engine.release(decision)
+
+
+def post(db, acc, name, pin, amount, op, key=None, engine=None, message=None):
+    # Deposit or Withdraw on one account
+    amt = parse_amount(amount)
+    message = message or f"{op} successful"
+    cur = db.cursor()
+    decision = None
+    verified = False
+    try:
+        if key:
+            replay = idempotency.claim(cur, key, op, idempotency.fingerprint(op, acc, amt))
+            if replay is not None:
+                db.rollback()
+                return replay
+        if op == "Withdraw":
+            hot_accounts.fold(db, acc)
+        db_name, bal = _check_identity(db, acc, name, pin)
+        verified = True
+        if op == "Withdraw" and Decimal(str(bal)) < Decimal(amt):
+            raise BankError("Insufficient balance")
+        decision = _gate(db, cur, key, engine, acc, op, amt)
+
+        if op == "Deposit":
+            hot_accounts.credit(db, acc, amt)
+        else:
+            # the guard re-checks under the row lock: the SELECT above may have read a stale balance
+            if statements.execute(db, "debit", (amt, acc, amt)).rowcount != 1:
+                raise BankError("Insufficient balance")
+        statements.execute(db, "insert_txn", (acc, db_name, op, amt))
+        outbox.publish(cur, op, acc, name=db_name, amount=amt, key=key)
+        if key:
+            idempotency.record_result(cur, key, message)
+        db.commit()
+    except PostingHeld as e:
+        audit.record(op, name, acc, str(e), amount=amt)
+        raise
+    except BankError as e:
+        _rollback(db, engine, decision)
+        e.authenticated = verified
+        audit.record(op, name, acc, str(e), amount=amt)
+        raise
+    except BaseException:
+        _rollback(db, engine, decision)
+        raise
+    audit.record(op, name, acc, amount=amt)
+    if engine is not None:
+        engine.confirm(decision)
+    return message
+
+
+def _move(db, cur, acc_from, from_name, acc_to, to_name, amt, **event):
+    if statements.execute(db, "debit", (amt, acc_from, amt)).rowcount != 1:
+        raise BankError("Insufficient balance in from account")
+    hot_accounts.credit(db, acc_to, amt)
+    statements.execute(db, "insert_txn", (acc_from, from_name, "Transfer Out", amt))
+    statements.execute(db, "insert_txn", (acc_to, to_name, "Transfer In", amt))
+    velocity.remember_payee(cur, acc_from, acc_to)
+    outbox.publish(cur, "Transfer", acc_from, name=from_name, to=acc_to, to_name=to_name, amount=amt, **event)
+
+
+def transfer(db, acc_from, name, pin, acc_to, amount, key=None, engine=None):
+    if acc_from == acc_to:
+        raise BankError("From and To accounts must be different")
+    amt = parse_amount(amount)
+    message = f"Transferred ₹{amt} to {acc_to}"
+    cur = db.cursor()
+    decision = None
+    verified = False
+    try:
+        if key:
+            replay = idempotency.claim(cur, key, "Transfer", idempotency.fingerprint("Transfer", acc_from, acc_to, amt))
+            if replay is not None:
+                db.rollback()
+                return replay
+        hot_accounts.fold(db, acc_from)
+        from_name, from_bal = _check_identity(db, acc_from, name, pin, "From account", "from account")
+        verified = True
+        if Decimal(str(from_bal)) < Decimal(amt):
+            raise BankError("Insufficient balance in from account")
+        row_to = statements.fetch_one(db, "account_status", (acc_to,))
+        if not row_to:
+            raise BankError("To account not found")
+        to_name, to_status = row_to
+        if to_status != "Active":
+            raise BankError("To account is blocked")
+        decision = _gate(db, cur, key, engine, acc_from, "Transfer Out", amt, payee=acc_to)
+
+        _move(db, cur, acc_from, from_name, acc_to, to_name, amt, key=key)
+        if key:
+            idempotency.record_result(cur, key, message)
+        db.commit()
+    except PostingHeld as e:
+        audit.record("Transfer", name, acc_from, str(e), to=acc_to, amount=amt)
+        raise
+    except BankError as e:
+        _rollback(db, engine, decision)
+        e.authenticated = verified
+        audit.record("Transfer", name, acc_from, str(e), to=acc_to, amount=amt)
+        raise
+    except BaseException:
+        _rollback(db, engine, decision)
+        raise
+    audit.record("Transfer", name, acc_from, to=acc_to, amount=amt)
+    if engine is not None:
+        engine.confirm(decision)
+    return message
+
+
+# -------------------- Held postings --------------------
+_HELD_ROW = """
+    SELECT account_no, txn_type, amount, payee, status
+    FROM held_postings WHERE hold_id=%s FOR UPDATE
+"""
+
+
+def pending_holds(db, limit=100):
+    cur = db.cursor()
+    cur.execute("""
+        SELECT hold_id, account_no, payee, amount, reason, created_at
+        FROM held_postings WHERE status='Pending'
+        ORDER BY hold_id LIMIT %s
+    """, (limit,))
+    rows = cur.fetchall()
+    db.commit()
+    return rows
+
+
+def _claim_hold(cur, hold_id):
+    cur.execute(_HELD_ROW, (hold_id,))
+    row = cur.fetchone()
+    if not row:
+        raise BankError(f"Held posting {hold_id} not found")
+    if row[4] != "Pending":
+        raise BankError(f"Held posting {hold_id} is already {row[4]}")
+    return row[:4]
+
+
+def release_hold(db, hold_id, actor):
+    # A reviewer approved a held transfer: it is posted now, on the checks
+    # that still apply (the customer gave the PIN when it was held)
+    cur = db.cursor()
+    acc_from = acc_to = amt = None
+    try:
+        acc_from, op, amount, acc_to = _claim_hold(cur, hold_id)
+        if op != "Transfer Out":
+            raise BankError(f"Held posting {hold_id} is a {op}, only transfers are held")
+        amt = parse_amount(amount)
+        hot_accounts.fold(db, acc_from)
+        names = []
+        for acc, label in ((acc_from, "From account"), (acc_to, "To account")):
+            row = statements.fetch_one(db, "account_status", (acc,))
+            if not row:
+                raise BankError(f"{label} not found")
+            if row[1] != "Active":
+                raise BankError(f"{label} is blocked")
+            names.append(row[0])
+        _move(db, cur, acc_from, names[0], acc_to, names[1], amt, hold=hold_id)
+        cur.execute("UPDATE held_postings SET status='Released' WHERE hold_id=%s", (hold_id,))
+        db.commit()
+    except BankError as e:
+        db.rollback()
+        audit.record("release_hold", actor, acc_from, str(e), hold=hold_id, to=acc_to, amount=amt)
+        raise
+    except BaseException:
+        db.rollback()
+        raise
+    audit.record("release_hold", actor, acc_from, hold=hold_id, to=acc_to, amount=amt)
+    return f"Transferred ₹{amt} from {acc_from} to {acc_to}"
+
+
+def reject_hold(db, hold_id, actor, reason):
+    cur = db.cursor()
+    try:
+        acc, op, amount, payee = _claim_hold(cur, hold_id)
+        cur.execute("UPDATE held_postings SET status='Rejected' WHERE hold_id=%s", (hold_id,))
+        outbox.publish(cur, "HoldRejected", acc, op=op, amount=amount, payee=payee, hold=hold_id, reason=reason)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    audit.record("reject_hold", actor, acc, hold=hold_id, to=payee, amount=amount, reason=reason)
+    return f"Held posting {hold_id} rejected"
+
+
+def _check_pin(db, acc, pin):
+    row = statements.fetch_one(db, "account_balance", (acc,))
+    if not row:
+        raise AuthError("Account not found")
+    bal, status, real_pin = row
+    if status != "Active":
+        raise AuthError("Account is blocked")
+    if real_pin != pin:
+        raise AuthError("Incorrect PIN")
+    return bal
+
+
+def balance(db, acc, pin):
+    return Decimal(str(_check_pin(db, acc, pin))) + hot_accounts.pending(db, acc)
+
+
+def history(db, acc=None, limit=200):
+    if acc:
+        return archive.account_history(db, acc)
+    return archive.all_history(db, limit)
+
+
+def account_history(db, acc, pin):
+    # One account's history behind its PIN, for callers that are not signed in
+    _check_pin(db, acc, pin)
+    return archive.account_history(db, acc)
+
+
+# ==================== Local backend ====================
+class LocalBank:
+    # Runs the operations above on a direct DB connection per call. History
+    # may use read_connect (a replica); on_write runs after each posting.
+    def __init__(self, connect, engine=None, read_connect=None, on_write=None):
+        self.connect = connect
+        self.read_connect = read_connect or connect
+        self.engine = engine
+        self.on_write = on_write
+
+    def _call(self, connect, fn, *args, **kwargs):
+        try:
+            db = connect()
+        except storage.DB_ERRORS as e:
+            raise Unavailable(f"Database unreachable: {e}")
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    def _write(self, fn, *args, **kwargs):
+        try:
+            return self._call(self.connect, fn, *args, **kwargs)
+        finally:
+            # Also after a hold or a failure: the next reads stay on the primary
+            if self.on_write:
+                self.on_write()
+
+    def post(self, acc, name, pin, amount, op, key=None, message=None):
+        return self._write(post, acc, name, pin, amount, op, key=key, engine=self.engine, message=message)
+
+    def transfer(self, acc_from, name, pin, acc_to, amount, key=None):
+        return self._write(transfer, acc_from, name, pin, acc_to, amount, key=key, engine=self.engine)
+
+    def balance(self, acc, pin):
+        return self._call(self.connect, balance, acc, pin)
+
+    def history(self, acc=None, limit=200):
+        return self._call(self.read_connect, history, acc, limit)
+
+    def account_history(self, acc, pin):
+        return self._call(self.read_connect, account_history, acc, pin)
@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+import audit
+import storage
+import statements
+
+
+# ==================== Benchmark Harness ====================
+# Runs the app's hot SQL paths against a storage backend and reports
+# throughput and latency. Every operation opens its own connection, the
+# same way BankApp does, so the numbers reflect what a teller sees.
+#
+#   python benchmark.py --backend sqlite
+#   python benchmark.py --backend mysql --database bank_bench --ops 500
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+BENCH_PIN = "1234"
+
+
+def bench_accounts(n):
+    return [f"BENCH{i:06d}" for i in range(n)]
+
+
+def make_backend(args):
+    if args.backend == "sqlite":
+        if os.path.exists(args.sqlite_path) and not args.keep:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(args.sqlite_path + suffix):
+                    os.remove(args.sqlite_path + suffix)
+        return storage.SQLiteBackend(args.sqlite_path, pool_size=args.pool_size)
+    return storage.MySQLBackend(database=args.database, pool_size=args.pool_size)
+
+
+def seed(backend, n_accounts):
+    db = backend.connect_server()
+    cur = db.cursor()
+    storage.create_schema(cur)
+    accounts = bench_accounts(n_accounts)
+    cur.execute("DELETE FROM transactions WHERE account_no LIKE 'BENCH%'")
+    cur.execute("DELETE FROM accounts WHERE account_no LIKE 'BENCH%'")
+    cur.execute("INSERT INTO customers(name, gender, dob, mobile, email, address, password) VALUES (%s,%s,%s,%s,%s,%s,%s)",
+                ("Bench", "Other", "1990-01-01", "9000000000", "bench@bank.com", "Bench", "bench"))
+    cur.execute("SELECT LAST_INSERT_ID()")
+    cust_id = cur.fetchone()[0]
+    cur.executemany("""
+        INSERT INTO accounts(account_no, cust_id, cust_name, account_type, pin, balance, ifsc, status)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,'Active')
+    """, [(acc, cust_id, "Bench", "Savings", BENCH_PIN, "100000.00", "IFSC0000") for acc in accounts])
+    db.commit()
+    db.close()
+    return accounts
+
+
+# ==================== Scenarios ====================
+# These mirror BankApp._money_op, transfer_money and view_cust_transactions,
+# going through the same named statements (see statements.py).
+@scenario("deposit")
+def run_deposit(backend, accounts, rnd):
+    acc = rnd.choice(accounts)
+    db = backend.connect()
+    name = statements.fetch_one(db, "account_identity", (acc,))[0]
+    statements.execute(db, "credit", ("10.00", acc))
+    statements.execute(db, "insert_txn", (acc, name, "Deposit", "10.00"))
+    db.commit(); db.close()
+
+
+@scenario("withdraw")
+def run_withdraw(backend, accounts, rnd):
+    acc = rnd.choice(accounts)
+    db = backend.connect()
+    name = statements.fetch_one(db, "account_identity", (acc,))[0]
+    statements.execute(db, "debit", ("5.00", acc, "5.00"))
+    statements.execute(db, "insert_txn", (acc, name, "Withdraw", "5.00"))
+    db.commit(); db.close()
+
+
+@scenario("transfer")
+def run_transfer(backend, accounts, rnd):
+    acc_from, acc_to = rnd.sample(accounts, 2)
+    db = backend.connect()
+    from_name = statements.fetch_one(db, "account_identity", (acc_from,))[0]
+    to_name = statements.fetch_one(db, "account_status", (acc_to,))[0]
+    statements.execute(db, "debit", ("1.00", acc_from, "1.00"))
+    statements.execute(db, "credit", ("1.00", acc_to))
+    statements.execute(db, "insert_txn", (acc_from, from_name, "Transfer Out", "1.00"))
+    statements.execute(db, "insert_txn", (acc_to, to_name, "Transfer In", "1.00"))
+    db.commit(); db.close()
+
+
+@scenario("history")
+def run_history(backend, accounts, rnd):
+    acc = rnd.choice(accounts)
+    db = backend.connect()
+    statements.fetch_all(db, "account_history", (acc,))
+    db.close()
+
+
+@scenario("balance")
+def run_balance(backend, accounts, rnd):
+    acc = rnd.choice(accounts)
+    db = backend.connect()
+    statements.fetch_one(db, "account_balance", (acc,))
+    db.close()
+
+
+def with_audit(name, fn):
+    # The scenario plus the audit record the app writes for it
+    def run(backend, accounts, rnd):
+        fn(backend, accounts, rnd)
+        audit.record(name, "bench", outcome="ok", amount="10.00")
+    return run
+
+
+# ==================== Runner ====================
+def measure(fn, backend, accounts, ops, seed_value=42):
+    rnd = random.Random(seed_value)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(ops):
+        t0 = time.perf_counter()
+        fn(backend, accounts, rnd)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "ops": ops,
+        "seconds": elapsed,
+        "ops_per_sec": ops / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def print_report(backend, results):
+    print(f"Backend: {backend.name}")
+    print(f"{'scenario':<14}{'ops':>8}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['ops']:>8}{r['ops_per_sec']:>12.1f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark bank operations against a storage backend")
+    parser.add_argument("--backend", choices=["sqlite", "mysql"], default="sqlite")
+    parser.add_argument("--sqlite-path", default="bench.db")
+    parser.add_argument("--database", default="bank_bench", help="MySQL database used for the run")
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--ops", type=int, default=1000)
+    parser.add_argument("--pool-size", type=int, default=4, help="0 opens a new connection per operation")
+    parser.add_argument("--keep", action="store_true", help="reuse an existing SQLite file")
+    parser.add_argument("--statements", action="store_true", help="print per-statement counters")
+    parser.add_argument("--audit", action="store_true",
+                        help="also run every scenario with audit recording on (audit_log table)")
+    parser.add_argument("scenarios", nargs="*", help=f"subset of: {', '.join(SCENARIOS)}")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        print("Unknown scenario(s):", ", ".join(unknown))
+        return 2
+    backend = make_backend(args)
+    accounts = seed(backend, args.accounts)
+    results = {}
+    if args.audit:
+        flusher = audit.start(audit.TableSink(backend))
+    for name in names:
+        results[name] = measure(SCENARIOS[name], backend, accounts, args.ops)
+        if args.audit:
+            results[name + "+audit"] = measure(with_audit(name, SCENARIOS[name]), backend, accounts, args.ops)
+    print_report(backend, results)
+    if args.audit:
+        audit.stop()
+        print(f"audit: {flusher.written:,} entries flushed, {audit.dropped:,} dropped")
+    if args.statements:
+        print()
+        print(statements.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import sys
+import csv
+import time
+import argparse
+
+import storage
+import outbox
+import account_rules
+
+
+# ==================== Bulk Account Opening ====================
+# Opens a customer and an account for every row of a CSV (corporate
+# onboarding), instead of one form submit per employee:
+#   1. the whole file is validated column by column with the same rules as
+#      the BankApp forms, each rule evaluated once per distinct value;
+#   2. valid rows are opened in chunks, one transaction per chunk: account
+#      numbers are reserved as a block, customers are inserted one by one
+#      (each account needs its owner's auto-increment id), and accounts,
+#      opening deposits and outbox events go in with one executemany each;
+#   3. every input row gets a line in the results file (account number or
+#      the reason it was rejected) and a throughput report is printed.
+#
+#   python bulk_open.py employees.csv --results opened.csv
+#
+# Columns: name, gender, dob, mobile, email, address, password,
+#          account_type, pin, deposit
+
+COLUMNS = ("name", "gender", "dob", "mobile", "email", "address", "password",
+           "account_type", "pin", "deposit")
+CHUNK_SIZE = 1000
+
+# Bulk numbers come from a counter in their own 7-digit range, so they
+# never meet the random 5-digit numbers the account form hands out
+ACC_PREFIX = "BNK"
+ACC_DIGITS = 7
+ACC_FIRST = 10 ** (ACC_DIGITS - 1)
+COUNTER = "bulk_account_no"      # row in sequences
+
+# column, rule, message
+RULES = [
+    ("gender", lambda v: v in account_rules.GENDERS, "Gender must be Male, Female or Other"),
+    ("dob", account_rules.is_valid_date, "Invalid DOB format (YYYY-MM-DD)"),
+    ("mobile", account_rules.is_valid_mobile, "Mobile must be 10 digits"),
+    ("account_type", lambda v: v in account_rules.ACCOUNT_TYPES, "Account type must be Savings or Current"),
+    ("pin", account_rules.is_valid_pin, "PIN must be 4 to 10 digits"),
+    ("deposit", account_rules.is_positive_amount, "Initial deposit must be positive"),
+]
+
+
+class BulkError(Exception):
+    pass
+
+
+def read_columns(path):
+    # Column name -> list of stripped values, in file order
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = [c for c in COLUMNS if c not in (reader.fieldnames or ())]
+        if missing:
+            raise BulkError(f"{path}: missing columns: {', '.join(missing)}")
+        columns = {c: [] for c in COLUMNS}
+        for row in reader:
+            for c in COLUMNS:
+                columns[c].append((row.get(c) or "").strip())
+    return columns
+
+
+def _mask(values, rule):
+    # The rule runs once per distinct value (dates, types and PINs repeat a lot)
+    verdict = {v: rule(v) for v in set(values)}
+    return [verdict[v] for v in values]
+
+
+def validate(columns):
+    # One list of error messages per row; empty means the row can be opened
+    n = len(columns[COLUMNS[0]])
+    errors = [[] for _ in range(n)]
+    blank = [i for i in range(n) if not all(columns[c][i] for c in COLUMNS)]
+    for i in blank:
+        errors[i].append("Fill all fields")
+    for column, rule, message in RULES:
+        for i, ok in enumerate(_mask(columns[column], rule)):
+            if not ok and columns[column][i]:
+                errors[i].append(message)
+    return errors
+
+
+def reserve_account_numbers(db, n):
+    # Takes a block of n numbers from the shared counter and commits at once,
+    # so concurrent bulk runs only meet on this one row for a moment
+    cur = db.cursor()
+    cur.execute("INSERT IGNORE INTO sequences(name, last_value) VALUES (%s,%s)", (COUNTER, ACC_FIRST - 1))
+    cur.execute("UPDATE sequences SET last_value = last_value + %s WHERE name=%s", (n, COUNTER))
+    cur.execute("SELECT last_value FROM sequences WHERE name=%s", (COUNTER,))
+    last = cur.fetchone()[0]
+    db.commit()
+    if last >= 10 ** ACC_DIGITS:
+        raise BulkError("Bulk account numbers exhausted")
+    return [f"{ACC_PREFIX}{no:0{ACC_DIGITS}d}" for no in range(last - n + 1, last + 1)]
+
+
+def open_chunk(db, rows):
+    # rows: dicts of validated fields. Returns [(cust_id, account_no, ifsc)].
+    acc_nos = reserve_account_numbers(db, len(rows))
+    ifscs = [account_rules.generate_ifsc() for _ in rows]
+    cur = db.cursor()
+    try:
+        # One insert per customer: a multi-row insert's ids need not be
+        # consecutive (innodb_autoinc_lock_mode=2), and picking them here
+        # would collide with concurrent add_customer inserts
+        cust_ids = []
+        for r in rows:
+            cur.execute("""
+                INSERT INTO customers(name, gender, dob, mobile, email, address, password)
+                VALUES (%s,%s,%s,%s,%s,%s,%s)
+            """, (r["name"], r["gender"], r["dob"], r["mobile"], r["email"], r["address"], r["password"]))
+            cust_ids.append(cur.lastrowid)
+        amounts = [account_rules.sanitize_amount(r["deposit"]) for r in rows]
+
+        cur.executemany("""
+            INSERT INTO accounts(account_no, cust_id, cust_name, account_type, pin, balance, ifsc, status)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,'Active')
+        """, [(acc, cid, r["name"], r["account_type"], r["pin"], amt, ifsc)
+              for acc, cid, r, amt, ifsc in zip(acc_nos, cust_ids, rows, amounts, ifscs)])
+        cur.executemany("INSERT INTO transactions(account_no, cust_name, txn_type, amount) VALUES (%s,%s,%s,%s)",
+                        [(acc, r["name"], "Deposit", amt) for acc, r, amt in zip(acc_nos, rows, amounts)])
+        outbox.publish_many(cur, [("Opened", acc, {"name": r["name"], "account_type": r["account_type"],
+                                                   "amount": amt, "bulk": True})
+                                  for acc, r, amt in zip(acc_nos, rows, amounts)])
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return list(zip(cust_ids, acc_nos, ifscs))
+
+
+def run(backend, path, results_path=None, chunk=CHUNK_SIZE, dry_run=False):
+    timings = {}
+    t0 = mark = time.perf_counter()
+
+    def lap(name):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[name] = now - mark
+        mark = now
+
+    columns = read_columns(path)
+    lap("read")
+    errors = validate(columns)
+    lap("validate")
+    n = len(errors)
+    valid = [i for i in range(n) if not errors[i]]
+    results = [None] * n      # (status, cust_id, account_no, ifsc, error)
+    for i in range(n):
+        if errors[i]:
+            results[i] = ("rejected", "", "", "", "; ".join(errors[i]))
+
+    opened = 0
+    if not dry_run:
+        db = backend.connect()
+        try:
+            for start in range(0, len(valid), chunk):
+                idx = valid[start:start + chunk]
+                rows = [{c: columns[c][i] for c in COLUMNS} for i in idx]
+                try:
+                    done = open_chunk(db, rows)
+                except storage.DB_ERRORS as e:
+                    for i in idx:
+                        results[i] = ("failed", "", "", "", str(e))
+                    continue
+                for i, (cid, acc, ifsc) in zip(idx, done):
+                    results[i] = ("opened", cid, acc, ifsc, "")
+                opened += len(done)
+        finally:
+            db.close()
+    else:
+        for i in valid:
+            results[i] = ("valid", "", "", "", "")
+    lap("open")
+
+    if results_path:
+        with open(results_path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(("row", "status", "cust_id", "account_no", "ifsc", "error"))
+            for i, res in enumerate(results):
+                w.writerow((i + 2,) + res)     # row number as seen in a spreadsheet
+        lap("results")
+    timings["total"] = time.perf_counter() - t0
+    return {"rows": n, "valid": len(valid), "opened": opened, "rejected": n - len(valid),
+            "failed": len(valid) - opened if not dry_run else 0, "timings": timings}
+
+
+def report(stats):
+    t = stats["timings"]
+    print(f"{stats['rows']:,} rows: {stats['valid']:,} valid, {stats['opened']:,} opened, "
+          f"{stats['rejected']:,} rejected, {stats['failed']:,} failed")
+    print("  ".join(f"{name} {seconds:.2f}s" for name, seconds in t.items()))
+    if stats["opened"] and t.get("open"):
+        print(f"{stats['opened'] / t['open']:,.0f} accounts/s opened, "
+              f"{stats['rows'] / t['total']:,.0f} rows/s end to end")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Open customers and accounts from a CSV file")
+    parser.add_argument("csv")
+    parser.add_argument("--results", help="write one result line per input row here")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="rows per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="only validate")
+    args = parser.parse_args(argv)
+    try:
+        stats = run(storage.get_backend(), args.csv, args.results, args.chunk, args.dry_run)
+    except (BulkError, OSError) as e:
+        print(e)
+        return 1
+    report(stats)
+    return 0 if stats["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import os
+import sys
+import threading
+import configparser
+from types import MappingProxyType
+
+
+# ==================== Configuration ====================
+# Every deployment knob in one place. Values come from the defaults below,
+# then bank.ini (or the file named by BANK_CONFIG), then environment
+# variables, and are validated together on first use. The result is
+# read-only: change the file or the environment and restart.
+#
+#   [db]
+#   backend = mysql
+#   host = db.branch.local
+#   password = secret
+#   replicas = replica1:3306, replica2:3306
+#
+#   [pool]
+#   size = 8
+#
+#   python config.py        # validate and print the effective settings
+
+CONFIG_PATH = "bank.ini"
+
+_SECRETS = {("db", "password")}
+
+
+def _text(v):
+    return str(v).strip()
+
+
+def _bool(v):
+    if isinstance(v, bool):
+        return v
+    s = str(v).strip().lower()
+    if s in ("1", "true", "yes", "on"):
+        return True
+    if s in ("0", "false", "no", "off", ""):
+        return False
+    raise ValueError(f"expected a boolean, got {v!r}")
+
+
+def _list(v):
+    if isinstance(v, (list, tuple)):
+        return tuple(v)
+    return tuple(s.strip() for s in str(v).split(",") if s.strip())
+
+
+def _at_least(low):
+    def check(v):
+        if v < low:
+            raise ValueError(f"must be >= {low}")
+    return check
+
+
+def _one_of(*choices):
+    def check(v):
+        if v not in choices:
+            raise ValueError(f"must be one of {', '.join(choices)}")
+    return check
+
+
+def _port(v):
+    if not 0 < v < 65536:
+        raise ValueError("must be a TCP port (1-65535)")
+
+
+# section, key, environment variable, type, default, check
+FIELDS = [
+    ("db", "backend", "BANK_DB_BACKEND", _text, "mysql", _one_of("mysql", "sqlite")),
+    ("db", "host", "BANK_DB_HOST", _text, "localhost", None),
+    ("db", "port", "BANK_DB_PORT", int, 3306, _port),
+    ("db", "user", "BANK_DB_USER", _text, "root", None),
+    ("db", "password", "BANK_DB_PASSWORD", str, "", None),
+    ("db", "database", "BANK_DB_NAME", _text, "bank_db", None),
+    ("db", "unix_socket", "BANK_DB_SOCKET", _text, "", None),
+    ("db", "sqlite_path", "BANK_SQLITE_PATH", _text, "bank.db", None),
+    ("db", "connect_timeout", "BANK_DB_CONNECT_TIMEOUT", float, 10.0, _at_least(0)),
+    ("db", "lock_timeout", "BANK_DB_LOCK_TIMEOUT", float, 30.0, _at_least(0)),
+    ("db", "statement_timeout_ms", "BANK_DB_STATEMENT_TIMEOUT_MS", int, 0, _at_least(0)),
+    ("db", "replicas", "BANK_DB_REPLICAS", _list, (), None),
+
+    ("pool", "size", "BANK_DB_POOL_SIZE", int, 4, _at_least(0)),
+
+    ("routing", "max_lag_seconds", "BANK_REPLICA_MAX_LAG", float, 5.0, _at_least(0)),
+    ("routing", "lag_check_seconds", "BANK_REPLICA_LAG_CHECK", float, 2.0, _at_least(0)),
+
+    ("cache", "sqlite_cache_kb", "BANK_SQLITE_CACHE_KB", int, 8192, _at_least(0)),
+    ("cache", "hot_accounts_refresh_seconds", "BANK_HOT_ACCOUNTS_REFRESH", float, 30.0, _at_least(0)),
+    ("cache", "tree_chunk_size", "BANK_TREE_CHUNK_SIZE", int, 500, _at_least(1)),
+
+    ("features", "velocity_checks", "BANK_VELOCITY_CHECKS", _bool, True, None),
+    ("features", "offline_journal", "BANK_OFFLINE_JOURNAL", _bool, True, None),
+    ("features", "prepared_statements", "BANK_PREPARED_STATEMENTS", _bool, True, None),
+    ("features", "profile", "BANK_PROFILE", _bool, False, None),
+    ("features", "outbox", "BANK_OUTBOX", _bool, True, None),
+
+    ("tracing", "slow_query_ms", "BANK_SLOW_QUERY_MS", float, 200.0, _at_least(0)),
+    ("tracing", "slow_query_log", "BANK_SLOW_QUERY_LOG", _text, "slow_queries.log", None),
+    ("tracing", "metrics_path", "BANK_METRICS_PATH", _text, "", None),
+    ("tracing", "metrics_interval_ms", "BANK_METRICS_INTERVAL_MS", int, 60000, _at_least(1000)),
+
+    ("journal", "path", "BANK_JOURNAL_PATH", _text, "teller_journal.log", None),
+    ("journal", "conflicts_path", "BANK_JOURNAL_CONFLICTS", _text, "teller_journal.conflicts", None),
+    ("journal", "key_path", "BANK_JOURNAL_KEY", _text, "teller_journal.key", None),
+
+    ("audit", "sink", "BANK_AUDIT_SINK", _text, "table", _one_of("table", "file", "off")),
+    ("audit", "path", "BANK_AUDIT_PATH", _text, "audit.log", None),
+    ("audit", "max_bytes", "BANK_AUDIT_MAX_BYTES", int, 10 * 1024 * 1024, _at_least(1024)),
+    ("audit", "backups", "BANK_AUDIT_BACKUPS", int, 5, _at_least(0)),
+    ("audit", "flush_ms", "BANK_AUDIT_FLUSH_MS", int, 500, _at_least(10)),
+
+    ("throttle", "enabled", "BANK_THROTTLE", _bool, True, None),
+    ("throttle", "attempts", "BANK_THROTTLE_ATTEMPTS", int, 5, _at_least(1)),
+    ("throttle", "refill_seconds", "BANK_THROTTLE_REFILL_SECONDS", float, 60.0, _at_least(0.001)),
+    ("throttle", "terminal_attempts", "BANK_THROTTLE_TERMINAL_ATTEMPTS", int, 30, _at_least(1)),
+    ("throttle", "terminal_refill_seconds", "BANK_THROTTLE_TERMINAL_REFILL_SECONDS", float, 2.0, _at_least(0.001)),
+    ("throttle", "lock_seconds", "BANK_THROTTLE_LOCK_SECONDS", float, 30.0, _at_least(0)),
+    ("throttle", "max_lock_seconds", "BANK_THROTTLE_MAX_LOCK_SECONDS", float, 3600.0, _at_least(0)),
+
+    ("profile", "log", "BANK_PROFILE_LOG", _text, "profile_actions.jsonl", None),
+    ("profile", "cprofile_dir", "BANK_PROFILE_CPROFILE", _text, "", None),
+
+    ("server", "host", "BANK_SERVER_HOST", _text, "127.0.0.1", None),
+    ("server", "port", "BANK_SERVER_PORT", int, 8765, _port),
+    ("server", "max_inflight", "BANK_SERVER_MAX_INFLIGHT", int, 64, _at_least(1)),
+    ("server", "address", "BANK_SERVER", _text, "", None),   # terminals: post through this server
+]
+
+
+class ConfigError(Exception):
+    pass
+
+
+class Section:
+    # Read-only attribute access to one section's values
+    def __init__(self, name, values):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_values", MappingProxyType(dict(values)))
+
+    def __getattr__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            raise AttributeError(f"no setting {self._name}.{key}") from None
+
+    def __setattr__(self, key, value):
+        raise AttributeError("configuration is read-only")
+
+    def items(self):
+        return self._values.items()
+
+
+class Config:
+    def __init__(self, sections, source=None):
+        object.__setattr__(self, "_sections", MappingProxyType(sections))
+        object.__setattr__(self, "source", source)
+
+    def __getattr__(self, name):
+        try:
+            return self._sections[name]
+        except KeyError:
+            raise AttributeError(f"no section {name}") from None
+
+    def __setattr__(self, key, value):
+        raise AttributeError("configuration is read-only")
+
+    def describe(self):
+        lines = [f"# from {self.source or 'defaults and environment'}"]
+        for name, section in self._sections.items():
+            lines.append(f"[{name}]")
+            for key, value in section.items():
+                if (name, key) in _SECRETS and value:
+                    value = "********"
+                elif isinstance(value, tuple):
+                    value = ", ".join(value)
+                lines.append(f"{key} = {value}")
+        return "\n".join(lines)
+
+
+def load(path=None, environ=None):
+    environ = os.environ if environ is None else environ
+    path = path or environ.get("BANK_CONFIG") or CONFIG_PATH
+    parser = configparser.ConfigParser(interpolation=None)
+    source = None
+    errors = []
+    if os.path.exists(path):
+        try:
+            parser.read(path, encoding="utf-8")
+            source = path
+        except configparser.Error as e:
+            raise ConfigError(f"Cannot read {path}: {e}")
+    elif environ.get("BANK_CONFIG"):
+        raise ConfigError(f"BANK_CONFIG points to a missing file: {path}")
+
+    known = {(s, k) for s, k, *_ in FIELDS}
+    for section in parser.sections():
+        for key in parser[section]:
+            if (section, key) not in known:
+                errors.append(f"{path}: unknown setting [{section}] {key}")
+
+    sections = {}
+    for section, key, env, kind, default, check in FIELDS:
+        raw, origin = default, "default"
+        if parser.has_option(section, key):
+            raw, origin = parser.get(section, key), f"{path} [{section}] {key}"
+        if env in environ:
+            raw, origin = environ[env], env
+        try:
+            value = kind(raw)
+            if check:
+                check(value)
+        except (TypeError, ValueError) as e:
+            errors.append(f"{origin}: {e}")
+            value = default
+        sections.setdefault(section, {})[key] = value
+    if errors:
+        raise ConfigError("Invalid configuration:\n  " + "\n  ".join(errors))
+    return Config({name: Section(name, values) for name, values in sections.items()}, source)
+
+
+# ==================== Active configuration ====================
+_config = None
+_lock = threading.Lock()
+
+
+def get():
+    global _config
+    with _lock:
+        if _config is None:
+            _config = load()
+        return _config
+
+
+def set_config(config):
+    global _config
+    with _lock:
+        _config = config
+
+
+def main(argv=None):
+    try:
+        cfg = load(argv[0] if argv else None)
+    except ConfigError as e:
+        print(e)
+        return 1
+    print(cfg.describe())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
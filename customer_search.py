@@ -0,0 +1,388 @@
+import re
+import sys
+import time
+import heapq
+import random
+import argparse
+import threading
+from array import array
+from collections import Counter
+
+import storage
+
+
+# ==================== Customer Search ====================
+# Finds customers by any part of their name, mobile, email or address, with
+# typos, instead of an exact name match. Everything is held in memory:
+#   - postings: every word of every field -> the customers having it there
+#     (numbers are filed under their last four digits, so a mobile can be
+#     found by its ending);
+#   - a trigram index over the distinct words ("asha" -> "  a", " as",
+#     "ash", "sha", "ha "), which is small next to the customers.
+# Each query word is expanded to the known words it is a prefix of or at
+# most one or two typos from ("kumr" -> kumar, "kav" -> kavya); the trigram
+# index finds those words and the edit distance scores them. A customer
+# gets the best of those scores times a weight for the field the word is
+# in, and a customer's score is the mean over the query words. Customers
+# having every word come first, found from the rarest word by set probes;
+# when there is not a page of them (a word matched nothing), customers
+# having some of the words follow. The ranking of the last query is kept,
+# so paging does not search again. The index is filled from the customers
+# table in the background, picks up customers added elsewhere every
+# REFRESH_SECONDS, and BankApp adds its own at once.
+#
+#   python customer_search.py query "asha kumr"
+#   python customer_search.py bench --customers 1000000
+
+FIELDS = ("name", "mobile", "email", "address")
+WEIGHTS = (1.0, 1.0, 0.9, 0.6)
+PAGE_SIZE = 20
+MAX_RESULTS = 1000      # ranked per query; further matches are only counted
+MIN_SCORE = 0.5
+FUZZY_MIN = 0.65        # how close a word must be to stand in for a query word
+PREFIX_SIM = 0.75       # "kav" for kavya, while the name is still being typed
+EXPANSIONS = 20
+DOC_CHECK_RATIO = 200   # postings per candidate past which a word is checked in the fields
+SUFFIX_DIGITS = 4
+REFRESH_SECONDS = 5.0
+CHUNK_SIZE = 5000
+
+_TOKEN = re.compile(r"[a-z]+|[0-9]+")
+
+
+def tokens(text):
+    return _TOKEN.findall(str(text).lower())
+
+
+def word_grams(word):
+    w = f"  {word} "
+    return {w[i:i + 3] for i in range(len(w) - 2)}
+
+
+def _distance(a, b):
+    # Edit distance counting a swap of neighbours as one edit
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                d = min(d, prev2[j - 2] + 1)
+            cur.append(d)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _term(token):
+    # Where a token is filed: the word itself, or "#" + the last digits of a number
+    return "#" + token[-SUFFIX_DIGITS:] if token.isdigit() else token
+
+
+def _doc_terms(doc):
+    # (field, term) pairs, leaving out a term already filed under an earlier
+    # field: weights only go down, so it could never score higher there
+    # (the name in "asha.rao12@bank.in" is found through the name)
+    seen, out = set(), set()
+    for f, text in enumerate(doc):
+        terms = set(map(_term, tokens(text))) - seen
+        out.update((f, term) for term in terms)
+        seen |= terms
+    return out
+
+
+class Index:
+    def __init__(self):
+        self.docs = {}          # cust_id -> (name, mobile, email, address)
+        self.postings = {}      # term -> [array of cust_ids or None] per field
+        self.word_grams = {}    # trigram -> words having it
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self.checked_at = 0.0
+        self.ready = threading.Event()
+        self._expanded = {}
+        self._ranked = (None, [], 0)   # last query, its ranking and match count
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, cust_id, name, mobile, email, address):
+        doc = (name or "", str(mobile or ""), email or "", address or "")
+        terms = _doc_terms(doc)
+        with self.lock:
+            old = self.docs.get(cust_id)
+            if old is not None:
+                old_terms = _doc_terms(old)
+                for f, term in old_terms - terms:
+                    self.postings[term][f].remove(cust_id)
+                terms -= old_terms
+            self.docs[cust_id] = doc
+            for f, term in terms:
+                fields = self.postings.get(term)
+                if fields is None:
+                    fields = self.postings[term] = [None] * len(FIELDS)
+                    if not term.startswith("#"):
+                        for g in word_grams(term):
+                            self.word_grams.setdefault(g, []).append(term)
+                        self._expanded.clear()
+                if fields[f] is None:
+                    fields[f] = array("I")
+                fields[f].append(cust_id)
+            if cust_id > self.last_id:
+                self.last_id = cust_id
+            self._ranked = (None, [], 0)
+
+    def remove(self, cust_id):
+        with self.lock:
+            doc = self.docs.pop(cust_id, None)
+            if doc is not None:
+                for f, term in _doc_terms(doc):
+                    self.postings[term][f].remove(cust_id)
+            self._ranked = (None, [], 0)
+
+    # -------------------- Loading --------------------
+    def catch_up(self, db, chunk=CHUNK_SIZE):
+        # Adds customers with an id above the highest one indexed; returns how many
+        added = 0
+        cur = db.cursor()
+        while True:
+            cur.execute("SELECT cust_id, name, mobile, email, address FROM customers "
+                        "WHERE cust_id > %s ORDER BY cust_id LIMIT %s", (self.last_id, chunk))
+            rows = cur.fetchall()
+            db.commit()
+            for row in rows:
+                self.add(*row)
+            added += len(rows)
+            if len(rows) < chunk:
+                self.checked_at = time.monotonic()
+                return added
+
+    def refresh(self, connect):
+        if time.monotonic() - self.checked_at < REFRESH_SECONDS:
+            return 0
+        db = connect()
+        try:
+            return self.catch_up(db)
+        finally:
+            db.close()
+
+    def load_async(self, connect):
+        # Fills the index on a background thread; ready is set when done
+        def run():
+            try:
+                db = connect()
+                try:
+                    self.catch_up(db)
+                finally:
+                    db.close()
+            except storage.DB_ERRORS as e:
+                print("Customer index not loaded:", e)
+            self.ready.set()
+        threading.Thread(target=run, name="customer-index", daemon=True).start()
+        return self
+
+    # -------------------- Searching --------------------
+    def _expand(self, token):
+        # [(term, similarity)] standing in for one query token
+        if token.isdigit():
+            return [(_term(token), 1.0)]
+        found = self._expanded.get(token)
+        if found is None:
+            g = word_grams(token)
+            typos = 1 if len(token) <= 4 else 2
+            shared = Counter()
+            for gram in g:
+                shared.update(self.word_grams.get(gram, ()))
+            found = []
+            for word, n in shared.items():
+                if word == token:
+                    sim = 1.0
+                elif len(token) >= 3 and word.startswith(token):
+                    sim = PREFIX_SIM
+                elif abs(len(word) - len(token)) <= typos and n >= len(g) - 3 * typos:
+                    # each typo spoils at most three trigrams, so others cannot be this close
+                    sim = 1 - _distance(token, word) / max(len(word), len(token))
+                else:
+                    continue
+                if sim >= FUZZY_MIN:
+                    found.append((sim, -len(word), word))
+            found = self._expanded[token] = [(word, sim) for sim, _, word in heapq.nlargest(EXPANSIONS, found)]
+        return found
+
+    def _lists(self, token, expanded):
+        # (weighted similarity, posting list) per field of every stand-in, lowest first
+        lists = []
+        for term, sim in expanded:
+            for f, ids in enumerate(self.postings.get(term, ())):
+                if ids and token.isdigit():
+                    # filed by their last digits: keep the numbers that end in the query
+                    docs = self.docs
+                    ids = [cid for cid in ids if any(t.endswith(token) for t in tokens(docs[cid][f]))]
+                if ids:
+                    lists.append((sim * WEIGHTS[f], ids))
+        lists.sort(key=lambda l: l[0])
+        return lists
+
+    @staticmethod
+    def _scores(lists, among=None):
+        # cust_id -> best score over the lists (for the given customers only)
+        out = {}
+        for score, ids in lists:
+            out.update(dict.fromkeys(ids if among is None else among.intersection(ids), score))
+        return out
+
+    def _doc_score(self, doc, token, expanded):
+        # What _scores gives one customer, from its fields
+        close = dict(expanded)
+        best = 0.0
+        for f, text in enumerate(doc):
+            for t in tokens(text):
+                sim = (1.0 if t.endswith(token) else 0.0) if token.isdigit() else close.get(t, 0.0)
+                best = max(best, sim * WEIGHTS[f])
+        return best
+
+    def _combine(self, looked_up):
+        # Summed scores for several words, rarest first. Customers having
+        # every word are the rarest word's customers narrowed by probing the
+        # next words' lists (no dict is built for those). A word so common
+        # that reading it costs more than checking the candidates' own
+        # fields is checked per candidate instead.
+        full = set().union(*(ids for _, ids in looked_up[0][3]))
+        probed, common = [looked_up[0][3]], []
+        for size, word, exp, lists in looked_up[1:]:
+            if size > DOC_CHECK_RATIO * max(len(full), PAGE_SIZE):
+                common.append((word, exp, lists))
+            else:
+                full = set().union(*(full.intersection(ids) for _, ids in lists))
+                probed.append(lists)
+        if len(full) < PAGE_SIZE:
+            # Not a page of those: customers missing some of the words follow
+            scores = {}
+            for lists in probed + [lists for _, _, lists in common]:
+                for cid, s in self._scores(lists).items():
+                    scores[cid] = scores.get(cid, 0.0) + s
+            return scores
+        scores = dict.fromkeys(full, 0.0)
+        for lists in probed:
+            for cid, s in self._scores(lists, full).items():
+                scores[cid] += s
+        docs = self.docs
+        for word, exp, _ in common:
+            for cid in scores:
+                scores[cid] += self._doc_score(docs[cid], word, exp)
+        return scores
+
+    def _rank(self, query):
+        words = list(dict.fromkeys(tokens(query)))
+        with self.lock:
+            looked_up = []
+            for w in words:
+                exp = self._expand(w)
+                lists = self._lists(w, exp)
+                looked_up.append((sum(len(ids) for _, ids in lists), w, exp, lists))
+            looked_up.sort(key=lambda l: l[0])
+            scores = self._scores(looked_up[0][3]) if len(words) == 1 else self._combine(looked_up)
+            n = len(words)
+            floor = MIN_SCORE * n
+            best = [(-s, cid) for cid, s in scores.items() if s >= floor]
+            top = heapq.nsmallest(MAX_RESULTS, best)
+            docs = self.docs
+            return [(round(-s / n, 3), cid) + docs[cid] for s, cid in top], len(best)
+
+    def search(self, query, page=1, page_size=PAGE_SIZE):
+        # Returns (hits, total); a hit is (score, cust_id, name, mobile, email, address)
+        key = " ".join(tokens(query))
+        if not key:
+            return [], 0
+        last, ranked, total = self._ranked
+        if last != key:
+            ranked, total = self._rank(key)
+            self._ranked = (key, ranked, total)
+        start = (max(page, 1) - 1) * page_size
+        return ranked[start:start + page_size], total
+
+
+# ==================== Benchmark ====================
+FIRST = ["Asha", "Ravi", "Priya", "Arjun", "Meena", "Karthik", "Divya", "Suresh", "Lakshmi", "Vijay",
+         "Anitha", "Ganesh", "Kavya", "Manoj", "Deepa", "Rahul", "Sneha", "Prakash", "Revathi", "Hari"]
+LAST = ["Kumar", "Sharma", "Iyer", "Reddy", "Nair", "Patel", "Menon", "Rao", "Pillai", "Singh",
+        "Gupta", "Das", "Verma", "Joshi", "Bhat", "Naidu", "Shetty", "Kapoor", "Mehta", "Chopra"]
+CITIES = ["Chennai", "Madurai", "Coimbatore", "Bengaluru", "Mumbai", "Pune", "Delhi", "Kochi", "Hyderabad", "Salem"]
+STREETS = ["Gandhi Road", "Anna Nagar", "MG Road", "Lake View", "Temple Street", "Park Avenue", "Main Bazaar"]
+
+
+def _fake(rng, cid):
+    first, last = rng.choice(FIRST), rng.choice(LAST)
+    # a tail of rarer names, as in a real customer base
+    if rng.random() < 0.5:
+        first += rng.choice(["a", "i", "an", "esh", "ini", "raj", "ya", "deep", "vathi", "mathi"])
+    return (cid, f"{first} {last}", f"9{rng.randrange(10 ** 9):09d}",
+            f"{first.lower()}.{last.lower()}{rng.randrange(1000)}@{rng.choice(['gmail.com', 'yahoo.com', 'bank.in'])}",
+            f"{rng.randrange(1, 400)} {rng.choice(STREETS)}, {rng.choice(CITIES)}")
+
+
+def _typo(rng, text):
+    i = rng.randrange(len(text))
+    return text[:i] + text[i + 1:] if rng.random() < 0.5 else text[:i] + rng.choice("aeiourstn") + text[i + 1:]
+
+
+def bench(customers=1000000, queries=200, seed=7):
+    rng = random.Random(seed)
+    index = Index()
+    t0 = time.perf_counter()
+    rows = [_fake(rng, cid) for cid in range(1, customers + 1)]
+    for row in rows:
+        index.add(*row)
+    print(f"{customers:,} customers indexed in {time.perf_counter() - t0:.1f}s, {len(index.postings):,} terms")
+
+    times, found = [], 0
+    for _ in range(queries):
+        cid, name, mobile, email, address = rows[rng.randrange(customers)]
+        kind = rng.random()
+        if kind < 0.5:
+            query = _typo(rng, name)
+        elif kind < 0.8:
+            query = mobile[-6:]
+        else:
+            query = f"{name.split()[0]} {address.split(', ')[1]}"
+        index._ranked = (None, [], 0)
+        t = time.perf_counter()
+        hits, total = index.search(query)
+        times.append((time.perf_counter() - t) * 1000)
+        # Namesakes tie, so what counts is the customer scoring as high as the best hit
+        words = tokens(query)
+        mine = sum(index._doc_score(rows[cid - 1][1:], w, index._expand(w)) for w in words) / len(words)
+        found += bool(hits) and round(mine, 3) >= hits[0][0]
+    times.sort()
+    print(f"{queries} queries: p50 {times[len(times) // 2]:.1f} ms  p95 {times[int(len(times) * 0.95)]:.1f} ms  "
+          f"max {times[-1]:.1f} ms; customer among the best matches for {found / queries:.0%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search customers by name, mobile, email or address")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("query", help="search the customers table")
+    p.add_argument("text")
+    p.add_argument("--page", type=int, default=1)
+    p = sub.add_parser("bench", help="time searches over generated customers")
+    p.add_argument("--customers", type=int, default=1000000)
+    p.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "bench":
+        bench(args.customers, args.queries)
+        return 0
+    index = Index()
+    db = storage.connect()
+    try:
+        index.catch_up(db)
+    finally:
+        db.close()
+    hits, total = index.search(args.text, args.page)
+    print(f"{total:,} matches")
+    for score, cid, name, mobile, email, address in hits:
+        print(f"{score:5.2f}  {cid:>8}  {name:<24}{mobile:<14}{email:<32}{address}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,32 @@
+import sys
+import socket
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox
-import mysql.connector
+import config
+import storage
 import random
 from datetime import datetime
+from decimal import Decimal
+from offline_journal import OfflineJournal, JournalReplayer, JournalError
+import idempotency
+import tracing
+import profiling
+from tree_loader import TreeLoader
+import rollups
+import velocity
+import archive
+import banking
+import hot_accounts
+import routing
+import outbox
+import account_status
+import audit
+import throttle
+import customer_search
+from teller_client import TellerClient, parse_address
+from account_rules import (generate_ifsc, is_valid_date, is_positive_amount, sanitize_amount,
+                           is_valid_mobile, is_valid_pin)
 
 # Optional PIL flag (not used in this layout fix)
 try:
@@ -26,13 +50,14 @@ except Exception as e:
 
 
 # ==================== Database Connection ====================
-def connect_db():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="puppy",
-        database="bank_db"
-    )
+def connect_db(read_only=False):
+    # Backend and credentials come from bank.ini (see config.py); with replicas
+    # configured, read-only callers may get a replica (see routing.py)
+    return tracing.connect(lambda: routing.connect(read_only))
+
+
+# Login and PIN attempts from this machine share one terminal bucket
+TERMINAL = socket.gethostname()
 
 
 # ==================== Utility Functions =====================
@@ -51,37 +76,9 @@ def generate_acc_no():
             return acc_no
 
 
-def generate_ifsc():
-    return f"IFSC{random.randint(1000, 9999)}"
-
-
-def is_valid_date(date_text):
-    try:
-        datetime.strptime(date_text, "%Y-%m-%d")
-        return True
-    except ValueError:
-        return False
-
-
-def is_positive_amount(text):
-    try:
-        val = float(text)
-        return val > 0
-    except:
-        return False
-
-
-def sanitize_amount(text):
-    return f"{float(text):.2f}"
-
-
-def is_valid_mobile(m):
-    return m.isdigit() and len(m) == 10
-
-
 def build_whatsapp_summary(account_no):
     try:
-        db = connect_db()
+        db = connect_db(read_only=True)
         cur = db.cursor()
         cur.execute("""
             SELECT a.balance, a.cust_name, c.mobile
@@ -94,15 +91,11 @@ def build_whatsapp_summary(account_no):
             db.close()
             return None, None, "Account not found"
         balance, cust_name, mobile = row
+        pending = hot_accounts.pending(db, account_no)
+        if pending:
+            balance = Decimal(str(balance)) + pending
 
-        cur.execute("""
-            SELECT txn_type, amount, txn_date
-            FROM transactions
-            WHERE account_no=%s
-            ORDER BY txn_date DESC, txn_id DESC
-            LIMIT 5
-        """, (account_no,))
-        txns = cur.fetchall()
+        txns = archive.recent_history(db, account_no, 5)
         db.close()
 
         lines = [
@@ -143,7 +136,7 @@ def send_whatsapp_message(mobile, message):
 
 # ==================== Main App Class ========================
 class BankApp:
-    def __init__(self, root):
+    def __init__(self, root, profiler=None, bank=None):
         self.root = root
         self.root.title("🏦 BANK MANAGEMENT SYSTEM")
         self.root.geometry("1200x700")
@@ -169,6 +162,60 @@ class BankApp:
         self.emp_name = None
         self.cust_name = None
         self.cust_acc_no = None
+        # A customer whose account this process blocks is signed out at once;
+        # blocks from elsewhere are caught by show_frame
+        account_status.subscribe(self._on_status_change)
+
+        # Idempotency keys per posting form (double clicks / retries post once)
+        self.form_keys = idempotency.FormKeys()
+
+        # Postings, balances and history go through self.bank: the database
+        # directly, or a teller server (teller_server.py) when one is given
+        self.journal = self.replayer = None
+        self.bank = bank
+        if bank is None:
+            features = config.get().features
+            # Offline journal: postings made while MySQL is down are replayed later
+            if features.offline_journal:
+                self.journal = OfflineJournal()
+                self.replayer = JournalReplayer(self.journal, connect_db)
+                self.replayer.start()
+
+            # Velocity limits and new-payee holds, checked in memory before each debit
+            engine = velocity.VelocityEngine() if features.velocity_checks else None
+            if engine:
+                try:
+                    db = connect_db()
+                    try:
+                        engine.rebuild(db)
+                    finally:
+                        db.close()
+                except storage.DB_ERRORS as e:
+                    print("Velocity windows not rebuilt:", e)
+            self.bank = banking.LocalBank(connect_db, engine,
+                                          read_connect=lambda: connect_db(read_only=True),
+                                          on_write=routing.note_write)
+            # Credits to hot accounts land in stripes; fold them in regularly
+            hot_accounts.Folder(connect_db).start()
+        # The history pages sit behind a login and read the database directly,
+        # like the admin pages: a teller server serves history only per PIN
+        self.ledger = banking.LocalBank(connect_db, read_connect=lambda: connect_db(read_only=True))
+
+        # Login and PIN attempts are throttled in memory before they reach
+        # the database (see throttle.py)
+        self.throttle = throttle.Throttle(connect_db).start() if throttle.ENABLED else None
+
+        # Customer search index (see customer_search.py), filled in the background
+        self.customers = customer_search.Index().load_async(lambda: connect_db(read_only=True))
+
+        # Query timings are dumped periodically when [tracing] metrics_path is set
+        if tracing.METRICS_PATH:
+            self.root.after(tracing.METRICS_INTERVAL_MS, self._dump_metrics)
+
+        # Opt-in profiling: must be installed before any button is created
+        self.profiler = profiler
+        if profiler:
+            profiler.install(self)
 
         # Frames
         pages = [
@@ -176,7 +223,8 @@ class BankApp:
             "emp_dash","cust_dash",
             "add_cust","create_acc",
             "deposit","withdraw","block","transactions","transfer","pin_change",
-            "cust_deposit","cust_withdraw","cust_transactions","cust_balance"
+            "cust_deposit","cust_withdraw","cust_transactions","cust_balance",
+            "analytics"
         ]
         self.frames = {}
         self.left_canvases = {}
@@ -207,6 +255,7 @@ class BankApp:
         self.create_cust_withdraw()
         self.create_cust_transactions()  # full-width, scrollable per request
         self.create_cust_balance()
+        self.create_analytics()  # full-width like cust_transactions
 
         self.show_frame("main")
 
@@ -330,31 +379,94 @@ class BankApp:
 
     # -------------------- Navigation --------------------
     def show_frame(self, name):
-        # Special layout for full-width customer transactions
-        if name == "cust_transactions":
-            # Hide left hero and right panel
-            self.left_canvases[name].place_forget()
-            self.right_panels[name].place_forget()
+        if self.cust_acc_no and name.startswith("cust_") and not self._customer_active():
+            self._signout_blocked()
+            return
+        # Special layout for full-width pages
+        if name in ("cust_transactions", "analytics"):
+            # Hide left hero and right panel (already destroyed by the custom layout)
+            for widget in (self.left_canvases[name], self.right_panels[name]):
+                if widget.winfo_exists():
+                    widget.place_forget()
         else:
             # Restore default layout
             self.left_canvases[name].place(relx=0, rely=0, relwidth=0.55, relheight=1)
             self.right_panels[name].place(relx=0.57, rely=0.05, relwidth=0.38, relheight=0.9)
 
         self.frames[name].tkraise()
+        self.form_keys.reset(name)
         if name == "create_acc":
             self.refresh_cust_ids()
             self.refresh_cust_names()
+        if name == "analytics":
+            self.load_analytics()
+
+    def _dump_metrics(self):
+        try:
+            tracing.dump(tracing.METRICS_PATH)
+        except OSError as e:
+            print("Metrics dump failed:", e)
+        self.root.after(tracing.METRICS_INTERVAL_MS, self._dump_metrics)
+
+    def _on_status_change(self, accounts, status):
+        # May run on a worker thread: hand over to the Tk loop
+        if status != "Active" and self.cust_acc_no in accounts:
+            self.root.after(0, self._signout_blocked)
+
+    def _customer_active(self):
+        # A block made by another process (account_status.py) only reaches
+        # this one through the database
+        try:
+            db = connect_db()
+            cur = db.cursor()
+            cur.execute("SELECT status FROM accounts WHERE account_no=%s", (self.cust_acc_no,))
+            row = cur.fetchone()
+            db.close()
+        except Exception:
+            return True   # database unreachable: the page reports it itself
+        return row is not None and row[0] == "Active"
+
+    def _signout_blocked(self):
+        if self.cust_acc_no is None:
+            return
+        self.logout()
+        messagebox.showerror("Error", "Account is blocked. Contact bank.")
 
     def logout(self):
         if hasattr(self, 'emp_email'): self.emp_email.delete(0, 'end')
         if hasattr(self, 'emp_pass'): self.emp_pass.delete(0, 'end')
         if hasattr(self, 'cust_acc'): self.cust_acc.delete(0, 'end')
         if hasattr(self, 'cust_pin'): self.cust_pin.delete(0, 'end')
+        if self.emp_name or self.cust_acc_no:
+            audit.record("logout", self.emp_name or self.cust_name, self.cust_acc_no)
         self.emp_name = None
         self.cust_name = None
         self.cust_acc_no = None
         self.show_frame("main")
 
+    # ==================== Login Throttling ====================
+    def _throttle_check(self, action, actor=None, **who):
+        # Keys to report the outcome on ([] with throttling off), or None
+        # when the attempt is refused
+        if self.throttle is None:
+            return []
+        keys = self.throttle.keys(terminal=TERMINAL, **who)
+        try:
+            self.throttle.check(keys)
+        except throttle.Throttled as e:
+            audit.record(action, actor, who.get("account"), str(e))
+            messagebox.showerror("Error", str(e))
+            return None
+        return keys
+
+    def _throttle_result(self, keys, ok):
+        # ok: True (credentials right), False (wrong) or None (not checked,
+        # e.g. the database failed; the token is refunded). Only the first
+        # report counts: it empties keys
+        if keys:
+            self.throttle.settle(list(keys), ok)
+            keys.clear()
+
     # ==================== Main ====================
     def create_main(self):
         name = "main"
@@ -392,25 +504,33 @@ class BankApp:
         ttk.Button(right, text="Login", style="Secondary.TButton", command=self.employee_login).pack(fill="x", padx=20, pady=6)
         ttk.Button(right, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("main")).pack(fill="x", padx=20, pady=6)
 
+    @tracing.traced
     def employee_login(self):
         email = self.emp_email.get().strip()
         password = self.emp_pass.get().strip()
         if not email or not password:
             messagebox.showerror("Error", "Fill all fields")
             return
+        keys = self._throttle_check("employee_login", email, email=email)
+        if keys is None:
+            return
         try:
             db = connect_db()
             cur = db.cursor()
             cur.execute("SELECT emp_id, name FROM employees WHERE email=%s AND password=%s", (email, password))
             res = cur.fetchone()
             db.close()
+            self._throttle_result(keys, res is not None)
             if res:
+                audit.record("employee_login", email)
                 self.emp_name = res[1]
                 self.emp_welcome.config(text=f"Welcome Employee: {self.emp_name}")
                 self.show_frame("emp_dash")
             else:
+                audit.record("employee_login", email, outcome="Invalid Email or Password")
                 messagebox.showerror("Error", "Invalid Email or Password")
         except Exception as e:
+            self._throttle_result(keys, None)
             messagebox.showerror("Error", str(e))
 
     # ==================== Customer Login ====================
@@ -436,12 +556,16 @@ class BankApp:
         ttk.Button(right, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("main")).pack(
             fill="x", padx=20, pady=6)
 
+    @tracing.traced
     def customer_login(self):
         email = self.cust_email.get().strip()
         password = self.cust_pass.get().strip()
         if not email or not password:
             messagebox.showerror("Error", "Fill all fields")
             return
+        keys = self._throttle_check("customer_login", email, email=email)
+        if keys is None:
+            return
         try:
             db = connect_db()
             cur = db.cursor()
@@ -453,17 +577,22 @@ class BankApp:
             """, (email, password))
             res = cur.fetchone()
             db.close()
+            self._throttle_result(keys, res is not None)
             if res:
                 if res[2] != "Active":
+                    audit.record("customer_login", email, res[0], "Account is blocked")
                     messagebox.showerror("Error", "Account is blocked. Contact bank.")
                     return
+                audit.record("customer_login", email, res[0])
                 self.cust_name = res[1]
                 self.cust_acc_no = res[0]
                 self.cust_welcome.config(text=f"Welcome Customer: {self.cust_name}")
                 self.show_frame("cust_dash")
             else:
+                audit.record("customer_login", email, outcome="Invalid Email or Password")
                 messagebox.showerror("Error", "Invalid Email or Password")
         except Exception as e:
+            self._throttle_result(keys, None)
             messagebox.showerror("Error", str(e))
 
     # ==================== Employee Dashboard ====================
@@ -484,6 +613,7 @@ class BankApp:
             ("View Customers & Accounts", self.view_all_accounts),
             ("Block / Unblock Account", lambda: self.show_frame("block")),
             ("View Transactions", lambda: self.show_frame("transactions")),
+            ("Branch Analytics", lambda: self.show_frame("analytics")),
         ]
         for text, cmd in buttons:
             ttk.Button(right, text=text, style="Secondary.TButton", command=cmd).pack(fill="x", padx=20, pady=6)
@@ -572,6 +702,7 @@ class BankApp:
                    command=lambda: self.show_frame("emp_dash")).pack(side="left", expand=True, fill="x", padx=(4, 0),
                                                                      ipady=1)
 
+    @tracing.traced
     def add_customer(self):
         fname = self.first_name.get().strip()
         lname = self.last_name.get().strip()
@@ -604,6 +735,8 @@ class BankApp:
             cur.execute("SELECT LAST_INSERT_ID()")
             cust_id = cur.fetchone()[0]
             db.close()
+            routing.note_write()
+            self.customers.add(cust_id, name, mobile, email, addr)
             messagebox.showinfo("Success", f"Customer Added! ID: {cust_id}")
 
             # clear fields
@@ -650,13 +783,15 @@ class BankApp:
         self.ca_contact_lbl.pack(anchor="w", pady=(0,4))
 
         small_row = tk.Frame(form, bg=self.colors["panel"]); small_row.pack(fill="x", pady=(6,0))
-        ttk.Button(small_row, text="Load Contact", style="Secondary.TButton", command=self.load_selected_contact).pack(side="left", fill="x", expand=True, padx=(0,6))
+        ttk.Button(small_row, text="Find Customer", style="Secondary.TButton", command=lambda: self.open_customer_search(self.ca_cust_name.get().strip())).pack(side="left", fill="x", expand=True, padx=(0,6))
+        ttk.Button(small_row, text="Load Contact", style="Secondary.TButton", command=self.load_selected_contact).pack(side="left", fill="x", expand=True, padx=6)
         ttk.Button(small_row, text="Create Account", style="Secondary.TButton", command=self.create_account).pack(side="left", fill="x", expand=True, padx=(6,0))
 
         bottom_row = tk.Frame(right, bg=self.colors["panel"]); bottom_row.pack(fill="x", padx=20, pady=8)
         ttk.Button(bottom_row, text="Refresh Customers", style="Secondary.TButton", command=self.refresh_customers).pack(side="left", expand=True, fill="x", padx=(0,6))
         ttk.Button(bottom_row, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("emp_dash")).pack(side="left", expand=True, fill="x", padx=(6,0))
 
+    @tracing.traced
     def fetch_customer_ids(self):
         try:
             db = connect_db()
@@ -668,6 +803,7 @@ class BankApp:
         except:
             return []
 
+    @tracing.traced
     def fetch_customer_names(self):
         try:
             db = connect_db()
@@ -689,6 +825,7 @@ class BankApp:
         self.refresh_cust_ids()
         self.refresh_cust_names()
 
+    @tracing.traced
     def load_selected_contact(self):
         cust_id = self.ca_cust_id.get().strip()
         name = self.ca_cust_name.get().strip()
@@ -704,6 +841,10 @@ class BankApp:
                 return
             row = cur.fetchone()
             db.close()
+            if not row and not cust_id:
+                # No exact name: let the employee pick from the closest ones
+                self.open_customer_search(name)
+                return
             if not row:
                 messagebox.showerror("Error", "Customer not found")
                 return
@@ -717,6 +858,66 @@ class BankApp:
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def open_customer_search(self, query=""):
+        win = tk.Toplevel(self.root); win.title("Find Customer"); win.geometry("1100x520")
+        win.configure(bg=self.colors["bg"])
+        bar = tk.Frame(win, bg=self.colors["bg"]); bar.pack(fill="x", padx=20, pady=(20, 6))
+        entry = ttk.Entry(bar, style="Dark.TEntry"); entry.pack(side="left", fill="x", expand=True, padx=(0, 6))
+        entry.insert(0, query)
+        status = tk.Label(win, text="Name, mobile, email or address", bg=self.colors["bg"],
+                          fg=self.colors["text_muted"], font=("Segoe UI", 10))
+        status.pack(anchor="w", padx=20)
+
+        tv_frame = tk.Frame(win, bg=self.colors["bg"]); tv_frame.pack(fill="both", expand=True, padx=20, pady=6)
+        scroll_y = ttk.Scrollbar(tv_frame, orient="vertical")
+        tv = ttk.Treeview(tv_frame, style="Dark.Treeview",
+                          columns=("Cust ID","Name","Mobile","Email","Address","Match"),
+                          show="headings", yscrollcommand=scroll_y.set)
+        scroll_y.config(command=tv.yview)
+        scroll_y.pack(side="right", fill="y")
+        tv.pack(fill="both", expand=True)
+        for col, w in [("Cust ID",80),("Name",180),("Mobile",120),("Email",220),("Address",300),("Match",70)]:
+            tv.heading(col, text=col); tv.column(col, width=w, stretch=True)
+
+        page = [1]
+
+        def run(p=1):
+            try:
+                self.customers.refresh(lambda: connect_db(read_only=True))
+            except storage.DB_ERRORS as e:
+                print("Customer index not refreshed:", e)
+            hits, total = self.customers.search(entry.get(), p)
+            pages = max(1, -(-min(total, customer_search.MAX_RESULTS) // customer_search.PAGE_SIZE))
+            page[0] = min(max(p, 1), pages)
+            if page[0] != p:
+                hits, total = self.customers.search(entry.get(), page[0])
+            tv.delete(*tv.get_children())
+            for score, cid, name, mobile, email, address in hits:
+                tv.insert("", "end", values=(cid, name, mobile, email, address, f"{score:.2f}"))
+            status.config(text=f"{total:,} matches, page {page[0]} of {pages}"
+                          + ("" if self.customers.ready.is_set() else " (still loading customers)"))
+
+        def pick(event=None):
+            sel = tv.selection()
+            if not sel:
+                return
+            self.ca_cust_id.set(tv.item(sel[0], "values")[0])
+            self.ca_cust_name.set("")
+            win.destroy()
+            self.load_selected_contact()
+
+        ttk.Button(bar, text="Search", style="Secondary.TButton", command=lambda: run(1)).pack(side="left", padx=6)
+        nav = tk.Frame(win, bg=self.colors["bg"]); nav.pack(fill="x", padx=20, pady=(0, 20))
+        ttk.Button(nav, text="Previous", style="Secondary.TButton", command=lambda: run(page[0] - 1)).pack(side="left", expand=True, fill="x", padx=(0, 6))
+        ttk.Button(nav, text="Next", style="Secondary.TButton", command=lambda: run(page[0] + 1)).pack(side="left", expand=True, fill="x", padx=6)
+        ttk.Button(nav, text="Use Selected", style="Secondary.TButton", command=pick).pack(side="left", expand=True, fill="x", padx=(6, 0))
+        entry.bind("<Return>", lambda e: run(1))
+        tv.bind("<Double-1>", pick)
+        entry.focus_set()
+        if query:
+            run(1)
+
+    @tracing.traced
     def create_account(self):
         cust_id = self.ca_cust_id.get().strip()
         acc_type = self.ca_type.get().strip()
@@ -726,8 +927,8 @@ class BankApp:
         if not all([cust_id, acc_type, pin, deposit]):
             messagebox.showerror("Error", "Fill all fields")
             return
-        if len(pin) < 4 or not pin.isdigit():
-            messagebox.showerror("Error", "PIN must be at least 4 digits")
+        if not is_valid_pin(pin):
+            messagebox.showerror("Error", "PIN must be 4 to 10 digits")
             return
         if not is_positive_amount(deposit):
             messagebox.showerror("Error", "Initial deposit must be positive")
@@ -756,9 +957,12 @@ class BankApp:
                 INSERT INTO transactions(account_no, cust_name, txn_type, amount)
                 VALUES (%s,%s,%s,%s)
             """, (acc_no, cust_name, "Deposit", sanitize_amount(deposit)))
+            outbox.publish(cur, "Opened", acc_no, name=cust_name, account_type=acc_type,
+                           amount=sanitize_amount(deposit))
 
             db.commit()
             db.close()
+            routing.note_write()
 
             messagebox.showinfo("Success", f"Account Created!\nAccount No: {acc_no}\nIFSC: {ifsc}")
             self.ca_cust_id.set('')
@@ -798,6 +1002,7 @@ class BankApp:
         ttk.Button(bottom_row, text="Deposit", style="Secondary.TButton", command=self.deposit_amount).pack(side="left", expand=True, fill="x", padx=(0,6))
         ttk.Button(bottom_row, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("emp_dash")).pack(side="left", expand=True, fill="x", padx=(6,0))
 
+    @tracing.traced
     def deposit_amount(self):
         acc = self.dep_acc.get().strip()
         name = self.dep_name.get().strip()
@@ -807,31 +1012,8 @@ class BankApp:
             messagebox.showerror("Error", "Fill all fields"); return
         if not is_positive_amount(amt):
             messagebox.showerror("Error", "Amount must be positive"); return
-        try:
-            db = connect_db(); cur = db.cursor()
-            cur.execute("""
-                SELECT c.name, a.status, a.pin
-                FROM accounts a JOIN customers c ON a.cust_id=c.cust_id
-                WHERE a.account_no=%s
-            """, (acc,))
-            row = cur.fetchone()
-            if not row:
-                db.close(); messagebox.showerror("Error", "Account not found"); return
-            db_name, status, real_pin = row
-            if status != "Active":
-                db.close(); messagebox.showerror("Error", "Account is blocked"); return
-            if db_name.strip().lower() != name.strip().lower():
-                db.close(); messagebox.showerror("Error", "Name does not match account"); return
-            if real_pin != pin:
-                db.close(); messagebox.showerror("Error", "Incorrect PIN"); return
-
-            cur.execute("UPDATE accounts SET balance = balance + %s WHERE account_no=%s", (sanitize_amount(amt), acc))
-            cur.execute("INSERT INTO transactions(account_no, cust_name, txn_type, amount) VALUES (%s,%s,%s,%s)", (acc, db_name, "Deposit", sanitize_amount(amt)))
-            db.commit(); db.close()
-            messagebox.showinfo("Success", "Deposit successful")
+        if self._post("deposit", "Deposit", acc, name, pin, amt):
             self.dep_amt.delete(0,'end')
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
 
     # ==================== Withdraw (Employee) ====================
     def create_withdraw(self):
@@ -860,6 +1042,7 @@ class BankApp:
         ttk.Button(bottom_row, text="Withdraw", style="Secondary.TButton", command=self.withdraw_amount).pack(side="left", expand=True, fill="x", padx=(0,6))
         ttk.Button(bottom_row, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("emp_dash")).pack(side="left", expand=True, fill="x", padx=(6,0))
 
+    @tracing.traced
     def withdraw_amount(self):
         acc = self.wd_acc.get().strip()
         name = self.wd_name.get().strip()
@@ -869,33 +1052,8 @@ class BankApp:
             messagebox.showerror("Error", "Fill all fields"); return
         if not is_positive_amount(amt):
             messagebox.showerror("Error", "Amount must be positive"); return
-        try:
-            db = connect_db(); cur = db.cursor()
-            cur.execute("""
-                SELECT c.name, a.status, a.pin, a.balance
-                FROM accounts a JOIN customers c ON a.cust_id=c.cust_id
-                WHERE a.account_no=%s
-            """, (acc,))
-            row = cur.fetchone()
-            if not row:
-                db.close(); messagebox.showerror("Error", "Account not found"); return
-            db_name, status, real_pin, bal = row
-            if status != "Active":
-                db.close(); messagebox.showerror("Error", "Account is blocked"); return
-            if db_name.strip().lower() != name.strip().lower():
-                db.close(); messagebox.showerror("Error", "Name does not match account"); return
-            if real_pin != pin:
-                db.close(); messagebox.showerror("Error", "Incorrect PIN"); return
-            if float(bal) < float(amt):
-                db.close(); messagebox.showerror("Error", "Insufficient balance"); return
-
-            cur.execute("UPDATE accounts SET balance = balance - %s WHERE account_no=%s", (sanitize_amount(amt), acc))
-            cur.execute("INSERT INTO transactions(account_no, cust_name, txn_type, amount) VALUES (%s,%s,%s,%s)", (acc, db_name, "Withdraw", sanitize_amount(amt)))
-            db.commit(); db.close()
-            messagebox.showinfo("Success", "Withdrawal successful")
+        if self._post("withdraw", "Withdraw", acc, name, pin, amt, message="Withdrawal successful"):
             self.wd_amt.delete(0,'end')
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
 
     # ==================== Block / Unblock ====================
     def create_block_account(self):
@@ -918,17 +1076,22 @@ class BankApp:
         ttk.Button(bottom_row, text="Update Status", style="Secondary.TButton", command=self.update_account_status).pack(side="left", expand=True, fill="x", padx=(0,6))
         ttk.Button(bottom_row, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("emp_dash")).pack(side="left", expand=True, fill="x", padx=(6,0))
 
+    @tracing.traced
     def update_account_status(self):
         acc = self.blk_acc.get().strip()
         status = self.blk_status.get().strip()
         if not acc or status not in ["Active", "Blocked"]:
             messagebox.showerror("Error", "Provide account number and valid status"); return
         try:
-            db = connect_db(); cur = db.cursor()
-            cur.execute("UPDATE accounts SET status=%s WHERE account_no=%s", (status, acc))
-            if cur.rowcount == 0:
-                db.close(); messagebox.showerror("Error", "Account not found"); return
-            db.commit(); db.close()
+            db = connect_db()
+            try:
+                missing = account_status.apply(db, status, [acc], "Employee form",
+                                               self.emp_name or "employee")[3]
+            finally:
+                db.close()
+            routing.note_write()
+            if missing:
+                messagebox.showerror("Error", "Account not found"); return
             messagebox.showinfo("Success", f"Account status set to {status}")
             self.blk_acc.delete(0,'end'); self.blk_status.set('')
         except Exception as e:
@@ -968,32 +1131,23 @@ class BankApp:
         for col, w in [("Txn ID",80),("Account No",150),("Name",180),("Type",120),("Amount",120),("Date",220)]:
             self.txn_tree.heading(col, text=col); self.txn_tree.column(col, width=w, minwidth=80, stretch=True)
 
+        self.txn_status = tk.Label(right, text="", fg=self.colors["text_muted"], bg=self.colors["panel"],
+                                   font=("Segoe UI", 10))
+        self.txn_status.pack(anchor="w", padx=20)
+        self.txn_loader = TreeLoader(self.txn_tree, key=lambda r: r[0],
+                                     on_progress=lambda done, total: self._show_progress(self.txn_status, done, total))
+
         back_row = tk.Frame(right, bg=self.colors["panel"])
         back_row.pack(fill="x", padx=20, pady=8)
         ttk.Button(back_row, text="Back", style="Secondary.TButton",
                    command=lambda: self.show_frame("emp_dash")).pack(fill="x")
 
+    @tracing.traced
     def view_transactions(self):
         acc = self.txn_acc.get().strip()
         try:
-            db = connect_db(); cur = db.cursor()
-            if acc:
-                cur.execute("""
-                    SELECT txn_id, account_no, cust_name, txn_type, amount, txn_date
-                    FROM transactions
-                    WHERE account_no=%s
-                    ORDER BY txn_date ASC, txn_id ASC
-                """, (acc,))
-            else:
-                cur.execute("""
-                    SELECT txn_id, account_no, cust_name, txn_type, amount, txn_date
-                    FROM transactions
-                    ORDER BY txn_date ASC, txn_id ASC
-                    LIMIT 200
-                """)
-            rows = cur.fetchall(); db.close()
-            for i in self.txn_tree.get_children(): self.txn_tree.delete(i)
-            for r in rows: self.txn_tree.insert("", "end", values=r)
+            rows = self.ledger.history(acc or None, 200)
+            self.txn_loader.load(rows)
             if not rows:
                 messagebox.showinfo("Info", "No transactions found")
         except Exception as e:
@@ -1023,6 +1177,7 @@ class BankApp:
         ttk.Button(bottom_row, text="Deposit", style="Secondary.TButton", command=self.cust_deposit_amount).pack(side="left", expand=True, fill="x", padx=(0,6))
         ttk.Button(bottom_row, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("cust_dash")).pack(side="left", expand=True, fill="x", padx=(6,0))
 
+    @tracing.traced
     def cust_deposit_amount(self):
         acc = self.cdep_acc.get().strip()
         name = self.cdep_name.get().strip()
@@ -1032,7 +1187,7 @@ class BankApp:
             messagebox.showerror("Error","Fill all fields"); return
         if not is_positive_amount(amt):
             messagebox.showerror("Error","Amount must be positive"); return
-        self._money_op(acc, name, pin, amt, op="Deposit")
+        self._money_op(acc, name, pin, amt, op="Deposit", form="cust_deposit")
 
     # ==================== Customer Withdraw ====================
     def create_cust_withdraw(self):
@@ -1058,6 +1213,7 @@ class BankApp:
         ttk.Button(bottom_row, text="Withdraw", style="Secondary.TButton", command=self.cust_withdraw_amount).pack(side="left", expand=True, fill="x", padx=(0,6))
         ttk.Button(bottom_row, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("cust_dash")).pack(side="left", expand=True, fill="x", padx=(6,0))
 
+    @tracing.traced
     def cust_withdraw_amount(self):
         acc = self.cwd_acc.get().strip()
         name = self.cwd_name.get().strip()
@@ -1067,38 +1223,46 @@ class BankApp:
             messagebox.showerror("Error","Fill all fields"); return
         if not is_positive_amount(amt):
             messagebox.showerror("Error","Amount must be positive"); return
-        self._money_op(acc, name, pin, amt, op="Withdraw")
+        self._money_op(acc, name, pin, amt, op="Withdraw", form="cust_withdraw")
 
-    def _money_op(self, acc, name, pin, amt, op="Deposit"):
+    def _money_op(self, acc, name, pin, amt, op="Deposit", form=None):
+        self._post(form or op, op, acc, name, pin, amt)
+
+    def _post(self, form, op, acc, name, pin, amt, message=None):
+        # Posts through self.bank; True when posted (or journaled offline)
+        amt = sanitize_amount(amt)
+        key = self.form_keys.key_for(form, idempotency.fingerprint(op, acc, amt))
         try:
-            db = connect_db(); cur = db.cursor()
-            cur.execute("""
-                SELECT c.name, a.status, a.pin, a.balance
-                FROM accounts a JOIN customers c ON a.cust_id=c.cust_id
-                WHERE a.account_no=%s
-            """, (acc,))
-            row = cur.fetchone()
-            if not row:
-                db.close(); messagebox.showerror("Error","Account not found"); return
-            db_name, status, real_pin, bal = row
-            if status != "Active":
-                db.close(); messagebox.showerror("Error","Account is blocked"); return
-            if db_name.strip().lower() != name.strip().lower():
-                db.close(); messagebox.showerror("Error","Name does not match account"); return
-            if real_pin != pin:
-                db.close(); messagebox.showerror("Error","Incorrect PIN"); return
-            if op == "Withdraw" and float(bal) < float(amt):
-                db.close(); messagebox.showerror("Error","Insufficient balance"); return
-
-            if op == "Deposit":
-                cur.execute("UPDATE accounts SET balance = balance + %s WHERE account_no=%s", (sanitize_amount(amt), acc))
-            else:
-                cur.execute("UPDATE accounts SET balance = balance - %s WHERE account_no=%s", (sanitize_amount(amt), acc))
-            cur.execute("INSERT INTO transactions(account_no, cust_name, txn_type, amount) VALUES (%s,%s,%s,%s)", (acc, db_name, op, sanitize_amount(amt)))
-            db.commit(); db.close()
-            messagebox.showinfo("Success", f"{op} successful")
+            result = self.bank.post(acc, name, pin, amt, op, key=key, message=message)
+        except banking.PostingHeld as e:
+            self.form_keys.reset(form)
+            messagebox.showinfo("On hold", str(e)); return False
+        except banking.Unavailable as e:
+            # Nothing is known to have posted: a retry keeps the key
+            if self.journal is None:
+                messagebox.showerror("Error", str(e)); return False
+            if self._post_offline(acc, name, pin, amt, op):
+                self.form_keys.reset(form)
+                return True
+            return False
+        except banking.BankError as e:
+            self.form_keys.reset(form)
+            messagebox.showerror("Error", str(e)); return False
         except Exception as e:
-            messagebox.showerror("Error", str(e))
+            messagebox.showerror("Error", str(e)); return False
+        self.form_keys.reset(form)
+        messagebox.showinfo("Success", result)
+        return True
+
+    def _post_offline(self, acc, name, pin, amt, op):
+        try:
+            self.journal.append(acc, name, pin, op, sanitize_amount(amt))
+        except JournalError as e:
+            messagebox.showerror("Error", f"Database unreachable. {e}")
+            return False
+        messagebox.showinfo("Offline", f"Database unreachable. {op} of ₹{sanitize_amount(amt)} "
+                                       f"recorded offline and will post automatically.")
+        return True
 
     # ==================== Customer Transactions (Full-width) ====================
     def create_cust_transactions(self):
@@ -1152,21 +1316,28 @@ class BankApp:
             self.ctx_tree.heading(col, text=col)
             self.ctx_tree.column(col, width=w, minwidth=100, stretch=True)
 
+        self.ctx_status = tk.Label(search_bar, text="", fg=self.colors["text_muted"], bg=self.colors["bg"],
+                                   font=("Segoe UI", 10))
+        self.ctx_status.pack(side="left", padx=10)
+        self.ctx_loader = TreeLoader(self.ctx_tree, key=lambda r: r[0],
+                                     on_progress=lambda done, total: self._show_progress(self.ctx_status, done, total))
+
+    def _show_progress(self, label, done, total):
+        if not total:
+            label.config(text="")
+        elif done < total:
+            label.config(text=f"Loading {done:,} / {total:,} rows...")
+        else:
+            label.config(text=f"{total:,} rows")
+
+    @tracing.traced
     def view_cust_transactions(self):
         acc = self.ctx_acc.get().strip()
         if not acc:
             messagebox.showerror("Error", "Enter account number"); return
         try:
-            db = connect_db(); cur = db.cursor()
-            cur.execute("""
-                SELECT txn_id, account_no, cust_name, txn_type, amount, txn_date
-                FROM transactions
-                WHERE account_no=%s
-                ORDER BY txn_date ASC, txn_id ASC
-            """, (acc,))
-            rows = cur.fetchall(); db.close()
-            for i in self.ctx_tree.get_children(): self.ctx_tree.delete(i)
-            for r in rows: self.ctx_tree.insert("", "end", values=r)
+            rows = self.ledger.history(acc)
+            self.ctx_loader.load(rows)
             if not rows:
                 messagebox.showinfo("Info", "No transactions found")
         except Exception as e:
@@ -1190,37 +1361,44 @@ class BankApp:
         ttk.Button(bottom_row, text="Check Balance", style="Secondary.TButton", command=self.view_balance).pack(side="left", expand=True, fill="x", padx=(0,6))
         ttk.Button(bottom_row, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("cust_dash")).pack(side="left", expand=True, fill="x", padx=(6,0))
 
+    @tracing.traced
     def view_balance(self):
         acc = self.vb_acc.get().strip()
         pin = self.vb_pin.get().strip()
         if not acc or not pin:
             messagebox.showerror("Error","Enter account and PIN"); return
+        keys = self._throttle_check("view_balance", self.emp_name or self.cust_name, account=acc)
+        if keys is None:
+            return
         try:
-            db = connect_db(); cur = db.cursor()
-            cur.execute("SELECT balance, status, pin FROM accounts WHERE account_no=%s", (acc,))
-            row = cur.fetchone(); db.close()
-            if not row:
-                messagebox.showerror("Error","Account not found"); return
-            bal, status, real_pin = row
-            if status != "Active":
-                messagebox.showerror("Error","Account is blocked"); return
-            if real_pin != pin:
-                messagebox.showerror("Error","Incorrect PIN"); return
+            bal = self.bank.balance(acc, pin)
+            self._throttle_result(keys, True)
             messagebox.showinfo("Balance", f"Your Balance: ₹{bal}")
+        except banking.AuthError as e:
+            self._throttle_result(keys, False)
+            messagebox.showerror("Error", str(e))
         except Exception as e:
+            self._throttle_result(keys, None)
             messagebox.showerror("Error", str(e))
 
     # ==================== Employee: View Customers & Accounts ====================
+    @tracing.traced
     def view_all_accounts(self):
         try:
-            db = connect_db(); cur = db.cursor()
+            db = connect_db(read_only=True); cur = db.cursor()
             cur.execute("""
                 SELECT c.cust_id, c.name, c.mobile, a.account_no, a.account_type, a.balance, a.status
                 FROM customers c
                 LEFT JOIN accounts a ON c.cust_id = a.cust_id
                 ORDER BY c.cust_id ASC
             """)
-            rows = cur.fetchall(); db.close()
+            rows = cur.fetchall()
+            # Hot accounts hold part of their balance in stripes until folded
+            pending = hot_accounts.pending_by_account(db)
+            db.close()
+            if pending:
+                rows = [r[:5] + (Decimal(str(r[5])) + pending[r[3]],) + r[6:] if r[3] in pending else r
+                        for r in rows]
 
             win = tk.Toplevel(self.root); win.title("Customers & Accounts"); win.geometry("1000x500")
             win.configure(bg=self.colors["bg"])
@@ -1240,15 +1418,133 @@ class BankApp:
             for col, w in [("Cust ID",80),("Name",180),("Mobile",120),("Account No",150),("Type",100),("Balance",100),("Status",100)]:
                 tv.heading(col, text=col); tv.column(col, width=w, stretch=True)
 
-            for row in rows:
-                tv.insert("", "end", values=row)
+            loader = TreeLoader(tv, key=lambda r: f"{r[0]}:{r[3]}",
+                                on_progress=lambda done, total: win.title(
+                                    f"Customers & Accounts ({done:,} / {total:,})" if done < total
+                                    else f"Customers & Accounts ({total:,})"))
+            loader.load(rows)
 
             if not rows:
                 messagebox.showinfo("Info", "No records found")
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    # ==================== Employee: Branch Analytics (Full-width) ====================
+    def create_analytics(self):
+        name = "analytics"
+        frame = self.frames[name]
+        for child in frame.winfo_children():
+            child.destroy()
+
+        title_bar = tk.Frame(frame, bg=self.colors["panel"], highlightbackground=self.colors["border"],
+                             highlightthickness=2)
+        title_bar.pack(fill="x", padx=20, pady=(20, 10))
+        tk.Label(title_bar, text="Branch analytics",
+                 font=("Segoe UI Semibold", 22),
+                 fg=self.colors["text_primary"], bg=self.colors["panel"]).pack(side="left", padx=10, pady=10)
+        ttk.Button(title_bar, text="Back", style="Secondary.TButton",
+                   command=lambda: self.show_frame("emp_dash")).pack(side="right", padx=10, pady=10)
+        ttk.Button(title_bar, text="Refresh", style="Secondary.TButton",
+                   command=self.load_analytics).pack(side="right", padx=10, pady=10)
+
+        # Summary tiles
+        tiles = tk.Frame(frame, bg=self.colors["bg"])
+        tiles.pack(fill="x", padx=20, pady=(0, 8))
+        self.an_tiles = {}
+        for key in ["Active accounts", "Blocked accounts", "Deposits today", "Withdrawals today", "Transfers today"]:
+            tile = tk.Frame(tiles, bg=self.colors["panel"], highlightbackground=self.colors["border"],
+                            highlightthickness=1)
+            tile.pack(side="left", expand=True, fill="x", padx=4)
+            tk.Label(tile, text=key, fg=self.colors["text_muted"], bg=self.colors["panel"],
+                     font=("Segoe UI", 10)).pack(anchor="w", padx=10, pady=(6, 0))
+            val = tk.Label(tile, text="-", fg=self.colors["text_primary"], bg=self.colors["panel"],
+                           font=("Segoe UI", 16, "bold"))
+            val.pack(anchor="w", padx=10, pady=(0, 6))
+            self.an_tiles[key] = val
+
+        # Chart: deposits vs withdrawals per day
+        self.an_chart = tk.Canvas(frame, bg=self.colors["panel"], height=180, highlightthickness=0)
+        self.an_chart.pack(fill="x", padx=20, pady=(0, 8))
+        self.an_chart.bind("<Configure>", lambda e: self._draw_analytics_chart())
+        self.an_days = []
+
+        table_wrap = tk.Frame(frame, bg=self.colors["bg"])
+        table_wrap.pack(fill="both", expand=True, padx=20, pady=(0, 10))
+        an_scroll_y = ttk.Scrollbar(table_wrap, orient="vertical")
+        self.an_tree = ttk.Treeview(
+            table_wrap, style="Dark.Treeview",
+            columns=("Day","Deposits","Deposit Amt","Withdrawals","Withdraw Amt","Transfers","Transfer Amt"),
+            show="headings", yscrollcommand=an_scroll_y.set
+        )
+        an_scroll_y.config(command=self.an_tree.yview)
+        an_scroll_y.pack(side="right", fill="y")
+        self.an_tree.pack(fill="both", expand=True)
+        for col, w in [("Day",120),("Deposits",100),("Deposit Amt",140),("Withdrawals",100),
+                       ("Withdraw Amt",140),("Transfers",100),("Transfer Amt",140)]:
+            self.an_tree.heading(col, text=col)
+            self.an_tree.column(col, width=w, minwidth=80, stretch=True)
+        self.an_loader = TreeLoader(self.an_tree, key=lambda r: r[0])
+
+    @tracing.traced
+    def load_analytics(self):
+        try:
+            db = connect_db()
+            rollups.refresh(db)
+            days = rollups.daily_totals(db, days=30)
+            statuses = rollups.account_status_counts(db)
+            db.close()
+        except Exception as e:
+            messagebox.showerror("Error", str(e)); return
+
+        self.an_days = days
+        today = days[0][1] if days and str(days[0][0]) == datetime.now().strftime("%Y-%m-%d") else {}
+
+        def fmt(kind):
+            count, amount = today.get(kind, (0, 0))
+            return f"{count} | ₹{amount:.2f}"
+
+        self.an_tiles["Active accounts"].config(text=str(statuses.get("Active", 0)))
+        self.an_tiles["Blocked accounts"].config(text=str(statuses.get("Blocked", 0)))
+        self.an_tiles["Deposits today"].config(text=fmt("Deposit"))
+        self.an_tiles["Withdrawals today"].config(text=fmt("Withdraw"))
+        self.an_tiles["Transfers today"].config(text=fmt(rollups.TRANSFER_TYPE))
+
+        rows = []
+        for day, by_type in days:
+            row = [str(day)]
+            for kind in ("Deposit", "Withdraw", rollups.TRANSFER_TYPE):
+                count, amount = by_type.get(kind, (0, 0))
+                row += [count, f"{amount:.2f}"]
+            rows.append(row)
+        self.an_loader.load(rows)
+        self._draw_analytics_chart()
+
+    def _draw_analytics_chart(self):
+        c = self.an_chart
+        c.delete("all")
+        days = list(reversed(self.an_days[:14]))
+        if not days:
+            c.create_text(20, 20, anchor="nw", text="No transactions yet",
+                          fill=self.colors["text_muted"], font=("Segoe UI", 11))
+            return
+        w, h = c.winfo_width(), c.winfo_height()
+        pad, base = 30, h - 24
+        peak = max(max(t.get("Deposit", (0, 0))[1], t.get("Withdraw", (0, 0))[1]) for _, t in days) or 1
+        slot = (w - 2 * pad) / len(days)
+        bar = max(slot / 3, 2)
+        for i, (day, by_type) in enumerate(days):
+            x = pad + i * slot + slot / 6
+            for j, (kind, col) in enumerate((("Deposit", self.colors["ring4"]), ("Withdraw", self.colors["danger"]))):
+                amount = by_type.get(kind, (0, 0))[1]
+                top = base - (base - 20) * float(amount) / float(peak)
+                c.create_rectangle(x + j * bar, top, x + (j + 1) * bar, base, fill=col, outline="")
+            c.create_text(x + bar, base + 4, anchor="n", text=str(day)[5:],
+                          fill=self.colors["text_muted"], font=("Segoe UI", 8))
+        c.create_text(pad, 6, anchor="nw", text="Deposits vs withdrawals (last 14 days)",
+                      fill=self.colors["text_primary"], font=("Segoe UI", 10, "bold"))
+
     # ==================== Customer: Send WhatsApp Summary ====================
+    @tracing.traced
     def customer_send_whatsapp_summary(self):
         if not self.cust_acc_no:
             messagebox.showerror("Error", "Please login as customer first."); return
@@ -1262,6 +1558,7 @@ class BankApp:
             messagebox.showinfo("Success", "WhatsApp summary sent successfully.")
 
     # ==================== Employee: Send WhatsApp Summary ====================
+    @tracing.traced
     def employee_send_whatsapp_summary(self):
         acc = self.txn_acc.get().strip()
         if not acc:
@@ -1305,6 +1602,7 @@ class BankApp:
         ttk.Button(bottom_row, text="Transfer", style="Secondary.TButton", command=self.transfer_money).pack(side="left", expand=True, fill="x", padx=(0,6))
         ttk.Button(bottom_row, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("cust_dash")).pack(side="left", expand=True, fill="x", padx=(6,0))
 
+    @tracing.traced
     def transfer_money(self):
         acc_from = self.tr_from.get().strip()
         name = self.tr_name.get().strip()
@@ -1319,52 +1617,23 @@ class BankApp:
         if not is_positive_amount(amt):
             messagebox.showerror("Error", "Amount must be positive"); return
 
+        amt_s = sanitize_amount(amt)
+        key = self.form_keys.key_for("transfer", idempotency.fingerprint("Transfer", acc_from, acc_to, amt_s))
         try:
-            db = connect_db(); cur = db.cursor()
-
-            cur.execute("""
-                SELECT c.name, a.status, a.pin, a.balance
-                FROM accounts a JOIN customers c ON a.cust_id=c.cust_id
-                WHERE a.account_no=%s
-            """, (acc_from,))
-            row_from = cur.fetchone()
-            if not row_from:
-                db.close(); messagebox.showerror("Error", "From account not found"); return
-            from_name, from_status, from_pin, from_bal = row_from
-            if from_status != "Active":
-                db.close(); messagebox.showerror("Error", "From account is blocked"); return
-            if from_name.strip().lower() != name.strip().lower():
-                db.close(); messagebox.showerror("Error", "Name does not match from account"); return
-            if from_pin != pin:
-                db.close(); messagebox.showerror("Error", "Incorrect PIN for from account"); return
-            if float(from_bal) < float(amt):
-                db.close(); messagebox.showerror("Error", "Insufficient balance in from account"); return
-
-            cur.execute("""
-                SELECT cust_name, status
-                FROM accounts
-                WHERE account_no=%s
-            """, (acc_to,))
-            row_to = cur.fetchone()
-            if not row_to:
-                db.close(); messagebox.showerror("Error", "To account not found"); return
-            to_name, to_status = row_to
-            if to_status != "Active":
-                db.close(); messagebox.showerror("Error", "To account is blocked"); return
-
-            amt_s = sanitize_amount(amt)
-            cur.execute("UPDATE accounts SET balance = balance - %s WHERE account_no=%s", (amt_s, acc_from))
-            cur.execute("UPDATE accounts SET balance = balance + %s WHERE account_no=%s", (amt_s, acc_to))
-            cur.execute("INSERT INTO transactions(account_no, cust_name, txn_type, amount) VALUES (%s,%s,%s,%s)",
-                        (acc_from, from_name, "Transfer Out", amt_s))
-            cur.execute("INSERT INTO transactions(account_no, cust_name, txn_type, amount) VALUES (%s,%s,%s,%s)",
-                        (acc_to, to_name, "Transfer In", amt_s))
-
-            db.commit(); db.close()
-            messagebox.showinfo("Success", f"Transferred ₹{amt_s} to {acc_to}")
-            self.tr_amt.delete(0,'end')
+            result = self.bank.transfer(acc_from, name, pin, acc_to, amt_s, key=key)
+        except banking.PostingHeld as e:
+            self.form_keys.reset("transfer")
+            messagebox.showinfo("On hold", str(e)); return
+        except banking.Unavailable as e:
+            messagebox.showerror("Error", str(e)); return
+        except banking.BankError as e:
+            self.form_keys.reset("transfer")
+            messagebox.showerror("Error", str(e)); return
         except Exception as e:
-            messagebox.showerror("Error", str(e))
+            messagebox.showerror("Error", str(e)); return
+        self.form_keys.reset("transfer")
+        messagebox.showinfo("Success", result)
+        self.tr_amt.delete(0,'end')
 
     # ==================== Change PIN ====================
     def create_pin_change(self):
@@ -1393,6 +1662,7 @@ class BankApp:
         ttk.Button(bottom_row, text="Change PIN", style="Secondary.TButton", command=self.change_pin).pack(side="left", expand=True, fill="x", padx=(0,6))
         ttk.Button(bottom_row, text="Back", style="Secondary.TButton", command=lambda: self.show_frame("cust_dash")).pack(side="left", expand=True, fill="x", padx=(6,0))
 
+    @tracing.traced
     def change_pin(self):
         acc = self.pc_acc.get().strip()
         old = self.pc_old.get().strip()
@@ -1405,29 +1675,58 @@ class BankApp:
             messagebox.showerror("Error", "New PIN and confirmation do not match"); return
         if len(new) < 4 or not new.isdigit():
             messagebox.showerror("Error", "New PIN must be at least 4 digits"); return
+        keys = self._throttle_check("change_pin", self.emp_name or self.cust_name, account=acc)
+        if keys is None:
+            return
 
         try:
             db = connect_db(); cur = db.cursor()
             cur.execute("SELECT pin, status FROM accounts WHERE account_no=%s", (acc,))
             row = cur.fetchone()
             if not row:
-                db.close(); messagebox.showerror("Error", "Account not found"); return
+                db.close(); self._throttle_result(keys, False)
+                messagebox.showerror("Error", "Account not found"); return
             real_pin, status = row
             if status != "Active":
-                db.close(); messagebox.showerror("Error", "Account is blocked"); return
+                db.close(); self._throttle_result(keys, False)
+                messagebox.showerror("Error", "Account is blocked"); return
             if real_pin != old:
-                db.close(); messagebox.showerror("Error", "Old PIN is incorrect"); return
+                db.close(); self._throttle_result(keys, False)
+                messagebox.showerror("Error", "Old PIN is incorrect")
+                audit.record("change_pin", self.emp_name or self.cust_name, acc, "Old PIN is incorrect")
+                return
+            self._throttle_result(keys, True)
 
             cur.execute("UPDATE accounts SET pin=%s WHERE account_no=%s", (new, acc))
             db.commit(); db.close()
+            routing.note_write()
+            audit.record("change_pin", self.emp_name or self.cust_name, acc)
             messagebox.showinfo("Success", "PIN changed successfully")
             self.pc_old.delete(0,'end'); self.pc_new.delete(0,'end'); self.pc_conf.delete(0,'end')
         except Exception as e:
+            self._throttle_result(keys, None)
             messagebox.showerror("Error", str(e))
 
 
 # ==================== Run Application ====================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bank management system")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every button and page switch (same as [features] profile)")
+    parser.add_argument("--profile-cprofile", metavar="DIR", default=profiling.CPROFILE_DIR,
+                        help="also write a cProfile dump per action into DIR")
+    parser.add_argument("--server", metavar="HOST:PORT", default=config.get().server.address or None,
+                        help="post through a teller server instead of the database")
+    args = parser.parse_args(sys.argv[1:])
+
     root = tk.Tk()
-    app = BankApp(root)
+    profiler = None
+    if args.profile or args.profile_cprofile or profiling.PROFILE_ENABLED:
+        profiler = profiling.ActionProfiler(root, cprofile_dir=args.profile_cprofile)
+    bank = TellerClient(*parse_address(args.server)) if args.server else None
+    app = BankApp(root, profiler=profiler, bank=bank)
     root.mainloop()
+    if tracing.METRICS_PATH:
+        tracing.dump(tracing.METRICS_PATH)
+    if profiler:
+        print(profiler.summary())
@@ -0,0 +1,56 @@
+import sys
+import getpass
+import argparse
+
+import storage
+import banking
+
+
+# ==================== Held Postings ====================
+# The velocity checks park a first large transfer to a new payee in
+# held_postings instead of posting it (see velocity.py). A reviewer lists
+# what is pending and releases or rejects each one:
+#   - release posts the transfer now, re-checking both accounts and the
+#     balance; one that fails stays Pending so it can be rejected instead;
+#   - reject marks it Rejected and publishes a HoldRejected event.
+# Both are recorded in the audit log under the reviewer's name.
+#
+#   python held_postings.py list
+#   python held_postings.py release 42
+#   python held_postings.py reject 42 --reason "Customer did not confirm"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Review postings held by the velocity checks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("list", help="show pending holds, oldest first")
+    p.add_argument("--limit", type=int, default=100)
+    p = sub.add_parser("release", help="post a held transfer")
+    p.add_argument("hold_id", type=int)
+    p = sub.add_parser("reject", help="turn a held transfer down")
+    p.add_argument("hold_id", type=int)
+    p.add_argument("--reason", required=True)
+    parser.add_argument("--actor", default=getpass.getuser())
+    args = parser.parse_args(argv)
+
+    db = storage.connect()
+    try:
+        if args.cmd == "list":
+            rows = banking.pending_holds(db, args.limit)
+            for hold_id, acc, payee, amount, reason, created in rows:
+                print(f"{hold_id:>6}  {created}  {acc} -> {payee}  ₹{amount}  {reason}")
+            print(f"{len(rows):,} pending")
+        elif args.cmd == "release":
+            print(banking.release_hold(db, args.hold_id, args.actor))
+        else:
+            print(banking.reject_hold(db, args.hold_id, args.actor, args.reason))
+    except banking.BankError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
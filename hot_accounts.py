@@ -0,0 +1,274 @@
+import sys
+import time
+import random
+import argparse
+import threading
+from decimal import Decimal
+
+import config
+import storage
+import statements
+import benchmark
+
+
+# ==================== Hot Accounts ====================
+# Every credit to an account updates its single accounts row, so concurrent
+# transfers into one popular (merchant) account queue on that row lock.
+# Accounts listed in hot_accounts take credits into one of N stripe rows in
+# balance_stripes instead, picked at random, so N credits can commit at
+# once. The real balance is accounts.balance plus the pending stripes;
+# fold() moves the stripes into accounts.balance and runs before any debit
+# of a hot account and periodically from the Folder thread.
+#
+#   python hot_accounts.py add BNK12345 --stripes 16
+#   python hot_accounts.py fold --interval 5
+#   python hot_accounts.py bench --threads 32 --ops 4000
+
+DEFAULT_STRIPES = 16
+REFRESH_SECONDS = config.get().cache.hot_accounts_refresh_seconds
+
+
+class HotRegistry:
+    # Which accounts are hot, re-read from the table every REFRESH_SECONDS
+    def __init__(self, refresh=REFRESH_SECONDS):
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.stripes = {}
+        self.loaded_at = None
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = None
+
+    def get(self, db, acc):
+        now = time.monotonic()
+        with self.lock:
+            fresh = self.loaded_at is not None and now - self.loaded_at < self.refresh
+        if not fresh:
+            cur = db.cursor()
+            cur.execute("SELECT account_no, stripes FROM hot_accounts")
+            stripes = dict(cur.fetchall())
+            with self.lock:
+                self.stripes = stripes
+                self.loaded_at = now
+        return self.stripes.get(acc)
+
+
+registry = HotRegistry()
+
+
+# -------------------- Money path --------------------
+def credit(db, acc, amount):
+    stripes = registry.get(db, acc)
+    if not stripes:
+        statements.execute(db, "credit", (amount, acc))
+        return
+    cur = db.cursor()
+    cur.execute("UPDATE balance_stripes SET pending = pending + %s WHERE account_no=%s AND stripe=%s",
+                (amount, acc, random.randrange(stripes)))
+
+
+def pending(db, acc):
+    if not registry.get(db, acc):
+        return Decimal("0")
+    cur = db.cursor()
+    cur.execute("SELECT SUM(pending) FROM balance_stripes WHERE account_no=%s", (acc,))
+    return Decimal(str(cur.fetchone()[0] or 0))
+
+
+def pending_by_account(db):
+    # {account_no: pending} for the hot accounts with credits not yet folded,
+    # for pages that list many balances at once
+    cur = db.cursor()
+    cur.execute("SELECT account_no, SUM(pending) FROM balance_stripes GROUP BY account_no HAVING SUM(pending) <> 0")
+    return {acc: Decimal(str(total)) for acc, total in cur.fetchall()}
+
+
+def fold(db, acc):
+    # Move the stripes into accounts.balance inside the caller's transaction.
+    # Subtracting what was read (not zeroing) keeps credits that land meanwhile.
+    if not registry.get(db, acc):
+        return Decimal("0")
+    cur = db.cursor()
+    cur.execute("SELECT stripe, pending FROM balance_stripes WHERE account_no=%s AND pending <> 0 FOR UPDATE",
+                (acc,))
+    rows = cur.fetchall()
+    total = sum((Decimal(str(p)) for _, p in rows), Decimal("0"))
+    if not rows:
+        return total
+    statements.execute(db, "credit", (total, acc))
+    cur.executemany("UPDATE balance_stripes SET pending = pending - %s WHERE account_no=%s AND stripe=%s",
+                    [(p, acc, s) for s, p in rows])
+    return total
+
+
+def fold_all(db):
+    cur = db.cursor()
+    cur.execute("SELECT account_no FROM hot_accounts")
+    total = Decimal("0")
+    for (acc,) in cur.fetchall():
+        total += fold(db, acc)
+        db.commit()
+    return total
+
+
+# -------------------- Administration --------------------
+def add(db, acc, stripes=DEFAULT_STRIPES):
+    cur = db.cursor()
+    cur.execute("SELECT stripes FROM hot_accounts WHERE account_no=%s", (acc,))
+    row = cur.fetchone()
+    if row:
+        stripes = max(stripes, row[0])
+        cur.execute("UPDATE hot_accounts SET stripes=%s WHERE account_no=%s", (stripes, acc))
+    else:
+        cur.execute("INSERT INTO hot_accounts(account_no, stripes) VALUES (%s,%s)", (acc, stripes))
+    cur.execute("SELECT stripe FROM balance_stripes WHERE account_no=%s", (acc,))
+    have = {r[0] for r in cur.fetchall()}
+    cur.executemany("INSERT INTO balance_stripes(account_no, stripe, pending) VALUES (%s,%s,0)",
+                    [(acc, s) for s in range(stripes) if s not in have])
+    db.commit()
+    registry.invalidate()
+
+
+def remove(db, acc):
+    fold(db, acc)
+    cur = db.cursor()
+    cur.execute("DELETE FROM balance_stripes WHERE account_no=%s", (acc,))
+    cur.execute("DELETE FROM hot_accounts WHERE account_no=%s", (acc,))
+    db.commit()
+    registry.invalidate()
+
+
+class Folder(threading.Thread):
+    # Folds every hot account every `interval` seconds
+    def __init__(self, connect, interval=5.0):
+        super().__init__(name="hot-account-folder", daemon=True)
+        self.connect = connect
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                db = self.connect()
+                try:
+                    fold_all(db)
+                finally:
+                    db.close()
+            except storage.DB_ERRORS as e:
+                print("Hot account fold failed:", e)
+
+
+# ==================== Contention benchmark ====================
+def _credit_worker(backend, acc, ops, latencies, errors):
+    for _ in range(ops):
+        t0 = time.perf_counter()
+        try:
+            db = backend.connect()
+            try:
+                credit(db, acc, "1.00")
+                statements.execute(db, "insert_txn", (acc, "Bench", "Transfer In", "1.00"))
+                db.commit()
+            finally:
+                db.close()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except storage.DB_ERRORS:
+            errors.append(1)
+
+
+def _contend(backend, acc, threads, ops):
+    latencies, errors = [], []
+    per_thread = max(ops // threads, 1)
+    workers = [threading.Thread(target=_credit_worker, args=(backend, acc, per_thread, latencies, errors))
+               for _ in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - t0, sorted(latencies), len(errors)
+
+
+def bench(backend, threads=32, ops=4000, stripes=DEFAULT_STRIPES):
+    acc = benchmark.seed(backend, 1)[0]
+    db = backend.connect()
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT balance FROM accounts WHERE account_no=%s", (acc,))
+        start_balance = Decimal(str(cur.fetchone()[0]))
+        remove(db, acc)
+    finally:
+        db.close()
+
+    print(f"{threads} threads crediting {acc}, {ops:,} credits per mode")
+    print(f"{'mode':<14}{'credits/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    results = {}
+    for mode in ("single row", f"{stripes} stripes"):
+        if mode != "single row":
+            db = backend.connect()
+            try:
+                add(db, acc, stripes)
+            finally:
+                db.close()
+        elapsed, lat, errors = _contend(backend, acc, threads, ops)
+        n = len(lat)
+        p = lambda q: lat[min(int(q * n), n - 1)] if n else 0.0
+        results[mode] = n / elapsed
+        print(f"{mode:<14}{n / elapsed:>11,.0f}{p(0.5):>9.2f}{p(0.99):>9.2f}{errors:>8}")
+
+    db = backend.connect()
+    try:
+        remove(db, acc)
+        cur = db.cursor()
+        cur.execute("SELECT balance FROM accounts WHERE account_no=%s", (acc,))
+        end_balance = Decimal(str(cur.fetchone()[0]))
+        cur.execute("SELECT COUNT(*) FROM transactions WHERE account_no=%s AND txn_type='Transfer In'", (acc,))
+        credited = cur.fetchone()[0]
+    finally:
+        db.close()
+    print(f"balance check: +{end_balance - start_balance} for {credited} credits")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage striped balances for hot accounts")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("add", help="stripe credits to an account")
+    p.add_argument("account")
+    p.add_argument("--stripes", type=int, default=DEFAULT_STRIPES)
+    p = sub.add_parser("remove", help="fold and stop striping an account")
+    p.add_argument("account")
+    p = sub.add_parser("fold", help="fold pending credits (once, or every --interval seconds)")
+    p.add_argument("--interval", type=float)
+    p = sub.add_parser("bench", help="compare single-row and striped credits under contention")
+    p.add_argument("--threads", type=int, default=32)
+    p.add_argument("--ops", type=int, default=4000)
+    p.add_argument("--stripes", type=int, default=DEFAULT_STRIPES)
+    args = parser.parse_args(argv)
+
+    backend = storage.get_backend()
+    if args.cmd == "bench":
+        bench(backend, args.threads, args.ops, args.stripes)
+        return 0
+    db = backend.connect()
+    try:
+        if args.cmd == "add":
+            add(db, args.account, args.stripes)
+        elif args.cmd == "remove":
+            remove(db, args.account)
+        elif args.interval:
+            while True:
+                print(f"Folded ₹{fold_all(db)}")
+                time.sleep(args.interval)
+        else:
+            print(f"Folded ₹{fold_all(db)}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
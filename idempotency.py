@@ -0,0 +1,122 @@
+import sys
+import time
+import uuid
+import hashlib
+import sqlite3
+import argparse
+
+try:
+    import mysql.connector
+    INTEGRITY_ERRORS = (mysql.connector.IntegrityError, sqlite3.IntegrityError)
+except ImportError:
+    INTEGRITY_ERRORS = (sqlite3.IntegrityError,)
+
+import storage
+
+
+# ==================== Idempotency Keys ====================
+# Every posting carries a key. The key is inserted into a uniquely indexed
+# table inside the same transaction as the balance UPDATE, *before* the
+# UPDATE runs. A replay with the same key hits the unique index, the new
+# transaction is rolled back and the stored result of the first one is
+# returned instead, so the money moves exactly once.
+#
+# A key only has to outlive the retries of its posting (a double click, a
+# teller retrying after a timeout), so keys older than KEEP_DAYS are purged:
+#
+#   python idempotency.py purge --keep-days 7
+
+KEEP_DAYS = 7
+
+class IdempotencyConflict(Exception):
+    pass
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def fingerprint(*parts):
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def claim(cur, key, operation, fp):
+    # Returns None when the key is new (caller goes on and posts), otherwise
+    # the result stored by the transaction that used the key first.
+    try:
+        cur.execute("INSERT INTO idempotency_keys(idem_key, operation, fingerprint) VALUES (%s,%s,%s)",
+                    (key, operation, fp))
+        return None
+    except INTEGRITY_ERRORS:
+        cur.execute("SELECT operation, fingerprint, result FROM idempotency_keys WHERE idem_key=%s", (key,))
+        row = cur.fetchone()
+        if row is None:
+            raise
+        if row[0] != operation or row[1] != fp:
+            raise IdempotencyConflict("Idempotency key was already used for a different request")
+        return row[2] or ""
+
+
+def record_result(cur, key, result):
+    cur.execute("UPDATE idempotency_keys SET result=%s WHERE idem_key=%s", (result, key))
+
+
+def purge(db, keep_days=KEEP_DAYS, batch=10000):
+    # Walks the table once in primary-key pages (created_at has no index)
+    # and deletes the old keys of each page, so no statement runs long
+    cur = db.cursor()
+    cutoff = storage.epoch_to_db_time(time.time() - keep_days * 86400)
+    last, deleted = "", 0
+    while True:
+        cur.execute("SELECT idem_key, created_at < %s FROM idempotency_keys WHERE idem_key > %s "
+                    "ORDER BY idem_key LIMIT %s", (cutoff, last, batch))
+        page = cur.fetchall()
+        if not page:
+            db.commit()
+            return deleted
+        old = [key for key, expired in page if expired]
+        if old:
+            cur.execute(f"DELETE FROM idempotency_keys WHERE idem_key IN ({','.join(['%s'] * len(old))})", old)
+            deleted += len(old)
+        db.commit()
+        last = page[-1][0]
+
+
+# ==================== Per-form key tracking ====================
+class FormKeys:
+    # One key per form. It is reused while the same payload is submitted
+    # again (double click, retry after a timeout) and replaced as soon as
+    # the payload changes or the form is opened again. Callers reset it
+    # once a posting has a definite outcome, so a second real posting of
+    # the same amount is not taken for a retry of the first.
+    def __init__(self):
+        self.keys = {}
+
+    def key_for(self, form, fp):
+        cur = self.keys.get(form)
+        if cur and cur[0] == fp:
+            return cur[1]
+        key = new_key()
+        self.keys[form] = (fp, key)
+        return key
+
+    def reset(self, form):
+        self.keys.pop(form, None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the posting idempotency keys")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("purge", help="delete keys too old to be retried")
+    p.add_argument("--keep-days", type=float, default=KEEP_DAYS)
+    args = parser.parse_args(argv)
+    db = storage.connect()
+    try:
+        print(f"Purged {purge(db, args.keep_days):,} keys")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
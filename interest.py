@@ -0,0 +1,161 @@
+import sys
+import time
+import argparse
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+import storage
+import hot_accounts
+
+
+# ==================== Interest Accrual ====================
+# Nightly batch that credits one day of interest to every active Savings
+# account. Accounts are walked in account_no order in chunks; each chunk is
+# two set-based statements (INSERT ... SELECT of the "Interest" rows, then
+# one UPDATE of the balances) committed together with the run's checkpoint
+# in interest_runs. A crashed run resumes after the last committed chunk and
+# a finished run is a no-op, so the job is safe to re-run from cron:
+#
+#   python interest.py                   # accrue for today
+#   python interest.py --date 2024-03-31 --chunk 10000
+
+ANNUAL_RATE = Decimal("0.035")
+DAYS_PER_YEAR = 365
+CHUNK_SIZE = 5000
+
+RUNNING, DONE = "Running", "Done"
+
+_ELIGIBLE = "account_type='Savings' AND status='Active'"
+
+
+def daily_rate(annual_rate=ANNUAL_RATE):
+    return (Decimal(str(annual_rate)) / DAYS_PER_YEAR).quantize(Decimal("0.0000000001"), ROUND_HALF_UP)
+
+
+_RUN_ROW = """
+    SELECT daily_rate, last_account_no, accounts_done, total_interest, status
+    FROM interest_runs WHERE run_date=%s FOR UPDATE
+"""
+
+
+def _claim(cur, run_date, rate):
+    # Lock the run row (two schedulers never work the same date) and return
+    # it. The no-op UPDATE takes the lock (and SQLite's write lock); MySQL
+    # reports 0 rows for it, so whether the row exists is read, not counted.
+    cur.execute("UPDATE interest_runs SET status=status WHERE run_date=%s", (run_date,))
+    cur.execute(_RUN_ROW, (run_date,))
+    row = cur.fetchone()
+    if row is None:
+        cur.execute("""
+            INSERT IGNORE INTO interest_runs(run_date, daily_rate, last_account_no, accounts_done,
+                                             total_interest, status)
+            VALUES (%s,%s,'',0,0,%s)
+        """, (run_date, rate, RUNNING))
+        cur.execute(_RUN_ROW, (run_date,))
+        row = cur.fetchone()
+    return row
+
+
+def _chunk_end(cur, last, chunk):
+    cur.execute(f"""
+        SELECT account_no FROM accounts
+        WHERE {_ELIGIBLE} AND account_no > %s
+        ORDER BY account_no LIMIT 1 OFFSET %s
+    """, (last, chunk - 1))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    cur.execute(f"SELECT MAX(account_no) FROM accounts WHERE {_ELIGIBLE} AND account_no > %s", (last,))
+    return cur.fetchone()[0]
+
+
+def accrue(db, run_date=None, annual_rate=ANNUAL_RATE, chunk=CHUNK_SIZE, on_chunk=None):
+    # Returns (accounts credited, total interest, seconds) for this call
+    t0 = time.perf_counter()
+    run_date = str(run_date or date.today())
+    cur = db.cursor()
+    rate, last, done, total, status = _claim(cur, run_date, daily_rate(annual_rate))
+    db.commit()
+    if status == DONE:
+        return 0, Decimal("0"), time.perf_counter() - t0
+    # Interest is paid on the whole balance, striped credits included
+    hot_accounts.fold_all(db)
+    # A resumed run keeps the rate it started with
+    rate = Decimal(str(rate))
+    credited, accrued = 0, Decimal("0")
+
+    while True:
+        # Re-read under the lock: another scheduler may have moved the run on
+        _, last, done, total, status = _claim(cur, run_date, rate)
+        if status == DONE:
+            db.commit()
+            break
+        hi = _chunk_end(cur, last, chunk)
+        if hi is None:
+            cur.execute("UPDATE interest_runs SET status=%s, finished_at=CURRENT_TIMESTAMP WHERE run_date=%s",
+                        (DONE, run_date))
+            db.commit()
+            break
+        where = f"{_ELIGIBLE} AND account_no > %s AND account_no <= %s AND ROUND(balance * %s, 2) > 0"
+        params = (last, hi, rate)
+        cur.execute(f"SELECT COUNT(*), SUM(ROUND(balance * %s, 2)) FROM accounts WHERE {where}", (rate,) + params)
+        count, amount = cur.fetchone()
+        amount = Decimal(str(amount or 0)).quantize(Decimal("0.01"))
+        cur.execute(f"""
+            INSERT INTO transactions(account_no, cust_name, txn_type, amount)
+            SELECT account_no, cust_name, 'Interest', ROUND(balance * %s, 2)
+            FROM accounts WHERE {where}
+        """, (rate,) + params)
+        cur.execute(f"UPDATE accounts SET balance = balance + ROUND(balance * %s, 2) WHERE {where}",
+                    (rate,) + params)
+        done += count
+        total = Decimal(str(total)) + amount
+        cur.execute("""
+            UPDATE interest_runs SET last_account_no=%s, accounts_done=%s, total_interest=%s
+            WHERE run_date=%s
+        """, (hi, done, total, run_date))
+        db.commit()
+        last = hi
+        credited += count
+        accrued += amount
+        if on_chunk:
+            on_chunk(hi, credited, accrued)
+    return credited, accrued, time.perf_counter() - t0
+
+
+def run_status(db, run_date=None):
+    cur = db.cursor()
+    cur.execute("""
+        SELECT run_date, daily_rate, last_account_no, accounts_done, total_interest, status, started_at, finished_at
+        FROM interest_runs WHERE run_date=%s
+    """, (str(run_date or date.today()),))
+    return cur.fetchone()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Credit daily interest to Savings accounts")
+    parser.add_argument("--date", help="run date, YYYY-MM-DD (default: today)")
+    parser.add_argument("--rate", type=Decimal, default=ANNUAL_RATE, help="annual rate, e.g. 0.035")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    def progress(last, count, amount):
+        if not args.quiet:
+            print(f"  up to {last}: {count:,} accounts, ₹{amount:.2f}")
+
+    db = storage.connect()
+    try:
+        count, amount, seconds = accrue(db, args.date, args.rate, args.chunk, progress)
+        row = run_status(db, args.date)
+    finally:
+        db.close()
+    rate = (count / seconds) if seconds else 0
+    print(f"Credited {count:,} accounts, ₹{amount:.2f} in {seconds:.2f}s ({rate:,.0f} accounts/s)")
+    if row:
+        print(f"Run {row[0]}: {row[5]}, {row[3]:,} accounts, ₹{Decimal(str(row[4])):.2f} in total")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
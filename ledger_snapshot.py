@@ -0,0 +1,307 @@
+import sys
+import time
+import argparse
+import calendar
+from datetime import datetime
+from decimal import Decimal
+
+# NumPy is optional: the rest of the app runs without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+import storage
+import archive
+import rollups
+
+
+# ==================== Columnar Ledger Snapshot ====================
+# Loads transactions into parallel NumPy arrays:
+#   txn_id   int64  - watermark for incremental refresh
+#   acc      int32  - index into self.accounts
+#   kind     int8   - index into self.kinds ("Deposit", "Withdraw", ...)
+#   paise    int64  - amount in paise, so sums are exact
+#   ts       int64  - txn_date as seconds, wall-clock (hour = ts // 3600 % 24)
+# Ad-hoc questions then become vectorized group-bys over those arrays
+# instead of GROUP BY scans of the ledger. Like the rollups, refresh() loads
+# only up to rollups.settled_txn_id(), so a posting that commits after a
+# higher txn_id is not skipped for good.
+
+def _to_paise(amount):
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def _to_seconds(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return calendar.timegm(value.timetuple())
+
+
+class LedgerSnapshot:
+    def __init__(self, capacity=1024):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy is required for ledger analytics. Run: pip install numpy")
+        self.size = 0
+        self.last_txn_id = 0
+        self.accounts = []
+        self.account_index = {}
+        self.kinds = []
+        self.kind_index = {}
+        self.txn_id = np.empty(capacity, dtype=np.int64)
+        self.acc = np.empty(capacity, dtype=np.int32)
+        self.kind = np.empty(capacity, dtype=np.int8)
+        self.paise = np.empty(capacity, dtype=np.int64)
+        self.ts = np.empty(capacity, dtype=np.int64)
+
+    # -------------------- Loading --------------------
+    def _grow(self, needed):
+        cap = len(self.txn_id)
+        if needed <= cap:
+            return
+        while cap < needed:
+            cap *= 2
+        for name in ("txn_id", "acc", "kind", "paise", "ts"):
+            old = getattr(self, name)
+            new = np.empty(cap, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _code(self, table, index, value):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(table)
+            table.append(value)
+        return code
+
+    def refresh(self, db, chunk=50000, settle=rollups.SETTLE_SECONDS):
+        # Append settled transactions newer than the last one loaded, starting
+        # in the archive when rows not yet loaded have been moved there
+        added = 0
+        archived = archive.watermark(db)
+        upper = max(rollups.settled_txn_id(db.cursor(), self.last_txn_id, settle), archived)
+        if self.last_txn_id < archived:
+            added += self._load(db, "transactions_archive", chunk, upper)
+        return added + self._load(db, "transactions", chunk, upper)
+
+    def _load(self, db, table, chunk, upper):
+        cur = db.cursor()
+        cur.execute(f"""
+            SELECT txn_id, account_no, txn_type, amount, txn_date
+            FROM {table}
+            WHERE txn_id > %s AND txn_id <= %s
+            ORDER BY txn_id
+        """, (self.last_txn_id, upper))
+        added = 0
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            n = len(rows)
+            self._grow(self.size + n)
+            s, e = self.size, self.size + n
+            self.txn_id[s:e] = [r[0] for r in rows]
+            self.acc[s:e] = [self._code(self.accounts, self.account_index, r[1]) for r in rows]
+            self.kind[s:e] = [self._code(self.kinds, self.kind_index, r[2]) for r in rows]
+            self.paise[s:e] = [_to_paise(r[3]) for r in rows]
+            self.ts[s:e] = [_to_seconds(r[4]) for r in rows]
+            self.size = e
+            self.last_txn_id = int(self.txn_id[e - 1])
+            added += n
+        return added
+
+    # -------------------- Helpers --------------------
+    def _mask(self, kinds=None, since=None, until=None):
+        n = self.size
+        mask = np.ones(n, dtype=bool)
+        if kinds:
+            codes = [self.kind_index[k] for k in kinds if k in self.kind_index]
+            mask &= np.isin(self.kind[:n], codes)
+        if since is not None:
+            mask &= self.ts[:n] >= _to_seconds(since)
+        if until is not None:
+            mask &= self.ts[:n] < _to_seconds(until)
+        return mask
+
+    # -------------------- Queries --------------------
+    def top_accounts(self, n=10, kinds=None, since=None, until=None):
+        # [(account_no, total_rupees, txn_count)] by volume, largest first
+        mask = self._mask(kinds, since, until)
+        acc = self.acc[:self.size][mask]
+        totals = np.bincount(acc, weights=self.paise[:self.size][mask], minlength=len(self.accounts))
+        counts = np.bincount(acc, minlength=len(self.accounts))
+        n = min(n, len(totals))
+        if n == 0:
+            return []
+        top = np.argpartition(-totals, n - 1)[:n]
+        top = top[np.argsort(-totals[top], kind="stable")]
+        return [(self.accounts[i], Decimal(int(totals[i])) / 100, int(counts[i])) for i in top if counts[i]]
+
+    def hourly_pattern(self, kinds=("Deposit",), since=None, until=None):
+        # 24 buckets of (count, total_rupees) by hour of day
+        mask = self._mask(kinds, since, until)
+        hours = (self.ts[:self.size][mask] // 3600) % 24
+        counts = np.bincount(hours, minlength=24)
+        totals = np.bincount(hours, weights=self.paise[:self.size][mask], minlength=24)
+        return [(int(c), Decimal(int(t)) / 100) for c, t in zip(counts, totals)]
+
+    def window_sums(self, window_seconds=86400, kinds=None, account=None, since=None, until=None):
+        # Totals per fixed time window: [(window_start_epoch, total_rupees)]
+        mask = self._mask(kinds, since, until)
+        if account is not None:
+            idx = self.account_index.get(account)
+            if idx is None:
+                return []
+            mask &= self.acc[:self.size] == idx
+        ts = self.ts[:self.size][mask]
+        if not len(ts):
+            return []
+        start = (ts.min() // window_seconds) * window_seconds
+        slots = (ts - start) // window_seconds
+        totals = np.bincount(slots, weights=self.paise[:self.size][mask])
+        return [(int(start + i * window_seconds), Decimal(int(t)) / 100)
+                for i, t in enumerate(totals) if t]
+
+    def rolling_sum(self, account, window_seconds=3600, kinds=None):
+        # Trailing-window sum at every posting of one account: [(ts, sum_rupees)]
+        mask = self._mask(kinds)
+        idx = self.account_index.get(account)
+        if idx is None:
+            return []
+        mask &= self.acc[:self.size] == idx
+        ts = self.ts[:self.size][mask]
+        paise = self.paise[:self.size][mask]
+        order = np.argsort(ts, kind="stable")
+        ts, paise = ts[order], paise[order]
+        csum = np.concatenate(([0], np.cumsum(paise)))
+        left = np.searchsorted(ts, ts - window_seconds, side="right")
+        sums = csum[1:] - csum[left]
+        return [(int(t), Decimal(int(s)) / 100) for t, s in zip(ts, sums)]
+
+    def percentiles(self, qs=(50, 90, 99), kinds=None, since=None, until=None):
+        mask = self._mask(kinds, since, until)
+        values = self.paise[:self.size][mask]
+        if not len(values):
+            return {q: None for q in qs}
+        res = np.percentile(values, qs, method="lower")
+        return {q: Decimal(int(v)) / 100 for q, v in zip(qs, res)}
+
+    def large_transfers(self, min_amount=None, percentile=99.0, kinds=("Transfer Out",)):
+        # Transfers at or above min_amount (rupees) or the given percentile
+        mask = self._mask(kinds)
+        if min_amount is not None:
+            threshold = _to_paise(min_amount)
+        else:
+            values = self.paise[:self.size][mask]
+            if not len(values):
+                return []
+            threshold = int(np.percentile(values, percentile, method="lower"))
+        hits = np.nonzero(mask & (self.paise[:self.size] >= threshold))[0]
+        accounts = self.accounts
+        return [(t, accounts[a], Decimal(p) / 100, s) for t, a, p, s in
+                zip(self.txn_id[hits].tolist(), self.acc[hits].tolist(),
+                    self.paise[hits].tolist(), self.ts[hits].tolist())]
+
+
+# ==================== SQL comparison ====================
+# Same questions answered by the database, for the benchmark below, over
+# the same rows refresh() loads: the ledger and its archive.
+_LEDGER = """(
+    SELECT txn_id, account_no, txn_type, amount, txn_date FROM transactions
+    UNION ALL
+    SELECT txn_id, account_no, txn_type, amount, txn_date FROM transactions_archive
+) AS ledger"""
+
+
+def sql_top_accounts(db, n=10):
+    cur = db.cursor()
+    cur.execute(f"""
+        SELECT account_no, SUM(amount) AS total, COUNT(*)
+        FROM {_LEDGER}
+        GROUP BY account_no
+        ORDER BY total DESC
+        LIMIT %s
+    """, (n,))
+    return cur.fetchall()
+
+
+def sql_hourly_pattern(db, kind="Deposit"):
+    cur = db.cursor()
+    cur.execute(f"""
+        SELECT HOUR(txn_date), COUNT(*), SUM(amount)
+        FROM {_LEDGER}
+        WHERE txn_type=%s
+        GROUP BY HOUR(txn_date)
+    """, (kind,))
+    return cur.fetchall()
+
+
+def sql_percentiles(db, qs=(50, 90, 99)):
+    cur = db.cursor()
+    cur.execute(f"SELECT COUNT(*) FROM {_LEDGER}")
+    n = cur.fetchone()[0]
+    out = {}
+    for q in qs:
+        cur.execute(f"SELECT amount FROM {_LEDGER} ORDER BY amount LIMIT 1 OFFSET %s",
+                    (max(int((n - 1) * q / 100), 0),))
+        row = cur.fetchone()
+        out[q] = row[0] if row else None
+    return out
+
+
+def sql_large_transfers(db, min_amount):
+    cur = db.cursor()
+    cur.execute(f"""
+        SELECT txn_id, account_no, amount, txn_date
+        FROM {_LEDGER}
+        WHERE txn_type='Transfer Out' AND amount >= %s
+    """, (min_amount,))
+    return cur.fetchall()
+
+
+def _timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def compare(db, repeat=5):
+    snap = LedgerSnapshot()
+    t0 = time.perf_counter()
+    loaded = snap.refresh(db, settle=0)   # one full load, compared with SQL over the same rows
+    load_ms = (time.perf_counter() - t0) * 1000
+    cases = [
+        ("top accounts", lambda: snap.top_accounts(10), lambda: sql_top_accounts(db, 10)),
+        ("hourly deposits", lambda: snap.hourly_pattern(), lambda: sql_hourly_pattern(db)),
+        ("percentiles", lambda: snap.percentiles(), lambda: sql_percentiles(db)),
+        ("large transfers", lambda: snap.large_transfers(min_amount="5000"),
+         lambda: sql_large_transfers(db, "5000")),
+    ]
+    print(f"Loaded {loaded:,} transactions in {load_ms:.1f} ms")
+    print(f"{'query':<18}{'numpy ms':>10}{'sql ms':>10}{'speedup':>10}")
+    for name, vec, sql in cases:
+        v = _timed(vec, repeat)
+        s = _timed(sql, repeat)
+        print(f"{name:<18}{v:>10.3f}{s:>10.3f}{(s / v if v else 0):>9.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare columnar ledger analytics with SQL")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    db = storage.connect()
+    try:
+        compare(db, args.repeat)
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
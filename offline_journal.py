@@ -0,0 +1,309 @@
+import os
+import json
+import zlib
+import time
+import hmac
+import uuid
+import hashlib
+import threading
+from decimal import Decimal
+
+import config
+import outbox
+import hot_accounts
+
+
+# ==================== Offline Teller Journal ====================
+# When MySQL cannot be reached, deposits and withdrawals are appended to a
+# local journal instead of failing. Every line is "<crc32> <json>" and is
+# fsync'ed before the teller is told the posting was accepted. A background
+# replayer pushes pending entries to the database once it is reachable.
+#
+# The PIN cannot be checked while offline, so the entry carries an HMAC of
+# it under a per-install secret (key_path, created on first use and
+# readable only by its owner) and the entry id; replay checks it against
+# the PIN in the database. Without the key file the journal gives nothing
+# away: a bare hash of a 4-10 digit PIN would be reversed by trying them all.
+
+JOURNAL_PATH = config.get().journal.path
+CONFLICTS_PATH = config.get().journal.conflicts_path
+KEY_PATH = config.get().journal.key_path
+
+# Provisional limits while offline (nothing can be checked against the DB)
+OFFLINE_MAX_TXN = Decimal("5000.00")
+OFFLINE_MAX_WITHDRAW_PER_ACCOUNT = Decimal("10000.00")
+
+
+class JournalError(Exception):
+    pass
+
+
+_key = None
+_key_lock = threading.Lock()
+
+
+def _install_key(path=KEY_PATH):
+    # Written to a temporary file and linked into place, so a process that
+    # loses the race reads the winner's complete key
+    global _key
+    with _key_lock:
+        if _key is None:
+            if not os.path.exists(path):
+                tmp = f"{path}.{uuid.uuid4().hex}"
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                try:
+                    os.write(fd, os.urandom(32))
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                try:
+                    os.link(tmp, path)
+                except FileExistsError:
+                    pass
+                finally:
+                    os.remove(tmp)
+            with open(path, "rb") as f:
+                _key = f.read()
+        return _key
+
+
+def pin_mac(pin, entry_id):
+    return hmac.new(_install_key(), f"{entry_id}:{pin}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def pin_matches(entry, pin):
+    return hmac.compare_digest(pin_mac(pin, entry["id"]), entry["pin_mac"])
+
+
+def _encode(record):
+    payload = json.dumps(record, separators=(",", ":"), sort_keys=True)
+    return f"{zlib.crc32(payload.encode('utf-8')):08x} {payload}\n"
+
+
+def _decode(line):
+    line = line.rstrip("\r\n")
+    if len(line) < 10 or line[8] != " ":
+        return None
+    payload = line[9:]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload.encode("utf-8")):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+class OfflineJournal:
+    def __init__(self, path=JOURNAL_PATH, max_txn=OFFLINE_MAX_TXN,
+                 max_withdraw=OFFLINE_MAX_WITHDRAW_PER_ACCOUNT):
+        self.path = path
+        self.max_txn = Decimal(max_txn)
+        self.max_withdraw = Decimal(max_withdraw)
+        self.lock = threading.Lock()
+        self.pending = {}        # entry id -> entry
+        self.withdrawn = {}      # account_no -> offline withdrawals not yet replayed
+        self.corrupt_lines = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        end = 0     # offset just past the last complete line
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Torn tail after a crash: it is cut off below
+                    self.corrupt_lines += 1
+                    break
+                end += len(line)
+                rec = _decode(line.decode("utf-8", "replace"))
+                if rec is None:
+                    # A damaged line: never replay it
+                    self.corrupt_lines += 1
+                    continue
+                self._apply(rec)
+        if end < os.path.getsize(self.path):
+            # Otherwise the next append would land on the torn line and be
+            # lost with it on the next load
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+
+    def _apply(self, rec):
+        if "done" in rec:
+            for entry_id in rec["done"]:
+                entry = self.pending.pop(entry_id, None)
+                if entry and entry["op"] == "Withdraw":
+                    left = self.withdrawn.get(entry["acc"], Decimal("0")) - Decimal(entry["amount"])
+                    if left > 0:
+                        self.withdrawn[entry["acc"]] = left
+                    else:
+                        self.withdrawn.pop(entry["acc"], None)
+        else:
+            self.pending[rec["id"]] = rec
+            if rec["op"] == "Withdraw":
+                self.withdrawn[rec["acc"]] = self.withdrawn.get(rec["acc"], Decimal("0")) + Decimal(rec["amount"])
+
+    def _write(self, rec):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(_encode(rec))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, acc, name, pin, op, amount):
+        amount = Decimal(amount)
+        if op not in ("Deposit", "Withdraw"):
+            raise JournalError(f"{op} is not allowed offline")
+        if amount > self.max_txn:
+            raise JournalError(f"Offline limit is ₹{self.max_txn} per transaction")
+        with self.lock:
+            if op == "Withdraw":
+                total = self.withdrawn.get(acc, Decimal("0")) + amount
+                if total > self.max_withdraw:
+                    raise JournalError(f"Offline withdrawal limit of ₹{self.max_withdraw} reached for {acc}")
+            entry_id = uuid.uuid4().hex
+            rec = {
+                "id": entry_id,
+                "ts": time.time(),
+                "acc": acc,
+                "name": name,
+                "pin_mac": pin_mac(pin, entry_id),
+                "op": op,
+                "amount": f"{amount:.2f}",
+            }
+            self._write(rec)
+            self._apply(rec)
+            return rec["id"]
+
+    def pending_entries(self):
+        with self.lock:
+            return sorted(self.pending.values(), key=lambda e: e["ts"])
+
+    def mark_done(self, entry_ids):
+        if not entry_ids:
+            return
+        with self.lock:
+            rec = {"done": list(entry_ids)}
+            self._write(rec)
+            self._apply(rec)
+            if not self.pending:
+                self._compact()
+
+    def _compact(self):
+        # Everything has been replayed: start a fresh journal atomically
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.corrupt_lines = 0
+
+
+# ==================== Replayer ====================
+class JournalReplayer(threading.Thread):
+    def __init__(self, journal, connect, batch_size=200, interval=5.0,
+                 conflicts_path=CONFLICTS_PATH):
+        super().__init__(daemon=True)
+        self.journal = journal
+        self.connect = connect
+        self.batch_size = batch_size
+        self.interval = interval
+        self.conflicts_path = conflicts_path
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+    def wake(self):
+        self.wake_event.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.journal.pending:
+                try:
+                    self.replay_once()
+                except Exception:
+                    pass  # database still down, try again later
+            self.wake_event.wait(self.interval)
+            self.wake_event.clear()
+
+    def replay_once(self):
+        entries = self.journal.pending_entries()
+        applied = 0
+        for start in range(0, len(entries), self.batch_size):
+            batch = entries[start:start + self.batch_size]
+            db = self.connect()
+            try:
+                cur = db.cursor()
+                conflicts = []
+                for entry in batch:
+                    outcome = self._replay_entry(db, cur, entry)
+                    if outcome != "applied":
+                        conflicts.append((entry, outcome))
+                    else:
+                        applied += 1
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            self._record_conflicts(conflicts)
+            self.journal.mark_done([e["id"] for e in batch])
+        return applied
+
+    def _replay_entry(self, db, cur, entry):
+        # A previous replay may have committed before the "done" marker was written
+        cur.execute("SELECT outcome FROM journal_applied WHERE entry_id=%s", (entry["id"],))
+        row = cur.fetchone()
+        if row:
+            return row[0]
+
+        outcome = "applied"
+        cur.execute("""
+            SELECT c.name, a.status, a.pin
+            FROM accounts a JOIN customers c ON a.cust_id=c.cust_id
+            WHERE a.account_no=%s
+        """, (entry["acc"],))
+        row = cur.fetchone()
+        if not row:
+            outcome = "Account not found"
+        else:
+            db_name, status, real_pin = row
+            if status != "Active":
+                outcome = "Account is blocked"
+            elif db_name.strip().lower() != entry["name"].strip().lower():
+                outcome = "Name does not match account"
+            elif not pin_matches(entry, real_pin):
+                outcome = "Incorrect PIN"
+            elif entry["op"] == "Deposit":
+                cur.execute("UPDATE accounts SET balance = balance + %s WHERE account_no=%s",
+                            (entry["amount"], entry["acc"]))
+            else:
+                # Credits parked in a hot account's stripes count towards the balance
+                hot_accounts.fold(db, entry["acc"])
+                cur.execute("UPDATE accounts SET balance = balance - %s WHERE account_no=%s AND balance >= %s",
+                            (entry["amount"], entry["acc"], entry["amount"]))
+                if cur.rowcount == 0:
+                    outcome = "Insufficient balance"
+            if outcome == "applied":
+                cur.execute("INSERT INTO transactions(account_no, cust_name, txn_type, amount) VALUES (%s,%s,%s,%s)",
+                            (entry["acc"], db_name, entry["op"], entry["amount"]))
+                outbox.publish(cur, entry["op"], entry["acc"], name=db_name, amount=entry["amount"],
+                               journal_entry=entry["id"])
+
+        cur.execute("INSERT INTO journal_applied(entry_id, outcome) VALUES (%s,%s)", (entry["id"], outcome))
+        return outcome
+
+    def _record_conflicts(self, conflicts):
+        if not conflicts:
+            return
+        with open(self.conflicts_path, "a", encoding="utf-8") as f:
+            for entry, reason in conflicts:
+                rec = dict(entry, reason=reason)
+                rec.pop("pin_mac", None)
+                f.write(json.dumps(rec) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
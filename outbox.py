@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+
+import config
+import storage
+
+
+# ==================== Posting Events (transactional outbox) ====================
+# Every posting also inserts one row into outbox, in the same transaction as
+# the balance update, so an event exists exactly when the posting committed.
+# A Tailer reads the new rows in event_id order, in batches, and hands them
+# to a sink (file, Unix socket, or anything with send(events)). Downstream
+# systems (SMS, analytics, fraud) get the stream without querying
+# transactions. Each consumer's position is kept in outbox_offsets, so a
+# restarted tailer resumes where it stopped. Delivery is at least once: the
+# offset moves after the sink accepted the batch; consumers dedupe on
+# event_id.
+#
+#   python outbox.py tail --consumer sms --file sms_events.jsonl
+#   python outbox.py tail --consumer fraud --socket /run/bank/fraud.sock
+#   python outbox.py status
+#   python outbox.py purge --keep-hours 24
+
+BATCH_SIZE = 500
+IDLE_MIN_SECONDS = 0.005   # the tailer backs off from this when there is nothing new
+IDLE_MAX_SECONDS = 0.25
+GAP_WAIT_SECONDS = 5.0     # how long a missing event_id may belong to an open transaction
+
+
+def publish(cur, event_type, account_no, **fields):
+    # Inside the caller's transaction: commits or rolls back with the posting
+    if not config.get().features.outbox:
+        return
+    fields["ts"] = round(time.time(), 6)
+    cur.execute("INSERT INTO outbox(event_type, account_no, payload) VALUES (%s,%s,%s)",
+                (event_type, account_no, json.dumps(fields, separators=(",", ":"), default=str)))
+
+
+def publish_many(cur, events):
+    # events: (event_type, account_no, fields) for a batch posted in one transaction
+    if not config.get().features.outbox or not events:
+        return
+    ts = round(time.time(), 6)
+    cur.executemany("INSERT INTO outbox(event_type, account_no, payload) VALUES (%s,%s,%s)",
+                    [(event_type, acc, json.dumps(dict(fields, ts=ts), separators=(",", ":"), default=str))
+                     for event_type, acc, fields in events])
+
+
+def _encode(events):
+    return "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events)
+
+
+# -------------------- Sinks --------------------
+class FileSink:
+    # Appends one JSON line per event; each batch is fsync'ed before the offset moves
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def send(self, events):
+        self.file.write(_encode(events))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class UnixSocketSink:
+    # Streams JSON lines to a listener on a Unix socket, reconnecting as needed
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.sock = None
+
+    def send(self, events):
+        try:
+            if self.sock is None:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.settimeout(self.timeout)
+                self.sock.connect(self.path)
+            self.sock.sendall(_encode(events).encode("utf-8"))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+# -------------------- Tailer --------------------
+class Tailer:
+    def __init__(self, connect, consumer, sink, batch=BATCH_SIZE, gap_wait=GAP_WAIT_SECONDS,
+                 clock=time.monotonic):
+        self.connect = connect
+        self.consumer = consumer
+        self.sink = sink
+        self.batch = batch
+        self.gap_wait = gap_wait
+        self.clock = clock
+        self.offset = None
+        self.gap = None           # (first missing event_id, clock() when first seen)
+        self.delivered = 0
+        self.stop_event = threading.Event()
+
+    def _load_offset(self, cur):
+        cur.execute("SELECT last_event_id FROM outbox_offsets WHERE consumer=%s", (self.consumer,))
+        row = cur.fetchone()
+        if row:
+            return row[0]
+        # A new consumer starts at the oldest event still kept
+        cur.execute("SELECT MIN(event_id) FROM outbox")
+        first = cur.fetchone()[0]
+        offset = first - 1 if first else 0
+        cur.execute("INSERT INTO outbox_offsets(consumer, last_event_id) VALUES (%s,%s)", (self.consumer, offset))
+        return offset
+
+    def _contiguous(self, rows):
+        # event_ids are handed out at insert but become visible at commit, so
+        # a hole may be a posting still in flight. Stop there until it shows
+        # up, or until gap_wait says it was rolled back.
+        expected = self.offset + 1
+        for i, row in enumerate(rows):
+            if row[0] != expected:
+                now = self.clock()
+                if self.gap is None or self.gap[0] != expected:
+                    self.gap = (expected, now)
+                if now - self.gap[1] < self.gap_wait:
+                    return rows[:i]
+            expected = row[0] + 1
+        self.gap = None
+        return rows
+
+    def poll(self, db):
+        # Delivers at most one batch; returns how many events went out
+        cur = db.cursor()
+        if self.offset is None:
+            self.offset = self._load_offset(cur)
+            db.commit()
+        cur.execute("""
+            SELECT event_id, event_type, account_no, payload FROM outbox
+            WHERE event_id > %s ORDER BY event_id LIMIT %s
+        """, (self.offset, self.batch))
+        rows = cur.fetchall()
+        db.commit()   # end the read snapshot so the next poll sees new commits
+        rows = self._contiguous(rows)
+        if not rows:
+            return 0
+        events = [dict(json.loads(payload), event_id=event_id, type=event_type, account_no=acc)
+                  for event_id, event_type, acc, payload in rows]
+        self.sink.send(events)
+        last = rows[-1][0]
+        cur.execute("UPDATE outbox_offsets SET last_event_id=%s WHERE consumer=%s", (last, self.consumer))
+        db.commit()
+        self.offset = last
+        self.delivered += len(rows)
+        return len(rows)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        # Polls back to back while there is a backlog, backing off when idle
+        idle = IDLE_MIN_SECONDS
+        db = None
+        while not self.stop_event.is_set():
+            try:
+                if db is None:
+                    db = self.connect()
+                sent = self.poll(db)
+            except (OSError,) + storage.DB_ERRORS as e:
+                print(f"Outbox tailer {self.consumer}: {e}")
+                if db is not None:
+                    db.close()
+                    db = None
+                sent = 0
+                idle = IDLE_MAX_SECONDS
+            if sent == self.batch:
+                continue
+            if sent:
+                idle = IDLE_MIN_SECONDS
+            self.stop_event.wait(idle)
+            if not sent:
+                idle = min(idle * 2, IDLE_MAX_SECONDS)
+        if db is not None:
+            db.close()
+
+
+# -------------------- Administration --------------------
+def status(db):
+    cur = db.cursor()
+    cur.execute("SELECT MAX(event_id), COUNT(*) FROM outbox")
+    last, kept = cur.fetchone()
+    cur.execute("SELECT consumer, last_event_id FROM outbox_offsets ORDER BY consumer")
+    return last or 0, kept, cur.fetchall()
+
+
+def purge(db, keep_hours=24, batch=10000):
+    # Deletes events every consumer has passed and that are older than
+    # keep_hours, in event_id ranges so no single DELETE runs long
+    cur = db.cursor()
+    cutoff = storage.epoch_to_db_time(time.time() - keep_hours * 3600)
+    cur.execute("SELECT MAX(event_id) FROM outbox WHERE created_at < %s", (cutoff,))
+    upper = cur.fetchone()[0] or 0
+    cur.execute("SELECT MIN(last_event_id) FROM outbox_offsets")
+    slowest = cur.fetchone()[0]
+    if slowest is not None:
+        upper = min(upper, slowest)
+    cur.execute("SELECT MIN(event_id) FROM outbox")
+    lo = cur.fetchone()[0]
+    db.commit()
+    deleted = 0
+    while lo is not None and lo <= upper:
+        hi = min(lo + batch - 1, upper)
+        cur.execute("DELETE FROM outbox WHERE event_id >= %s AND event_id <= %s", (lo, hi))
+        deleted += cur.rowcount
+        db.commit()
+        lo = hi + 1
+    return deleted
+
+
+def listen(path):
+    # Prints what a UnixSocketSink sends; handy for trying a consumer out
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    print(f"Listening on {path}")
+    while True:
+        conn, _ = server.accept()
+        with conn, conn.makefile("r", encoding="utf-8") as f:
+            for line in f:
+                print(line, end="", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream posting events from the outbox")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("tail", help="deliver new events to a sink")
+    p.add_argument("--consumer", required=True, help="name under which the offset is kept")
+    dest = p.add_mutually_exclusive_group(required=True)
+    dest.add_argument("--file", help="append JSON lines to this file")
+    dest.add_argument("--socket", help="send JSON lines to this Unix socket")
+    p.add_argument("--batch", type=int, default=BATCH_SIZE)
+    sub.add_parser("status", help="show the newest event and each consumer's offset")
+    p = sub.add_parser("purge", help="delete events every consumer has passed")
+    p.add_argument("--keep-hours", type=float, default=24)
+    p = sub.add_parser("listen", help="print events arriving on a Unix socket")
+    p.add_argument("socket")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "listen":
+        listen(args.socket)
+        return 0
+    if args.cmd == "tail":
+        sink = FileSink(args.file) if args.file else UnixSocketSink(args.socket)
+        tailer = Tailer(storage.connect, args.consumer, sink, args.batch)
+        try:
+            tailer.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.close()
+        print(f"Delivered {tailer.delivered:,} events, offset {tailer.offset}")
+        return 0
+
+    db = storage.connect()
+    try:
+        if args.cmd == "status":
+            last, kept, offsets = status(db)
+            print(f"newest event {last}, {kept:,} kept")
+            for consumer, offset in offsets:
+                print(f"  {consumer:<20}{offset:>12}{max(last - offset, 0):>10,} behind")
+        else:
+            print(f"Purged {purge(db, args.keep_hours):,} events")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import cProfile
+import functools
+import threading
+from tkinter import ttk, messagebox
+
+import config
+import tracing
+
+
+# ==================== GUI Action Profiling ====================
+# Opt-in ([features] profile, BANK_PROFILE=1 or --profile). Every button command and every
+# show_frame call is timed and the wall time is split into:
+#   db      - time inside DB calls (from tracing)
+#   dialog  - time a messagebox was open (waiting on the operator)
+#   widget  - Tk geometry/redraw work flushed right after the action
+#   python  - everything else (Treeview inserts, validation, ...)
+#   idle    - time the event loop sat idle before the action started
+# One JSON line per action goes to the profile log; with a cProfile
+# directory each action also gets its own .prof dump.
+
+_cfg = config.get()
+PROFILE_ENABLED = _cfg.features.profile
+PROFILE_LOG = _cfg.profile.log
+CPROFILE_DIR = _cfg.profile.cprofile_dir or None
+
+_DIALOGS = ("showinfo", "showerror", "showwarning", "askyesno", "askokcancel")
+
+
+class ActionProfiler:
+    def __init__(self, root, log_path=PROFILE_LOG, cprofile_dir=CPROFILE_DIR):
+        self.root = root
+        self.log_path = log_path
+        self.cprofile_dir = cprofile_dir
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.depth = 0
+        self.dialog_ms = 0.0
+        self.last_end = time.perf_counter()
+        self.totals = {}   # action -> [count, wall, db, widget, dialog]
+        if cprofile_dir:
+            os.makedirs(cprofile_dir, exist_ok=True)
+
+    # -------------------- Installation --------------------
+    def install(self, app):
+        self._patch_dialogs()
+        self._patch_buttons()
+        app.show_frame = self._wrap_show_frame(app.show_frame)
+
+    def _patch_dialogs(self):
+        for name in _DIALOGS:
+            original = getattr(messagebox, name)
+
+            def timed(*args, _original=original, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return _original(*args, **kwargs)
+                finally:
+                    self.dialog_ms += (time.perf_counter() - t0) * 1000
+            setattr(messagebox, name, timed)
+
+    def _patch_buttons(self):
+        profiler = self
+        original_init = ttk.Button.__init__
+
+        def init(button, master=None, **kw):
+            cmd = kw.get("command")
+            if callable(cmd):
+                kw["command"] = profiler.wrap(_action_name(cmd, kw.get("text")), cmd)
+            original_init(button, master, **kw)
+        ttk.Button.__init__ = init
+
+    def _wrap_show_frame(self, show_frame):
+        @functools.wraps(show_frame)
+        def wrapper(name):
+            return self.run(f"show_frame:{name}", show_frame, name)
+        return wrapper
+
+    # -------------------- Measuring --------------------
+    def wrap(self, name, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.run(name, fn, *args, **kwargs)
+        return wrapper
+
+    def run(self, name, fn, *args, **kwargs):
+        if self.depth:
+            # Nested (a button that calls show_frame): count in the outer action
+            return fn(*args, **kwargs)
+        self.depth += 1
+        start = time.perf_counter()
+        idle_ms = (start - self.last_end) * 1000
+        db0 = tracing.thread_db_ms()
+        self.dialog_ms = 0.0
+        prof = cProfile.Profile() if self.cprofile_dir else None
+        try:
+            if prof:
+                prof.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                fn_end = time.perf_counter()
+                self.root.update_idletasks()
+                end = time.perf_counter()
+                if prof:
+                    prof.disable()
+                self._record(name, start, fn_end, end, idle_ms,
+                             tracing.thread_db_ms() - db0, self.dialog_ms, prof)
+        finally:
+            self.depth -= 1
+            self.last_end = time.perf_counter()
+
+    def _record(self, name, start, fn_end, end, idle_ms, db_ms, dialog_ms, prof):
+        wall_ms = (end - start) * 1000
+        widget_ms = (end - fn_end) * 1000
+        python_ms = max(wall_ms - widget_ms - db_ms - dialog_ms, 0.0)
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+            t = self.totals.setdefault(name, [0, 0.0, 0.0, 0.0, 0.0])
+            t[0] += 1
+            t[1] += wall_ms
+            t[2] += db_ms
+            t[3] += widget_ms
+            t[4] += dialog_ms
+        entry = {
+            "seq": seq,
+            "ts": time.time(),
+            "action": name,
+            "wall_ms": round(wall_ms, 3),
+            "db_ms": round(db_ms, 3),
+            "widget_ms": round(widget_ms, 3),
+            "dialog_ms": round(dialog_ms, 3),
+            "python_ms": round(python_ms, 3),
+            "idle_before_ms": round(idle_ms, 3),
+        }
+        if prof:
+            safe = "".join(ch if ch.isalnum() or ch in "_-" else "_" for ch in name)
+            path = os.path.join(self.cprofile_dir, f"{seq:05d}_{safe}.prof")
+            prof.dump_stats(path)
+            entry["cprofile"] = path
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print("Profile log write failed:", e)
+
+    def summary(self):
+        lines = [f"{'action':<36}{'count':>6}{'wall ms':>11}{'db ms':>10}{'widget ms':>11}{'dialog ms':>11}"]
+        with self.lock:
+            items = sorted(self.totals.items(), key=lambda kv: -kv[1][1])
+        for name, (count, wall, db, widget, dialog) in items:
+            lines.append(f"{name:<36}{count:>6}{wall / count:>11.2f}{db / count:>10.2f}"
+                         f"{widget / count:>11.2f}{dialog / count:>11.2f}")
+        return "\n".join(lines)
+
+
+def _action_name(cmd, text):
+    name = getattr(cmd, "__name__", "")
+    if name and name != "<lambda>":
+        return name
+    return f"button:{text or '?'}"
@@ -0,0 +1,105 @@
+import time
+from decimal import Decimal
+
+import storage
+
+
+# ==================== Branch Rollups ====================
+# Per-day, per-type totals of the ledger kept in daily_txn_rollup. refresh()
+# folds in only the transactions above the stored txn_id watermark, so the
+# analytics page reads a few rollup rows instead of scanning the ledger.
+# The watermark row is locked first so two refreshers never fold the same
+# range twice.
+#
+# txn_ids are handed out at insert but become visible at commit, so a
+# posting still in flight can leave a hole below rows that are already
+# visible. refresh() therefore stops at settled_txn_id(): rows inserted
+# SETTLE_SECONDS ago or earlier, by the database clock, and everything
+# below them.
+
+WATERMARK = "daily_txn_rollup"
+TRANSFER_TYPE = "Transfer Out"   # count each transfer once, on the sending side
+SETTLE_SECONDS = 10              # longer than any posting stays open after its INSERT
+
+
+def lock_watermark(cur, name):
+    # Locks the named rollup_watermark row, creating it at 0, and returns it.
+    # The no-op UPDATE takes the row lock (and SQLite's write lock); its
+    # rowcount says nothing, since MySQL counts only rows it changed.
+    cur.execute("UPDATE rollup_watermark SET last_txn_id = last_txn_id WHERE name=%s", (name,))
+    cur.execute("SELECT last_txn_id FROM rollup_watermark WHERE name=%s FOR UPDATE", (name,))
+    row = cur.fetchone()
+    if row is None:
+        cur.execute("INSERT IGNORE INTO rollup_watermark(name, last_txn_id) VALUES (%s, 0)", (name,))
+        cur.execute("SELECT last_txn_id FROM rollup_watermark WHERE name=%s FOR UPDATE", (name,))
+        row = cur.fetchone()
+    return row[0]
+
+
+def settled_txn_id(cur, after=0, settle=SETTLE_SECONDS):
+    # Highest txn_id below which no posting can still be in flight
+    cur.execute("SELECT CURRENT_TIMESTAMP")
+    cutoff = storage.epoch_to_db_time(storage.db_time_to_epoch(cur.fetchone()[0]) - settle)
+    cur.execute("SELECT txn_id FROM transactions WHERE txn_id > %s AND txn_date <= %s ORDER BY txn_id DESC LIMIT 1",
+                (after, cutoff))
+    row = cur.fetchone()
+    return row[0] if row else after
+
+
+def refresh(db, batch_limit=None):
+    t0 = time.perf_counter()
+    cur = db.cursor()
+    last = lock_watermark(cur, WATERMARK)
+
+    upper = settled_txn_id(cur, last)
+    if batch_limit:
+        upper = min(upper, last + batch_limit)
+    if upper <= last:
+        db.commit()
+        return 0, time.perf_counter() - t0
+
+    cur.execute("""
+        SELECT DATE(txn_date), txn_type, COUNT(*), SUM(amount)
+        FROM transactions
+        WHERE txn_id > %s AND txn_id <= %s
+        GROUP BY DATE(txn_date), txn_type
+    """, (last, upper))
+    groups = cur.fetchall()
+    for day, txn_type, count, total in groups:
+        total = Decimal(str(total or 0))
+        cur.execute("""
+            UPDATE daily_txn_rollup SET txn_count = txn_count + %s, total_amount = total_amount + %s
+            WHERE day=%s AND txn_type=%s
+        """, (count, total, day, txn_type))
+        if cur.rowcount == 0:
+            cur.execute("INSERT INTO daily_txn_rollup(day, txn_type, txn_count, total_amount) VALUES (%s,%s,%s,%s)",
+                        (day, txn_type, count, total))
+    cur.execute("UPDATE rollup_watermark SET last_txn_id=%s WHERE name=%s", (upper, WATERMARK))
+    db.commit()
+    return upper - last, time.perf_counter() - t0
+
+
+def daily_totals(db, days=30):
+    # {day: {txn_type: (count, amount)}} for the most recent days, newest first
+    cur = db.cursor()
+    cur.execute("SELECT DISTINCT day FROM daily_txn_rollup ORDER BY day DESC LIMIT %s", (days,))
+    wanted = [r[0] for r in cur.fetchall()]
+    if not wanted:
+        return []
+    cur.execute("""
+        SELECT day, txn_type, txn_count, total_amount
+        FROM daily_txn_rollup
+        WHERE day >= %s
+    """, (wanted[-1],))
+    out = {d: {} for d in wanted}
+    for day, txn_type, count, amount in cur.fetchall():
+        if day in out:
+            out[day][txn_type] = (count, Decimal(str(amount)))
+    return [(d, out[d]) for d in wanted]
+
+
+def account_status_counts(db):
+    # accounts is small next to the ledger; a grouped count stays cheap
+    cur = db.cursor()
+    cur.execute("SELECT status, COUNT(*) FROM accounts GROUP BY status")
+    return {status or "Unknown": count for status, count in cur.fetchall()}
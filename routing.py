@@ -0,0 +1,189 @@
+import time
+import threading
+
+import config
+import storage
+
+
+# ==================== Read Replica Routing ====================
+# Read-only pages (history, account lists, summaries) can be served by MySQL
+# replicas so reporting does not compete with postings on the primary.
+# routing.connect(read_only=True) picks a replica round-robin unless:
+#   - this session wrote less than STICKY_SECONDS ago (read-your-writes),
+#   - the replica lags more than MAX_LAG_SECONDS or replication is broken,
+#   - the replica cannot be reached (it is skipped for DOWN_SECONDS).
+# In every such case the read goes to the primary. Writes always do.
+#
+#   [db]
+#   replicas = replica1:3306, replica2:3306
+
+MAX_LAG_SECONDS = 5.0
+LAG_CHECK_SECONDS = 2.0
+STICKY_SECONDS = MAX_LAG_SECONDS + LAG_CHECK_SECONDS
+DOWN_SECONDS = 30.0
+
+
+class Replica:
+    __slots__ = ("name", "backend", "lag", "checked_at", "down_until")
+
+    def __init__(self, name, backend):
+        self.name = name
+        self.backend = backend
+        self.lag = None
+        self.checked_at = None
+        self.down_until = 0.0
+
+
+def replica_lag(db):
+    # Seconds behind the source; 0 for a server that is not replicating
+    # (a second instance kept in sync some other way), None when broken
+    cur = db.cursor()
+    try:
+        cur.execute("SHOW REPLICA STATUS")
+    except storage.DB_ERRORS:
+        cur.execute("SHOW SLAVE STATUS")   # MySQL before 8.0.22
+    row = cur.fetchone()
+    if row is None:
+        return 0.0
+    cols = [d[0] for d in cur.description]
+    for name in ("Seconds_Behind_Source", "Seconds_Behind_Master"):
+        if name in cols:
+            lag = row[cols.index(name)]
+            return None if lag is None else float(lag)
+    return None
+
+
+class Router:
+    def __init__(self, primary, replicas=(), max_lag=MAX_LAG_SECONDS, sticky=STICKY_SECONDS,
+                 check_every=LAG_CHECK_SECONDS, clock=time.monotonic):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.sticky = sticky
+        self.check_every = check_every
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.next = 0
+        self.last_write = {}    # session -> clock() of its last committed posting
+        self.counts = {"primary_writes": 0, "primary_reads": 0, "replica_reads": 0,
+                       "sticky_reads": 0, "lag_fallbacks": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def note_write(self, session=None):
+        with self.lock:
+            self.last_write[session] = self.clock()
+
+    def _sticky(self, session):
+        with self.lock:
+            at = self.last_write.get(session)
+        return at is not None and self.clock() - at < self.sticky
+
+    def _usable(self, replica):
+        now = self.clock()
+        if replica.down_until > now:
+            return False
+        if replica.checked_at is None or now - replica.checked_at >= self.check_every:
+            try:
+                db = replica.backend.connect()
+                try:
+                    replica.lag = replica_lag(db)
+                finally:
+                    db.close()
+            except storage.DB_ERRORS:
+                replica.down_until = now + DOWN_SECONDS
+                return False
+            replica.checked_at = now
+        return replica.lag is not None and replica.lag <= self.max_lag
+
+    def _candidates(self):
+        with self.lock:
+            start = self.next
+            self.next = (self.next + 1) % max(len(self.replicas), 1)
+        return self.replicas[start:] + self.replicas[:start]
+
+    def connect(self, read_only=False, session=None):
+        if not read_only:
+            self._count("primary_writes")
+            return self.primary.connect()
+        if not self.replicas:
+            self._count("primary_reads")
+            return self.primary.connect()
+        if self._sticky(session):
+            self._count("sticky_reads")
+            return self.primary.connect()
+        for replica in self._candidates():
+            if not self._usable(replica):
+                continue
+            try:
+                db = replica.backend.connect()
+            except storage.DB_ERRORS:
+                replica.down_until = self.clock() + DOWN_SECONDS
+                continue
+            self._count("replica_reads")
+            return db
+        self._count("lag_fallbacks")
+        return self.primary.connect()
+
+    def status(self):
+        with self.lock:
+            counts = dict(self.counts)
+        return {
+            "counts": counts,
+            "replicas": [{"name": r.name, "lag": r.lag, "down": r.down_until > self.clock()}
+                         for r in self.replicas],
+        }
+
+
+# ==================== Active router ====================
+def _parse_replicas(items, default_port=3306):
+    out = []
+    for item in items:
+        host, _, port = item.partition(":")
+        out.append((host, int(port) if port else default_port))
+    return out
+
+
+def router_from_config(cfg=None):
+    cfg = cfg or config.get()
+    primary = storage.get_backend()
+    replicas = []
+    if cfg.db.replicas and primary.name == "mysql":
+        for host, port in _parse_replicas(cfg.db.replicas, cfg.db.port):
+            options = dict(primary.options, port=port)
+            backend = storage.MySQLBackend(host, primary.user, primary.password, primary.database,
+                                           pool_size=cfg.pool.size,
+                                           statement_timeout_ms=primary.statement_timeout_ms,
+                                           lock_timeout=primary.lock_timeout, **options)
+            replicas.append(Replica(f"{host}:{port}", backend))
+    lag = cfg.routing
+    return Router(primary, replicas, max_lag=lag.max_lag_seconds,
+                  sticky=lag.max_lag_seconds + lag.lag_check_seconds, check_every=lag.lag_check_seconds)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = router_from_config()
+        return _router
+
+
+def set_router(router):
+    global _router
+    with _router_lock:
+        _router = router
+
+
+def connect(read_only=False, session=None):
+    return get_router().connect(read_only, session)
+
+
+def note_write(session=None):
+    get_router().note_write(session)
@@ -0,0 +1,148 @@
+import time
+import threading
+import weakref
+
+import config
+from storage import is_pooled, raw_connection
+
+
+# ==================== Statement Registry ====================
+# The recurring SQL of the money path lives here under a name. On MySQL each
+# statement runs on its own server-side prepared cursor, kept per pooled
+# connection, so it is parsed once per connection instead of once per call.
+# Every call is counted so the hot SQL can be inspected in one place.
+
+STATEMENTS = {
+    "account_identity": """
+        SELECT c.name, a.status, a.pin, a.balance
+        FROM accounts a JOIN customers c ON a.cust_id=c.cust_id
+        WHERE a.account_no=%s
+    """,
+    "account_status": "SELECT cust_name, status FROM accounts WHERE account_no=%s",
+    "account_balance": "SELECT balance, status, pin FROM accounts WHERE account_no=%s",
+    "credit": "UPDATE accounts SET balance = balance + %s WHERE account_no=%s",
+    "debit": "UPDATE accounts SET balance = balance - %s WHERE account_no=%s AND balance >= %s",
+    "insert_txn": "INSERT INTO transactions(account_no, cust_name, txn_type, amount) VALUES (%s,%s,%s,%s)",
+    "account_history": """
+        SELECT txn_id, account_no, cust_name, txn_type, amount, txn_date
+        FROM transactions
+        WHERE account_no=%s
+        ORDER BY txn_date ASC, txn_id ASC
+    """,
+    "account_history_archive": """
+        SELECT txn_id, account_no, cust_name, txn_type, amount, txn_date
+        FROM transactions_archive
+        WHERE account_no=%s
+        ORDER BY txn_date ASC, txn_id ASC
+    """,
+    "recent_history": """
+        SELECT txn_type, amount, txn_date
+        FROM transactions
+        WHERE account_no=%s
+        ORDER BY txn_date DESC, txn_id DESC
+        LIMIT %s
+    """,
+    "recent_history_archive": """
+        SELECT txn_type, amount, txn_date
+        FROM transactions_archive
+        WHERE account_no=%s
+        ORDER BY txn_date DESC, txn_id DESC
+        LIMIT %s
+    """,
+}
+
+
+class StatementStats:
+    __slots__ = ("calls", "total_time", "rows")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.rows = 0
+
+
+_stats = {name: StatementStats() for name in STATEMENTS}
+_stats_lock = threading.Lock()
+_cursors = weakref.WeakKeyDictionary()   # raw connection -> {name: prepared cursor}
+
+
+def register(name, sql):
+    STATEMENTS[name] = sql
+    with _stats_lock:
+        _stats.setdefault(name, StatementStats())
+
+
+def _new_cursor(db):
+    if not config.get().features.prepared_statements:
+        return db.cursor()
+    try:
+        return db.cursor(prepared=True)
+    except TypeError:
+        return db.cursor()
+
+
+def _cursor(db, name):
+    if not is_pooled(db):
+        # Connection dies after this action: nothing to keep
+        return _new_cursor(db)
+    raw = raw_connection(db)
+    per_conn = _cursors.get(raw)
+    if per_conn is None:
+        per_conn = _cursors[raw] = {}
+    cur = per_conn.get(name)
+    if cur is None:
+        cur = per_conn[name] = _new_cursor(db)
+    return cur
+
+
+def _record(name, elapsed, rows):
+    with _stats_lock:
+        s = _stats[name]
+        s.calls += 1
+        s.total_time += elapsed
+        s.rows += rows
+
+
+def execute(db, name, params=()):
+    cur = _cursor(db, name)
+    t0 = time.perf_counter()
+    cur.execute(STATEMENTS[name], params)
+    _record(name, time.perf_counter() - t0, max(cur.rowcount, 0))
+    return cur
+
+
+def fetch_all(db, name, params=()):
+    cur = _cursor(db, name)
+    t0 = time.perf_counter()
+    cur.execute(STATEMENTS[name], params)
+    rows = cur.fetchall()
+    _record(name, time.perf_counter() - t0, len(rows))
+    return rows
+
+
+def fetch_one(db, name, params=()):
+    # fetchall so the prepared cursor never holds an unread result
+    rows = fetch_all(db, name, params)
+    return rows[0] if rows else None
+
+
+def stats():
+    with _stats_lock:
+        return {name: {"calls": s.calls, "total_time": s.total_time, "rows": s.rows}
+                for name, s in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        for s in _stats.values():
+            s.calls, s.total_time, s.rows = 0, 0.0, 0
+
+
+def report():
+    lines = [f"{'statement':<20}{'calls':>8}{'total ms':>12}{'avg ms':>10}{'rows':>10}"]
+    for name, s in sorted(stats().items(), key=lambda kv: -kv[1]["total_time"]):
+        if not s["calls"]:
+            continue
+        avg = s["total_time"] / s["calls"] * 1000
+        lines.append(f"{name:<20}{s['calls']:>8}{s['total_time'] * 1000:>12.2f}{avg:>10.3f}{s['rows']:>10}")
+    return "\n".join(lines)
@@ -0,0 +1,605 @@
+import re
+import time
+import queue
+import sqlite3
+import calendar
+import threading
+from decimal import Decimal
+from datetime import datetime
+
+try:
+    import mysql.connector
+except ImportError:
+    mysql = None
+
+import config
+
+
+# ==================== Storage Backends ====================
+# All SQL in the app is written once, in MySQL dialect with %s placeholders.
+# A backend hands out DB-API connections; the SQLite backend rewrites the
+# few MySQL-only bits on the fly so the same statements run unchanged.
+
+DB_ERRORS = (sqlite3.Error,) + ((mysql.connector.Error,) if mysql else ())
+
+# SQLite has no exact decimal type: DECIMAL columns keep doubles. Money is
+# bound as text, and every sum the database computes is rounded back to
+# paise (see SQLiteBackend._rules), so a stored amount is always the double
+# nearest its two-decimal value and reads back, compares and adds up exactly.
+sqlite3.register_adapter(Decimal, str)
+
+
+class MySQLBackend:
+    name = "mysql"
+    utc_timestamps = False   # CURRENT_TIMESTAMP is in the server's local time
+
+    def __init__(self, host="localhost", user="root", password="", database="bank_db",
+                 pool_size=0, statement_timeout_ms=0, lock_timeout=None, **options):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.statement_timeout_ms = statement_timeout_ms
+        self.lock_timeout = lock_timeout
+        self.options = options
+        self.pool = ConnectionPool(self._open, pool_size) if pool_size else None
+
+    def _session(self, db):
+        cur = db.cursor()
+        if self.statement_timeout_ms:
+            # Applies to SELECTs: a runaway report cannot hold a connection forever
+            cur.execute(f"SET SESSION MAX_EXECUTION_TIME={int(self.statement_timeout_ms)}")
+        if self.lock_timeout:
+            cur.execute(f"SET SESSION innodb_lock_wait_timeout={max(int(self.lock_timeout), 1)}")
+        cur.close()
+        return db
+
+    def _open(self):
+        if mysql is None:
+            raise RuntimeError("mysql-connector-python is not installed. Run: pip install mysql-connector-python")
+        return self._session(mysql.connector.connect(host=self.host, user=self.user, password=self.password,
+                                                     database=self.database, **self.options))
+
+    def connect(self):
+        if self.pool:
+            return self.pool.get()
+        return self._open()
+
+    def connect_server(self):
+        # Connection used by setup: creates the database when it is missing
+        if mysql is None:
+            raise RuntimeError("mysql-connector-python is not installed. Run: pip install mysql-connector-python")
+        db = mysql.connector.connect(host=self.host, user=self.user, password=self.password, **self.options)
+        cur = db.cursor()
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+        cur.execute(f"USE {self.database}")
+        self._session(db)
+        return db
+
+    def translate(self, sql):
+        return sql
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    utc_timestamps = True    # CURRENT_TIMESTAMP is UTC in SQLite
+
+    _rules = [
+        (re.compile(r"%s"), "?"),
+        (re.compile(r"LAST_INSERT_ID\(\)", re.I), "last_insert_rowid()"),
+        (re.compile(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        (re.compile(r"\bBIGINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        (re.compile(r"\s+FOR\s+UPDATE\b", re.I), ""),
+        (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+        (re.compile(r"\bHOUR\(([^()]*)\)", re.I), r"CAST(strftime('%H', \1) AS INTEGER)"),
+        # Money arithmetic, rounded to paise so doubles do not drift
+        (re.compile(r"\b(balance|pending)\s*=\s*\1\s*([-+])\s*(.+?)\s+WHERE\b", re.I | re.S),
+         r"\1 = ROUND(\1 \2 \3, 2) WHERE"),
+        (re.compile(r"\bSUM\(((?:\w+\.)?(?:amount|balance|pending)|ROUND\([^()]*\))\)", re.I),
+         r"ROUND(SUM(\1), 2)"),
+    ]
+
+    def __init__(self, path="bank.db", timeout=30.0, pool_size=0, cache_kb=0):
+        self.path = path
+        self.timeout = timeout
+        self.cache_kb = cache_kb
+        self._cache = {}
+        self.pool = ConnectionPool(self._open, pool_size) if pool_size else None
+
+    def translate(self, sql):
+        out = self._cache.get(sql)
+        if out is None:
+            out = sql
+            for pattern, repl in self._rules:
+                out = pattern.sub(repl, out)
+            self._cache[sql] = out
+        return out
+
+    def _open(self):
+        raw = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute("PRAGMA synchronous=NORMAL")
+        raw.execute("PRAGMA foreign_keys=ON")
+        if self.cache_kb:
+            raw.execute(f"PRAGMA cache_size=-{int(self.cache_kb)}")
+        return SQLiteConnection(raw, self)
+
+    def connect(self):
+        if self.pool:
+            return self.pool.get()
+        return self._open()
+
+    def connect_server(self):
+        return self._open()
+
+
+class SQLiteConnection:
+    def __init__(self, raw, backend):
+        self.raw = raw
+        self.backend = backend
+
+    def cursor(self, **kwargs):
+        # kwargs such as prepared=True are accepted for MySQL compatibility
+        return SQLiteCursor(self.raw.cursor(), self.backend)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+    def is_connected(self):
+        try:
+            self.raw.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+
+class SQLiteCursor:
+    def __init__(self, raw, backend):
+        self.raw = raw
+        self.backend = backend
+
+    def execute(self, sql, params=()):
+        self.raw.execute(self.backend.translate(sql), params or ())
+        return self
+
+    def executemany(self, sql, seq):
+        self.raw.executemany(self.backend.translate(sql), seq)
+        return self
+
+    def fetchone(self):
+        return self.raw.fetchone()
+
+    def fetchall(self):
+        return self.raw.fetchall()
+
+    def fetchmany(self, size=1000):
+        return self.raw.fetchmany(size)
+
+    def close(self):
+        self.raw.close()
+
+    @property
+    def rowcount(self):
+        return self.raw.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.raw.lastrowid
+
+    @property
+    def description(self):
+        return self.raw.description
+
+    def __iter__(self):
+        return iter(self.raw)
+
+
+# ==================== Connection Pool ====================
+# Connections are kept open between actions so session state (prepared
+# statements, SQLite page cache) survives. close() on a pooled connection
+# rolls back anything uncommitted and hands it back to the pool. A
+# connection that sat idle for CHECK_IDLE_SECONDS is pinged before it is
+# handed out, so one dropped by a server restart or wait_timeout is
+# replaced instead of failing the next posting; if no new connection can
+# be opened, the caller gets the connect error (banking.Unavailable).
+CHECK_IDLE_SECONDS = 1.0
+
+
+class ConnectionPool:
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = size
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.lock = threading.Lock()
+        self.created = 0
+        self.replaced = 0
+
+    def get(self):
+        while True:
+            try:
+                raw, returned_at = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - returned_at < CHECK_IDLE_SECONDS or self._alive(raw):
+                return PooledConnection(raw, self)
+            self._discard(raw)
+            with self.lock:
+                self.replaced += 1
+        raw = self.factory()
+        with self.lock:
+            self.created += 1
+        return PooledConnection(raw, self)
+
+    @staticmethod
+    def _alive(raw):
+        try:
+            return raw.is_connected()
+        except DB_ERRORS:
+            return False
+
+    def put(self, raw):
+        try:
+            raw.rollback()
+        except DB_ERRORS:
+            self._discard(raw)
+            return
+        try:
+            self.idle.put_nowait((raw, time.monotonic()))
+        except queue.Full:
+            self._discard(raw)
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except DB_ERRORS:
+            pass
+
+    def close_all(self):
+        while True:
+            try:
+                self._discard(self.idle.get_nowait()[0])
+            except queue.Empty:
+                return
+
+
+class ConnectionWrapper:
+    # Base for objects that sit in front of a driver connection
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __getattr__(self, item):
+        return getattr(self.raw, item)
+
+    def cursor(self, **kwargs):
+        return self.raw.cursor(**kwargs)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+class PooledConnection(ConnectionWrapper):
+    def __init__(self, raw, pool):
+        super().__init__(raw)
+        self.pool = pool
+
+    def close(self):
+        if self.raw is not None:
+            raw, self.raw = self.raw, None
+            self.pool.put(raw)
+
+
+def raw_connection(db):
+    # Connection object that stays the same across pool checkouts
+    while isinstance(db, ConnectionWrapper):
+        db = db.raw
+    return db
+
+
+def is_pooled(db):
+    while isinstance(db, ConnectionWrapper):
+        if isinstance(db, PooledConnection):
+            return True
+        db = db.raw
+    return False
+
+
+# ==================== Schema ====================
+# MySQL dialect; SQLiteBackend.translate takes care of the differences.
+# Append-only: schema_version records how many of these steps a database
+# has applied, so create_schema runs only the new ones.
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS employees (
+        emp_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(50),
+        email VARCHAR(50) UNIQUE,
+        password VARCHAR(20)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customers (
+        cust_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(50),
+        gender VARCHAR(10),
+        dob DATE,
+        mobile VARCHAR(15),
+        email VARCHAR(50),
+        address VARCHAR(100),
+        password VARCHAR(20)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS accounts (
+        account_no VARCHAR(20) PRIMARY KEY,
+        cust_id INT,
+        cust_name VARCHAR(50),
+        account_type VARCHAR(10),
+        pin VARCHAR(10),
+        balance DECIMAL(10,2),
+        ifsc VARCHAR(15),
+        status VARCHAR(10),
+        FOREIGN KEY (cust_id) REFERENCES customers(cust_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transactions (
+        txn_id INT AUTO_INCREMENT PRIMARY KEY,
+        account_no VARCHAR(20),
+        cust_name VARCHAR(50),
+        txn_type VARCHAR(20),
+        amount DECIMAL(10,2),
+        txn_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (account_no) REFERENCES accounts(account_no)
+    )
+    """,
+    # Offline journal entries already replayed (see offline_journal.py)
+    """
+    CREATE TABLE IF NOT EXISTS journal_applied (
+        entry_id VARCHAR(32) PRIMARY KEY,
+        outcome VARCHAR(40),
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Idempotency keys for postings (see idempotency.py)
+    """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        idem_key VARCHAR(64) PRIMARY KEY,
+        operation VARCHAR(20),
+        fingerprint CHAR(64),
+        result VARCHAR(255),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Postings held by the velocity checks for review (see velocity.py)
+    """
+    CREATE TABLE IF NOT EXISTS held_postings (
+        hold_id INT AUTO_INCREMENT PRIMARY KEY,
+        account_no VARCHAR(20),
+        txn_type VARCHAR(20),
+        amount DECIMAL(10,2),
+        payee VARCHAR(20),
+        reason VARCHAR(100),
+        status VARCHAR(10) DEFAULT 'Pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Known transfer payees per account (see velocity.py)
+    """
+    CREATE TABLE IF NOT EXISTS payees (
+        account_no VARCHAR(20),
+        payee_no VARCHAR(20),
+        first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (account_no, payee_no)
+    )
+    """,
+    # Cold ledger rows moved out of transactions (see archive.py). Keyed by
+    # account first so one account's history is a single range read.
+    """
+    CREATE TABLE IF NOT EXISTS transactions_archive (
+        txn_id INT NOT NULL,
+        account_no VARCHAR(20) NOT NULL,
+        cust_name VARCHAR(50),
+        txn_type VARCHAR(20),
+        amount DECIMAL(10,2),
+        txn_date TIMESTAMP NULL,
+        PRIMARY KEY (account_no, txn_id)
+    )
+    """,
+    # Striped credits for hot accounts (see hot_accounts.py)
+    """
+    CREATE TABLE IF NOT EXISTS hot_accounts (
+        account_no VARCHAR(20) PRIMARY KEY,
+        stripes INT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS balance_stripes (
+        account_no VARCHAR(20),
+        stripe INT,
+        pending DECIMAL(14,2) DEFAULT 0,
+        PRIMARY KEY (account_no, stripe)
+    )
+    """,
+    # Interest accrual checkpoints, one row per run date (see interest.py)
+    """
+    CREATE TABLE IF NOT EXISTS interest_runs (
+        run_date DATE PRIMARY KEY,
+        daily_rate DECIMAL(12,10),
+        last_account_no VARCHAR(20),
+        accounts_done INT,
+        total_interest DECIMAL(16,2),
+        status VARCHAR(10),
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP NULL
+    )
+    """,
+    # Analytics rollups (see rollups.py)
+    """
+    CREATE TABLE IF NOT EXISTS daily_txn_rollup (
+        day DATE,
+        txn_type VARCHAR(20),
+        txn_count INT,
+        total_amount DECIMAL(16,2),
+        PRIMARY KEY (day, txn_type)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_watermark (
+        name VARCHAR(40) PRIMARY KEY,
+        last_txn_id BIGINT
+    )
+    """,
+    # Posting events and per-consumer offsets (see outbox.py)
+    """
+    CREATE TABLE IF NOT EXISTS outbox (
+        event_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        event_type VARCHAR(20),
+        account_no VARCHAR(20),
+        payload TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS outbox_offsets (
+        consumer VARCHAR(40) PRIMARY KEY,
+        last_event_id BIGINT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Who blocked or unblocked which account and why (see account_status.py)
+    """
+    CREATE TABLE IF NOT EXISTS status_audit (
+        audit_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        batch_id VARCHAR(16),
+        account_no VARCHAR(20),
+        old_status VARCHAR(10),
+        new_status VARCHAR(10),
+        reason VARCHAR(100),
+        actor VARCHAR(50),
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Append-only record of logins, PIN and status changes, postings (see audit.py)
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        audit_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        logged_at TIMESTAMP NULL,
+        actor VARCHAR(50),
+        action VARCHAR(30),
+        target VARCHAR(40),
+        outcome VARCHAR(100),
+        details TEXT
+    )
+    """,
+    # Login lockouts, so a restart does not lift them (see throttle.py)
+    """
+    CREATE TABLE IF NOT EXISTS login_lockouts (
+        lock_key VARCHAR(120) PRIMARY KEY,
+        locked_until BIGINT,
+        level INT
+    )
+    """,
+    # Named counters: the last value handed out (see bulk_open.py)
+    """
+    CREATE TABLE IF NOT EXISTS sequences (
+        name VARCHAR(40) PRIMARY KEY,
+        last_value BIGINT
+    )
+    """,
+]
+
+
+SCHEMA_VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        id INT PRIMARY KEY,
+        version INT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def schema_version(cursor):
+    # 0 for an empty database or one created before versioning
+    try:
+        cursor.execute("SELECT version FROM schema_version WHERE id=1")
+    except DB_ERRORS:
+        return 0
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def create_schema(cursor):
+    # Applies the missing steps and returns how many ran; the caller commits.
+    # Every step is IF NOT EXISTS, so replaying after a crash is harmless.
+    missing = SCHEMA[schema_version(cursor):]
+    for ddl in missing:
+        cursor.execute(ddl)
+    if missing:
+        cursor.execute(SCHEMA_VERSION_DDL)
+        cursor.execute("DELETE FROM schema_version")
+        cursor.execute("INSERT INTO schema_version(id, version) VALUES (1, %s)", (len(SCHEMA),))
+    return len(missing)
+
+
+# ==================== Timestamps ====================
+# txn_date is filled by the database clock; these convert between it and
+# epoch seconds for the active backend.
+def db_time_to_epoch(value, backend=None):
+    backend = backend or get_backend()
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if backend.utc_timestamps:
+        return calendar.timegm(value.timetuple())
+    return time.mktime(value.timetuple())
+
+
+def epoch_to_db_time(ts, backend=None):
+    backend = backend or get_backend()
+    tm = time.gmtime(ts) if backend.utc_timestamps else time.localtime(ts)
+    return time.strftime("%Y-%m-%d %H:%M:%S", tm)
+
+
+# ==================== Active backend ====================
+def backend_from_config(cfg=None):
+    cfg = cfg or config.get()
+    db = cfg.db
+    if db.backend == "sqlite":
+        return SQLiteBackend(db.sqlite_path, timeout=db.lock_timeout, pool_size=cfg.pool.size,
+                             cache_kb=cfg.cache.sqlite_cache_kb)
+    options = {"port": db.port, "connection_timeout": int(db.connect_timeout)}
+    if db.unix_socket:
+        options["unix_socket"] = db.unix_socket
+    return MySQLBackend(db.host, db.user, db.password, db.database, pool_size=cfg.pool.size,
+                        statement_timeout_ms=db.statement_timeout_ms, lock_timeout=db.lock_timeout,
+                        **options)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = backend_from_config()
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+def connect():
+    return get_backend().connect()
@@ -0,0 +1,270 @@
+import sys
+import time
+import uuid
+import random
+import argparse
+import threading
+import multiprocessing
+from decimal import Decimal
+from collections import Counter
+
+import storage
+import banking
+import hot_accounts
+
+
+# ==================== Concurrency Stress Test ====================
+# Many tellers posting at once on a handful of accounts, so they collide.
+# Worker threads (in one or more processes) send random deposits,
+# withdrawals and transfers through banking.post and banking.transfer, the
+# calls BankApp makes. A posting that fails on a deadlock, a lock wait
+# timeout or a busy database is retried with the same idempotency key, the
+# way a teller's retry would be. Afterwards the money is checked:
+#   - conservation: the accounts hold their opening total plus deposits
+#     minus withdrawals (transfers move money, they never make or lose it)
+#     according to the ledger and to the workers' own count;
+#   - no account is below zero;
+#   - each account's balance equals the sum of its ledger (transactions).
+#
+#   BANK_DB_BACKEND=sqlite python stress.py --threads 16 --ops 300
+#   python stress.py --processes 4 --threads 8 --accounts 4 --hot 1
+#
+# It works on its own STRESS accounts and removes them first, so it can be
+# pointed at a development database, not at a live one.
+
+PREFIX = "STRESS"
+PIN = "4321"
+NAME = "Stress Teller"
+OPENING = Decimal("1000.00")
+MAX_AMOUNT = 400          # rupees; large next to OPENING, so overdrafts are tried often
+RETRIES = 5
+MIX = {"Deposit": 3, "Withdraw": 3, "Transfer": 4}
+
+# Errors that mean "try again", by MySQL error number or SQLite message
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+
+
+def classify(e):
+    errno = getattr(e, "errno", None)
+    if errno == DEADLOCK:
+        return "deadlock"
+    if errno == LOCK_WAIT_TIMEOUT:
+        return "lock_timeout"
+    text = str(e).lower()
+    if "deadlock" in text:
+        return "deadlock"
+    if "locked" in text or "busy" in text:
+        return "busy"
+    return None
+
+
+def setup(backend, n_accounts, hot=0):
+    # Fresh STRESS accounts, each opened with OPENING and its ledger entry
+    db = backend.connect_server()
+    try:
+        cur = db.cursor()
+        storage.create_schema(cur)
+        accounts = [f"{PREFIX}{i:03d}" for i in range(n_accounts)]
+        like = PREFIX + "%"
+        for table in ("transactions", "balance_stripes", "hot_accounts", "payees", "accounts"):
+            cur.execute(f"DELETE FROM {table} WHERE account_no LIKE %s", (like,))
+        cur.execute("SELECT cust_id FROM customers WHERE email=%s", ("stress@bank.com",))
+        row = cur.fetchone()
+        if row:
+            cust_id = row[0]
+        else:
+            cur.execute("INSERT INTO customers(name, gender, dob, mobile, email, address, password) "
+                        "VALUES (%s,%s,%s,%s,%s,%s,%s)",
+                        (NAME, "Other", "1990-01-01", "9000000000", "stress@bank.com", "Stress", "stress"))
+            cur.execute("SELECT LAST_INSERT_ID()")
+            cust_id = cur.fetchone()[0]
+        cur.executemany("""
+            INSERT INTO accounts(account_no, cust_id, cust_name, account_type, pin, balance, ifsc, status)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,'Active')
+        """, [(acc, cust_id, NAME, "Savings", PIN, str(OPENING), "IFSC0000") for acc in accounts])
+        cur.executemany("INSERT INTO transactions(account_no, cust_name, txn_type, amount) VALUES (%s,%s,%s,%s)",
+                        [(acc, NAME, "Deposit", str(OPENING)) for acc in accounts])
+        db.commit()
+        for acc in accounts[:hot]:
+            hot_accounts.add(db, acc)
+    finally:
+        db.close()
+    hot_accounts.registry.invalidate()
+    return accounts
+
+
+# -------------------- Workers --------------------
+def _teller(backend, accounts, ops, seed, totals, lock):
+    rng = random.Random(seed)
+    kinds, weights = zip(*MIX.items())
+    mine = Counter()
+    latencies = []
+    for _ in range(ops):
+        op = rng.choices(kinds, weights)[0]
+        acc = rng.choice(accounts)
+        to = rng.choice([a for a in accounts if a != acc]) if op == "Transfer" else None
+        amount = Decimal(rng.randrange(100, MAX_AMOUNT * 100)) / 100
+        key = uuid.uuid4().hex
+        t0 = time.perf_counter()
+        for attempt in range(RETRIES + 1):
+            db = None
+            try:
+                db = backend.connect()
+                if op == "Transfer":
+                    banking.transfer(db, acc, NAME, PIN, to, str(amount), key=key)
+                else:
+                    banking.post(db, acc, NAME, PIN, str(amount), op, key=key)
+                mine[op] += 1
+                if op != "Transfer":
+                    mine[f"{op.lower()}_amount"] += amount
+                break
+            except banking.BankError as e:
+                mine["rejected: " + str(e)] += 1
+                break
+            except storage.DB_ERRORS as e:
+                kind = classify(e)
+                mine[kind or "db error: " + str(e)[:60]] += 1
+                if kind is None or attempt == RETRIES:
+                    # Not retried: whether it committed is settled by the ledger check
+                    mine["gave up"] += 1
+                    break
+                mine["retries"] += 1
+                time.sleep(rng.uniform(0, 0.002 * 2 ** attempt))
+            finally:
+                if db is not None:
+                    db.close()
+        latencies.append(time.perf_counter() - t0)
+    with lock:
+        totals.update(mine)
+        totals["latencies"] = totals.get("latencies", []) + latencies
+
+
+def _run_threads(backend, accounts, threads, ops, seed):
+    totals, lock = Counter(), threading.Lock()
+    workers = [threading.Thread(target=_teller, args=(backend, accounts, ops, seed + i, totals, lock))
+               for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return totals
+
+
+def _process_main(task):
+    # Each process opens its own connections: nothing DB-related crosses a fork
+    accounts, threads, ops, seed = task
+    return _run_threads(storage.backend_from_config(), accounts, threads, ops, seed)
+
+
+def run(backend, accounts, processes=1, threads=8, ops=200, seed=1):
+    t0 = time.perf_counter()
+    if processes <= 1:
+        totals = _run_threads(backend, accounts, threads, ops, seed)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            parts = pool.map(_process_main, [(accounts, threads, ops, seed + 1000 * p) for p in range(processes)])
+        totals = Counter()
+        for part in parts:
+            totals["latencies"] = totals.get("latencies", []) + part.pop("latencies", [])
+            totals.update(part)
+    totals["elapsed"] = time.perf_counter() - t0
+    return totals
+
+
+# -------------------- Invariants --------------------
+SIGN = {"Deposit": 1, "Transfer In": 1, "Withdraw": -1, "Transfer Out": -1}
+CENT = Decimal("0.01")
+
+
+def _money(value):
+    # SQLite keeps DECIMAL columns as floats, so sums are compared in whole paise
+    return Decimal(str(value)).quantize(CENT)
+
+
+def check(db, accounts, totals):
+    # Returns a list of violated invariants (empty when the books balance)
+    hot_accounts.fold_all(db)
+    cur = db.cursor()
+    marks = ",".join(["%s"] * len(accounts))
+    cur.execute(f"SELECT account_no, balance FROM accounts WHERE account_no IN ({marks})", accounts)
+    balances = {acc: _money(bal) for acc, bal in cur.fetchall()}
+    cur.execute(f"SELECT account_no, txn_type, SUM(amount) FROM transactions "
+                f"WHERE account_no IN ({marks}) GROUP BY account_no, txn_type", accounts)
+    ledger, by_type = Counter(), Counter()
+    for acc, txn_type, amount in cur.fetchall():
+        amount = _money(amount)
+        ledger[acc] += SIGN.get(txn_type, 0) * amount
+        by_type[txn_type] += amount
+    db.commit()
+
+    problems = []
+    opening = OPENING * len(accounts)
+    total = sum(balances.values(), Decimal("0"))
+    booked = by_type["Deposit"] - by_type["Withdraw"]     # the opening deposits are in the ledger too
+    if total != booked:
+        problems.append(f"conservation: accounts hold {total}, the ledger says {booked}")
+    counted = opening + totals.get("deposit_amount", 0) - totals.get("withdraw_amount", 0)
+    if total != counted and not totals.get("gave up"):
+        problems.append(f"conservation: accounts hold {total}, the workers posted {counted}")
+    if by_type["Transfer Out"] != by_type["Transfer In"]:
+        problems.append(f"transfers: {by_type['Transfer Out']} out but {by_type['Transfer In']} in")
+    for acc in accounts:
+        if balances[acc] < 0:
+            problems.append(f"{acc}: negative balance {balances[acc]}")
+        if balances[acc] != ledger[acc]:
+            problems.append(f"{acc}: balance {balances[acc]} but ledger sum {ledger[acc]}")
+    return problems
+
+
+def report(totals, problems):
+    elapsed = totals["elapsed"]
+    latencies = sorted(totals.get("latencies", []))
+    posted = sum(totals[k] for k in MIX)
+    attempted = len(latencies)
+    rejected = sum(v for k, v in totals.items() if k.startswith("rejected: "))
+    print(f"{attempted:,} postings in {elapsed:.2f}s: {attempted / elapsed:,.0f}/s attempted, "
+          f"{posted / elapsed:,.0f}/s committed")
+    if latencies:
+        pct = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+        print(f"latency ms  p50 {pct(0.5):.1f}  p95 {pct(0.95):.1f}  p99 {pct(0.99):.1f}  max {latencies[-1] * 1000:.1f}")
+    print("  ".join(f"{k} {totals[k]:,}" for k in MIX) + f"  rejected {rejected:,}")
+    print(f"deadlocks {totals['deadlock']:,}  lock timeouts {totals['lock_timeout']:,}  busy {totals['busy']:,}  "
+          f"retries {totals['retries']:,}  gave up {totals['gave up']:,}")
+    for k, v in sorted(totals.items()):
+        if k.startswith("rejected: ") or k.startswith("db error: "):
+            print(f"  {k}: {v:,}")
+    if problems:
+        print(f"{len(problems)} invariant(s) violated:")
+        for p in problems:
+            print("  " + p)
+    else:
+        print("invariants hold: money conserved, no negative balance, every balance matches its ledger")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Post concurrently on a few accounts and check the books")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="per process")
+    parser.add_argument("--ops", type=int, default=200, help="postings per thread")
+    parser.add_argument("--accounts", type=int, default=8, help="fewer accounts, more collisions")
+    parser.add_argument("--hot", type=int, default=0, help="make this many of them hot accounts")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    if args.accounts < 2:
+        parser.error("--accounts must be at least 2")
+
+    backend = storage.get_backend()
+    accounts = setup(backend, args.accounts, args.hot)
+    totals = run(backend, accounts, args.processes, args.threads, args.ops, args.seed)
+    db = backend.connect()
+    try:
+        problems = check(db, accounts, totals)
+    finally:
+        db.close()
+    report(totals, problems)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import json
+import socket
+import threading
+
+import banking
+
+
+# ==================== Teller Client ====================
+# Blocking client for teller_server.py with the same methods as
+# banking.LocalBank, so BankApp can post through either; history comes only
+# as account_history, behind the account's PIN. Errors come back as the
+# banking exceptions the GUI already handles.
+
+_ERRORS = {"held": banking.PostingHeld, "unavailable": banking.Unavailable}
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class TellerClient:
+    def __init__(self, host="127.0.0.1", port=8765, timeout=30.0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sock = None
+        self.file = None
+        self.seq = 0
+
+    def _connect(self):
+        self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rb")
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _close(self):
+        for obj in (self.file, self.sock):
+            if obj is not None:
+                try:
+                    obj.close()
+                except OSError:
+                    pass
+        self.sock = self.file = None
+
+    def request(self, op, **fields):
+        with self.lock:
+            self.seq += 1
+            req = dict(fields, op=op, id=self.seq)
+            try:
+                if self.sock is None:
+                    self._connect()
+                self.sock.sendall(json.dumps(req).encode("utf-8") + b"\n")
+                line = self.file.readline()
+                if not line:
+                    raise ConnectionError("connection closed by server")
+            except OSError as e:
+                self._close()
+                raise banking.Unavailable(f"Teller server unreachable: {e}")
+        resp = json.loads(line)
+        if resp.get("ok"):
+            return resp.get("result")
+        raise _ERRORS.get(resp.get("kind"), banking.BankError)(resp.get("error", "Request failed"))
+
+    # -------------------- banking.LocalBank interface --------------------
+    def post(self, acc, name, pin, amount, op, key=None, message=None):
+        return self.request(op.lower(), acc=acc, name=name, pin=pin, amount=str(amount),
+                            key=key, message=message)
+
+    def transfer(self, acc_from, name, pin, acc_to, amount, key=None):
+        return self.request("transfer", acc=acc_from, name=name, pin=pin, to=acc_to,
+                            amount=str(amount), key=key)
+
+    def balance(self, acc, pin):
+        return self.request("balance", acc=acc, pin=pin)
+
+    def account_history(self, acc, pin):
+        return self.request("history", acc=acc, pin=pin)
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+
+import config
+import storage
+import benchmark
+
+
+# ==================== Teller Load Test ====================
+# Drives hundreds of simulated terminals against teller_server.py from one
+# process. Each terminal keeps one connection open and loops: pick an
+# operation, send it, wait for the answer, think, repeat. Business errors
+# (velocity rejections, insufficient balance) are counted apart from
+# transport errors.
+#
+#   BANK_DB_BACKEND=sqlite python teller_loadtest.py --spawn --terminals 300
+#   python teller_loadtest.py --port 8765 --terminals 500 --ops 50
+
+MIX = (("deposit", 40), ("withdraw", 20), ("balance", 25), ("transfer", 10), ("history", 5))
+
+
+def _pick(rnd):
+    r = rnd.uniform(0, sum(w for _, w in MIX))
+    for name, weight in MIX:
+        r -= weight
+        if r <= 0:
+            return name
+    return MIX[-1][0]
+
+
+def _request(name, rnd, accounts, seq):
+    acc = rnd.choice(accounts)
+    req = {"id": seq, "op": name, "acc": acc, "name": "Bench", "pin": benchmark.BENCH_PIN}
+    if name in ("deposit", "withdraw", "transfer"):
+        req["amount"] = "1.00"
+        req["key"] = f"load-{os.getpid()}-{id(rnd)}-{seq}"
+    if name == "transfer":
+        a, b = rnd.sample(accounts, 2)
+        req["to"] = a if a != acc else b
+    return req
+
+
+async def terminal(host, port, accounts, ops, think_ms, seed, stats):
+    rnd = random.Random(seed)
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats["connect_errors"] += 1
+        return
+    try:
+        for seq in range(ops):
+            name = _pick(rnd)
+            req = _request(name, rnd, accounts, seq)
+            t0 = time.perf_counter()
+            writer.write(json.dumps(req).encode("utf-8") + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+            if not line:
+                stats["transport_errors"] += 1
+                return
+            stats["latencies"].append((time.perf_counter() - t0) * 1000)
+            resp = json.loads(line)
+            stats["ok" if resp.get("ok") else "business_errors"] += 1
+            if think_ms:
+                await asyncio.sleep(rnd.uniform(0, 2 * think_ms) / 1000)
+    except OSError:
+        stats["transport_errors"] += 1
+    finally:
+        writer.close()
+
+
+async def run(host, port, accounts, terminals, ops, think_ms):
+    stats = {"ok": 0, "business_errors": 0, "transport_errors": 0, "connect_errors": 0, "latencies": []}
+    t0 = time.perf_counter()
+    await asyncio.gather(*(terminal(host, port, accounts, ops, think_ms, i, stats) for i in range(terminals)))
+    return stats, time.perf_counter() - t0
+
+
+def _wait_for_port(host, port, timeout=15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def report(stats, elapsed, terminals):
+    lat = sorted(stats["latencies"])
+    done = len(lat)
+    print(f"{terminals} terminals, {done:,} requests in {elapsed:.2f}s: {done / elapsed:,.0f} req/s")
+    if lat:
+        pct = lambda q: lat[min(int(q * done), done - 1)]
+        print(f"latency ms  p50 {pct(0.50):.1f}  p95 {pct(0.95):.1f}  p99 {pct(0.99):.1f}  max {lat[-1]:.1f}")
+    print(f"ok {stats['ok']:,}  business errors {stats['business_errors']:,}  "
+          f"transport errors {stats['transport_errors']:,}  connect errors {stats['connect_errors']:,}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the teller server with simulated terminals")
+    parser.add_argument("--host", default=config.get().server.host)
+    parser.add_argument("--port", type=int, default=config.get().server.port)
+    parser.add_argument("--terminals", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=20, help="requests per terminal")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between requests")
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the BENCH accounts already there")
+    parser.add_argument("--spawn", action="store_true", help="start a server for the test")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    if args.no_seed:
+        accounts = benchmark.bench_accounts(args.accounts)
+    else:
+        accounts = benchmark.seed(storage.backend_from_config(), args.accounts)
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                "teller_server.py"),
+                                   "--host", args.host, "--port", str(args.port),
+                                   "--workers", str(args.workers), "--no-velocity"])
+        if not _wait_for_port(args.host, args.port):
+            server.terminate()
+            print("Server did not start")
+            return 1
+    try:
+        stats, elapsed = asyncio.run(run(args.host, args.port, accounts, args.terminals, args.ops, args.think_ms))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    report(stats, elapsed, args.terminals)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
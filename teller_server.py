@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import signal
+import socket
+import asyncio
+import argparse
+import multiprocessing
+
+import audit
+import config
+import storage
+import tracing
+import banking
+import velocity
+import throttle
+import async_db
+import hot_accounts
+
+
+# ==================== Teller Server ====================
+# Terminals send one JSON object per line and get one JSON object back per
+# line, in order:
+#
+#   {"id": 7, "op": "deposit", "acc": "BNK12345", "name": "Asha", "pin": "1234",
+#    "amount": "500", "key": "<idempotency key>"}
+#   {"id": 7, "ok": true, "result": "Deposit successful"}
+#   {"id": 8, "ok": false, "kind": "error", "error": "Incorrect PIN"}
+#
+# kind is "error" (BankError), "held" (PostingHeld) or "unavailable".
+# Every operation on an account, history included, needs the account's PIN.
+# Each worker process runs one asyncio loop that accepts terminals and runs
+# the operations through async_db.AsyncBank: a thread pool the size of its
+# connection pool behind an admission limit, so a burst of terminals queues
+# in the server instead of piling onto the database, and a worker that stays
+# saturated answers "unavailable" rather than queueing without bound. With
+# more than one worker the processes share the port through SO_REUSEPORT
+# (not on Windows, where one worker is used). Velocity limits are kept per
+# worker process. PIN guesses are throttled per account and per peer address
+# before they reach the pool (see throttle.py).
+#
+#   BANK_DB_BACKEND=sqlite python teller_server.py --workers 4
+#   python "final 1.py" --server 127.0.0.1:8765
+
+HOST = config.get().server.host
+PORT = config.get().server.port
+MAX_INFLIGHT = config.get().server.max_inflight     # per worker
+MAX_LINE = 64 * 1024
+
+OPS = {}
+PIN_OPS = {"deposit", "withdraw", "transfer", "balance", "history"}
+
+
+def op(name):
+    def register(fn):
+        OPS[name] = fn
+        return fn
+    return register
+
+
+@op("ping")
+def _ping(db, engine, req):
+    return "pong"
+
+
+@op("deposit")
+def _deposit(db, engine, req):
+    return banking.post(db, req["acc"], req["name"], req["pin"], req["amount"], "Deposit",
+                        key=req.get("key"), engine=engine, message=req.get("message"))
+
+
+@op("withdraw")
+def _withdraw(db, engine, req):
+    return banking.post(db, req["acc"], req["name"], req["pin"], req["amount"], "Withdraw",
+                        key=req.get("key"), engine=engine, message=req.get("message"))
+
+
+@op("transfer")
+def _transfer(db, engine, req):
+    return banking.transfer(db, req["acc"], req["name"], req["pin"], req["to"], req["amount"],
+                            key=req.get("key"), engine=engine)
+
+
+@op("balance")
+def _balance(db, engine, req):
+    return str(banking.balance(db, req["acc"], req["pin"]))
+
+
+@op("history")
+def _history(db, engine, req):
+    # Terminals are not signed in: one account at a time, behind its PIN,
+    # and never the all-account ledger of the employee page
+    return [[str(v) for v in row] for row in banking.account_history(db, req["acc"], req["pin"])]
+
+
+class Worker:
+    def __init__(self, backend, threads, max_inflight=MAX_INFLIGHT, use_velocity=True):
+        self.engine = velocity.VelocityEngine() if use_velocity else None
+        self.bank = async_db.AsyncBank(backend, threads, max_inflight, engine=self.engine)
+        self.throttle = throttle.Throttle(backend.connect) if throttle.ENABLED else None
+
+    def start(self):
+        if self.engine is not None:
+            try:
+                db = self.bank.backend.connect()
+                try:
+                    self.engine.rebuild(db, self.bank.backend)
+                finally:
+                    db.close()
+            except storage.DB_ERRORS as e:
+                print("Velocity windows not rebuilt:", e)
+        hot_accounts.Folder(self.bank.backend.connect).start()
+        if self.throttle is not None:
+            self.throttle.start()
+
+    def _run(self, db, name, req):
+        with tracing.action(f"server:{name}"):
+            return OPS[name](db, self.engine, req)
+
+    async def call(self, req, peer=None):
+        name = req.get("op")
+        if name not in OPS:
+            return {"ok": False, "kind": "error", "error": f"Unknown operation: {name}"}
+        keys = None
+        if self.throttle is not None and name in PIN_OPS:
+            keys = self.throttle.keys(account=req.get("acc"), terminal=peer)
+            try:
+                self.throttle.check(keys)
+            except throttle.Throttled as e:
+                audit.record(name, peer, req.get("acc"), str(e))
+                return {"ok": False, "kind": "error", "error": str(e)}
+        verified = None   # the PIN was right, wrong, or never checked (the token is refunded)
+        try:
+            result = await self.bank.run(self._run, name, req)
+            verified = True
+        except banking.AuthError as e:
+            verified = False
+            return {"ok": False, "kind": "error", "error": str(e)}
+        except banking.PostingHeld as e:
+            verified = True
+            return {"ok": False, "kind": "held", "error": str(e)}
+        except banking.Unavailable as e:
+            return {"ok": False, "kind": "unavailable", "error": str(e)}
+        except banking.BankError as e:
+            # e.g. "Insufficient balance" after the PIN, or a bad amount before it
+            verified = e.authenticated or None
+            return {"ok": False, "kind": "error", "error": str(e)}
+        except KeyError as e:
+            return {"ok": False, "kind": "error", "error": f"Missing field: {e.args[0]}"}
+        except Exception as e:
+            return {"ok": False, "kind": "error", "error": str(e)}
+        finally:
+            if keys:
+                self.throttle.settle(keys, verified)
+        return {"ok": True, "result": result}
+
+    async def handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        peer = peer[0] if isinstance(peer, tuple) else None
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    break   # line longer than MAX_LINE
+                if not line:
+                    break
+                try:
+                    req = json.loads(line)
+                    if not isinstance(req, dict):
+                        raise ValueError("request must be an object")
+                except ValueError as e:
+                    resp = {"ok": False, "kind": "error", "error": f"Bad request: {e}"}
+                else:
+                    resp = await self.call(req, peer)
+                    resp["id"] = req.get("id")
+                writer.write(json.dumps(resp, default=str).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(host, port, threads, reuse_port, max_inflight, use_velocity):
+    # Each worker opens its own connections: nothing DB-related crosses a fork
+    backend = storage.backend_from_config()
+    if backend.pool:
+        threads = backend.pool.size
+    worker = Worker(backend, threads, max_inflight, use_velocity)
+    worker.start()
+    server = await asyncio.start_server(worker.handle, host, port, limit=MAX_LINE,
+                                        reuse_port=reuse_port or None)
+    print(f"Teller worker {os.getpid()} listening on {host}:{port} ({threads} DB threads)")
+    async with server:
+        await server.serve_forever()
+
+
+def _worker_main(host, port, threads, reuse_port, max_inflight, use_velocity):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # the parent handles Ctrl+C
+    asyncio.run(_serve(host, port, threads, reuse_port, max_inflight, use_velocity))
+
+
+def serve(host=HOST, port=PORT, workers=1, threads=8, max_inflight=MAX_INFLIGHT, use_velocity=True):
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        print("SO_REUSEPORT not available: running a single worker")
+        workers = 1
+    if workers == 1:
+        try:
+            asyncio.run(_serve(host, port, threads, False, max_inflight, use_velocity))
+        except KeyboardInterrupt:
+            pass
+        return
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))   # so the finally below stops the workers
+    procs = [multiprocessing.Process(target=_worker_main, daemon=True,
+                                     args=(host, port, threads, True, max_inflight, use_velocity))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs:
+            p.terminate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the teller application server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=8,
+                        help="DB threads per worker when BANK_DB_POOL_SIZE=0")
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT)
+    parser.add_argument("--no-velocity", action="store_true", help="skip the velocity checks (benchmarks)")
+    args = parser.parse_args(argv)
+    use_velocity = config.get().features.velocity_checks and not args.no_velocity
+    serve(args.host, args.port, args.workers, args.threads, args.max_inflight, use_velocity)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
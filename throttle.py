@@ -0,0 +1,251 @@
+import time
+import threading
+
+import config
+import storage
+import banking
+
+
+# ==================== Login Throttling ====================
+# PIN and password attempts are limited by token buckets per account, per
+# email and per terminal. An attempt takes a token from its account or
+# email bucket and gets it back if the credentials were right; a terminal
+# (which may serve many customers at once) only pays for failed attempts.
+# An empty bucket or an active lockout rejects the attempt in memory,
+# before any DB round-trip, so a credential-stuffing burst costs the
+# database nothing once it is throttled.
+#
+# `attempts` failures in a row on one key lock it out for lock_seconds,
+# twice as long on each further lockout (up to max_lock_seconds). Lockouts
+# are written to login_lockouts by a background thread and read back every
+# REFRESH_SECONDS, so they survive a restart and every terminal and teller
+# server worker honours the others'.
+#
+#   limiter = Throttle(storage.connect).start()
+#   keys = limiter.keys(account=acc, terminal=peer)
+#   limiter.check(keys)          # raises Throttled
+#   ... verify the PIN ...
+#   limiter.failed(keys) or limiter.succeeded(keys), or limiter.refund(keys)
+#   when the attempt never got as far as the PIN check
+
+_cfg = config.get().throttle
+ENABLED = _cfg.enabled
+LOCK_SECONDS = _cfg.lock_seconds
+MAX_LOCK_SECONDS = _cfg.max_lock_seconds
+LEVEL_RESET_SECONDS = 24 * 3600   # a day without a lockout and the next one starts short again
+REFRESH_SECONDS = 30.0
+MAX_KEYS = 100000
+
+# key kind -> (bucket size, seconds per token, failures in a row before a lockout)
+RULES = {
+    "account": (_cfg.attempts, _cfg.refill_seconds, _cfg.attempts),
+    "email": (_cfg.attempts, _cfg.refill_seconds, _cfg.attempts),
+    "terminal": (_cfg.terminal_attempts, _cfg.terminal_refill_seconds, _cfg.terminal_attempts),
+}
+
+
+class Throttled(banking.BankError):
+    pass
+
+
+class _Key:
+    __slots__ = ("tokens", "stamp", "strikes", "locked_until", "level")
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.stamp = now
+        self.strikes = 0
+        self.locked_until = 0.0
+        self.level = 0
+
+
+class Throttle:
+    # check/failed/succeeded only touch memory; start() adds the thread that
+    # saves and loads lockouts through connect
+    def __init__(self, connect=None, rules=None, clock=time.time):
+        self.connect = connect
+        self.rules = rules or RULES
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = {}          # "kind:value" -> _Key
+        self.unsaved = {}        # key -> (locked_until, level)
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.rejected = 0
+
+    @staticmethod
+    def keys(account=None, email=None, terminal=None):
+        keys = []
+        if account:
+            keys.append(f"account:{account}")
+        if email:
+            keys.append(f"email:{email.strip().lower()}")
+        if terminal:
+            keys.append(f"terminal:{terminal}")
+        return keys
+
+    def _rule(self, key):
+        return self.rules[key.split(":", 1)[0]]
+
+    def _get(self, key, now):
+        st = self.state.get(key)
+        if st is None:
+            if len(self.state) >= MAX_KEYS:
+                self._prune(now)
+            st = self.state[key] = _Key(self._rule(key)[0], now)
+            return st
+        size, per_token, _ = self._rule(key)
+        st.tokens = min(size, st.tokens + (now - st.stamp) / per_token)
+        st.stamp = now
+        return st
+
+    def _prune(self, now):
+        # Forgets keys with no lockout, no failures and a bucket that has refilled
+        for key in [k for k, st in self.state.items()
+                    if st.locked_until <= now and not st.strikes
+                    and st.tokens + (now - st.stamp) / self._rule(k)[1] >= self._rule(k)[0]]:
+            del self.state[key]
+
+    # -------------------- Attempts --------------------
+    def check(self, keys):
+        # Reserves the account/email tokens, or none if any key is throttled
+        now = self.clock()
+        with self.lock:
+            states = [(k, self._get(k, now)) for k in keys]
+            for key, st in states:
+                wait = st.locked_until - now
+                if wait <= 0 and st.tokens < 1:
+                    wait = (1 - st.tokens) * self._rule(key)[1]
+                if wait > 0:
+                    self.rejected += 1
+                    raise Throttled(f"Too many attempts. Try again in {int(wait) + 1} seconds")
+            for key, st in states:
+                if not key.startswith("terminal:"):
+                    st.tokens -= 1
+
+    def failed(self, keys):
+        now = self.clock()
+        with self.lock:
+            for key in keys:
+                st = self._get(key, now)
+                if key.startswith("terminal:"):
+                    st.tokens = max(st.tokens - 1, 0)
+                st.strikes += 1
+                if st.strikes < self._rule(key)[2]:
+                    continue
+                if st.locked_until and now - st.locked_until > LEVEL_RESET_SECONDS:
+                    st.level = 0
+                st.level += 1
+                st.strikes = 0
+                st.locked_until = now + min(LOCK_SECONDS * 2 ** (st.level - 1), MAX_LOCK_SECONDS)
+                self.unsaved[key] = (st.locked_until, st.level)
+        if self.unsaved:
+            self.wake.set()
+
+    def succeeded(self, keys):
+        # The credentials were right: the failure streak ends and the
+        # reserved tokens come back
+        now = self.clock()
+        with self.lock:
+            for key in keys:
+                st = self._get(key, now)
+                st.strikes = 0
+                if not key.startswith("terminal:"):
+                    st.tokens = min(self._rule(key)[0], st.tokens + 1)
+
+    def refund(self, keys):
+        # The attempt ended before the credentials were checked (bad input,
+        # database unreachable, server overloaded): only the tokens come back
+        now = self.clock()
+        with self.lock:
+            for key in keys:
+                if not key.startswith("terminal:"):
+                    st = self._get(key, now)
+                    st.tokens = min(self._rule(key)[0], st.tokens + 1)
+
+    def settle(self, keys, verified):
+        # verified: True (credentials right), False (wrong), None (not checked)
+        if verified:
+            self.succeeded(keys)
+        elif verified is False:
+            self.failed(keys)
+        else:
+            self.refund(keys)
+
+    # -------------------- Persistence --------------------
+    def save(self, db):
+        with self.lock:
+            locked, self.unsaved = self.unsaved, {}
+        if not locked:
+            return 0
+        cur = db.cursor()
+        try:
+            cur.executemany("DELETE FROM login_lockouts WHERE lock_key=%s", [(k,) for k in locked])
+            cur.executemany("INSERT INTO login_lockouts(lock_key, locked_until, level) VALUES (%s,%s,%s)",
+                            [(k, int(until) + 1, level) for k, (until, level) in locked.items()])
+            db.commit()
+        except BaseException:
+            db.rollback()
+            with self.lock:
+                for k, v in locked.items():
+                    self.unsaved.setdefault(k, v)
+            raise
+        return len(locked)
+
+    def load(self, db):
+        # Takes over lockouts from other processes and from before a restart
+        now = self.clock()
+        cur = db.cursor()
+        cur.execute("SELECT lock_key, locked_until, level FROM login_lockouts WHERE locked_until > %s",
+                    (int(now),))
+        rows = cur.fetchall()
+        db.commit()
+        with self.lock:
+            for key, until, level in rows:
+                if key.split(":", 1)[0] not in self.rules:
+                    continue
+                st = self._get(key, now)
+                if until > st.locked_until:
+                    st.locked_until = float(until)
+                    st.level = max(st.level, level)
+        return len(rows)
+
+    def purge(self, db):
+        # Lockouts that ended long enough ago no longer raise the next level
+        cur = db.cursor()
+        cur.execute("DELETE FROM login_lockouts WHERE locked_until < %s", (int(self.clock() - LEVEL_RESET_SECONDS),))
+        db.commit()
+        return cur.rowcount
+
+    def _sync(self):
+        try:
+            db = self.connect()
+            try:
+                self.save(db)
+                self.load(db)
+            finally:
+                db.close()
+        except storage.DB_ERRORS as e:
+            print("Lockouts not synced:", e)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self._sync()
+            self.wake.wait(REFRESH_SECONDS)
+            self.wake.clear()
+        self._sync()
+
+    def start(self):
+        if self.connect is not None and self.thread is None:
+            self._sync()
+            self.thread = threading.Thread(target=self._run, name="login-throttle", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.wake.set()
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,245 @@
+import os
+import re
+import json
+import time
+import bisect
+import functools
+import threading
+
+import config
+from storage import ConnectionWrapper
+
+
+# ==================== Query Tracing ====================
+# Every DB call made through a traced connection is timed and attributed to
+# the BankApp action that issued it (transfer_money, view_transactions, ...).
+# Timings go into fixed-bucket histograms; statements slower than the
+# threshold are appended to the slow-query log. Parameters are never logged
+# because they carry PINs and passwords.
+
+_cfg = config.get().tracing
+SLOW_QUERY_MS = _cfg.slow_query_ms
+SLOW_QUERY_LOG = _cfg.slow_query_log
+METRICS_PATH = _cfg.metrics_path or None   # *.json or Prometheus text
+METRICS_INTERVAL_MS = _cfg.metrics_interval_ms
+
+BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+_local = threading.local()
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += ms
+        self.count += 1
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100.0
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float("inf")
+        return float("inf")
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total, 3),
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "buckets": {str(le): c for le, c in zip(BUCKETS_MS + ["+Inf"], self.counts)},
+        }
+
+
+query_hist = {}     # action -> Histogram of single DB calls
+action_hist = {}    # action -> Histogram of whole actions
+db_time_hist = {}   # action -> Histogram of DB time spent inside an action
+slow_queries = 0
+
+
+def _observe(table, key, ms):
+    with _lock:
+        h = table.get(key)
+        if h is None:
+            h = table[key] = Histogram()
+        h.observe(ms)
+
+
+def thread_db_ms():
+    # Cumulative DB time of the calling thread, for callers that diff it
+    return getattr(_local, "total_db_ms", 0.0)
+
+
+def current_action():
+    return getattr(_local, "action", None) or "unattributed"
+
+
+# ==================== Actions ====================
+class action:
+    # Usable as a context manager; nested actions keep the outer name
+    def __init__(self, name):
+        self.name = name
+        self.outer = False
+
+    def __enter__(self):
+        if getattr(_local, "action", None) is None:
+            self.outer = True
+            _local.action = self.name
+            _local.db_ms = 0.0
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.outer:
+            ms = (time.perf_counter() - self.t0) * 1000
+            _observe(action_hist, self.name, ms)
+            _observe(db_time_hist, self.name, _local.db_ms)
+            _local.action = None
+        return False
+
+
+def traced(fn):
+    # Decorator for BankApp methods: the method name becomes the action
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with action(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def record_query(sql, ms):
+    global slow_queries
+    name = current_action()
+    _observe(query_hist, name, ms)
+    if getattr(_local, "action", None) is not None:
+        _local.db_ms += ms
+    _local.total_db_ms = getattr(_local, "total_db_ms", 0.0) + ms
+    if ms >= SLOW_QUERY_MS:
+        with _lock:
+            slow_queries += 1
+        entry = {"ts": time.time(), "action": name, "ms": round(ms, 3), "sql": _compact(sql)}
+        with _log_lock:
+            with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+_ws = re.compile(r"\s+")
+
+
+def _compact(sql):
+    return _ws.sub(" ", sql).strip()
+
+
+# ==================== Traced connections ====================
+class TracedCursor:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __getattr__(self, item):
+        return getattr(self.raw, item)
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def execute(self, sql, params=()):
+        t0 = time.perf_counter()
+        try:
+            return self.raw.execute(sql, params)
+        finally:
+            record_query(sql, (time.perf_counter() - t0) * 1000)
+
+    def executemany(self, sql, seq):
+        t0 = time.perf_counter()
+        try:
+            return self.raw.executemany(sql, seq)
+        finally:
+            record_query(sql, (time.perf_counter() - t0) * 1000)
+
+
+class TracedConnection(ConnectionWrapper):
+    def cursor(self, **kwargs):
+        return TracedCursor(self.raw.cursor(**kwargs))
+
+    def commit(self):
+        t0 = time.perf_counter()
+        try:
+            self.raw.commit()
+        finally:
+            record_query("COMMIT", (time.perf_counter() - t0) * 1000)
+
+
+def connect(factory):
+    t0 = time.perf_counter()
+    try:
+        db = factory()
+    finally:
+        record_query("CONNECT", (time.perf_counter() - t0) * 1000)
+    return TracedConnection(db)
+
+
+# ==================== Export ====================
+def snapshot():
+    with _lock:
+        return {
+            "generated_at": time.time(),
+            "slow_query_ms": SLOW_QUERY_MS,
+            "slow_queries": slow_queries,
+            "queries": {k: h.to_dict() for k, h in query_hist.items()},
+            "actions": {k: h.to_dict() for k, h in action_hist.items()},
+            "action_db_time": {k: h.to_dict() for k, h in db_time_hist.items()},
+        }
+
+
+def to_prometheus():
+    lines = []
+    with _lock:
+        for metric, table in (("bank_db_query_seconds", query_hist),
+                              ("bank_action_seconds", action_hist),
+                              ("bank_action_db_seconds", db_time_hist)):
+            lines.append(f"# TYPE {metric} histogram")
+            for name, h in sorted(table.items()):
+                cumulative = 0
+                for le, c in zip(BUCKETS_MS + ["+Inf"], h.counts):
+                    cumulative += c
+                    le_s = le if le == "+Inf" else f"{le / 1000:g}"
+                    lines.append(f'{metric}_bucket{{action="{name}",le="{le_s}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{action="{name}"}} {h.total / 1000:.6f}')
+                lines.append(f'{metric}_count{{action="{name}"}} {h.count}')
+        lines.append("# TYPE bank_slow_queries_total counter")
+        lines.append(f"bank_slow_queries_total {slow_queries}")
+    return "\n".join(lines) + "\n"
+
+
+def dump(path):
+    # .json gets the full snapshot, anything else Prometheus text format
+    if path.endswith(".json"):
+        data = json.dumps(snapshot(), indent=2)
+    else:
+        data = to_prometheus()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def reset():
+    global slow_queries
+    with _lock:
+        query_hist.clear()
+        action_hist.clear()
+        db_time_hist.clear()
+        slow_queries = 0
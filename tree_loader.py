@@ -0,0 +1,98 @@
+import config
+
+
+# ==================== Batched Treeview Loading ====================
+# Filling a ttk.Treeview row by row in one blocking loop freezes the window
+# for large result sets. TreeLoader inserts in chunks scheduled with
+# after_idle so the UI keeps handling events between chunks, clears old
+# rows with one bulk delete, and reuses item IDs on refresh: rows whose key
+# is already shown are updated in place and only new rows are inserted.
+
+class TreeLoader:
+    def __init__(self, tree, key=None, chunk_size=None, on_progress=None, on_done=None):
+        self.tree = tree
+        self.key = key
+        self.chunk_size = chunk_size or config.get().cache.tree_chunk_size
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.job = None
+        self.rows = []
+        self.iids = []
+        self.pos = 0
+
+    def cancel(self):
+        if self.job is not None:
+            try:
+                self.tree.after_cancel(self.job)
+            except Exception:
+                pass
+            self.job = None
+
+    def clear(self):
+        self.cancel()
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+
+    def load(self, rows):
+        self.cancel()
+        self.rows = rows
+        tree = self.tree
+        existing = tree.get_children()
+
+        if self.key is None:
+            if existing:
+                tree.delete(*existing)
+            self.pos = 0
+        else:
+            iids = [str(self.key(r)) for r in rows]
+            self.iids = iids
+            n = len(existing)
+            if n and tuple(iids[:n]) == existing:
+                # Refresh of the same list (maybe grown): update values in place
+                for iid, row in zip(existing, rows):
+                    tree.item(iid, values=row)
+                self.pos = n
+            else:
+                if existing:
+                    tree.delete(*existing)
+                self.pos = 0
+
+        self._report()
+        if self.pos < len(rows):
+            self.job = tree.after_idle(self._step)
+        else:
+            self._finish()
+
+    def _step(self):
+        self.job = None
+        tree = self.tree
+        if not tree.winfo_exists():
+            return
+        rows = self.rows
+        end = min(self.pos + self.chunk_size, len(rows))
+        if self.key is None:
+            for i in range(self.pos, end):
+                tree.insert("", "end", values=rows[i])
+        else:
+            iids = self.iids
+            for i in range(self.pos, end):
+                tree.insert("", "end", iid=iids[i], values=rows[i])
+        self.pos = end
+        self._report()
+        if end < len(rows):
+            self.job = tree.after_idle(self._step)
+        else:
+            self._finish()
+
+    def _report(self):
+        if self.on_progress:
+            self.on_progress(self.pos, len(self.rows))
+
+    def _finish(self):
+        if self.on_done:
+            self.on_done(len(self.rows))
+
+    @property
+    def busy(self):
+        return self.job is not None
@@ -0,0 +1,213 @@
+import time
+import threading
+from array import array
+from decimal import Decimal
+
+import storage
+
+
+# ==================== Velocity Checks ====================
+# In-process counters of how often and how much money leaves each account
+# over the last minute, hour and day. Each window is a ring of fixed-width
+# buckets with running totals, so a check reads three numbers and a record
+# touches three buckets: O(1), no DB round-trip. The windows are rebuilt
+# from the last 24h of transactions on startup.
+#
+# A debit that passes check() is counted at once, under the same lock, so
+# concurrent postings cannot all slip under one limit. The caller then
+# either confirm()s the decision after its commit or release()s it after a
+# rollback.
+
+# name, number of buckets, bucket width in seconds
+WINDOWS = (("1m", 60, 1), ("1h", 60, 60), ("24h", 96, 900))
+
+# Debit limits per window: (max postings, max amount in rupees)
+LIMITS = {
+    "1m": (5, Decimal("50000")),
+    "1h": (20, Decimal("200000")),
+    "24h": (50, Decimal("500000")),
+}
+
+# Transfers to an account never paid before are held at or above this amount
+NEW_PAYEE_HOLD_AMOUNT = Decimal("25000")
+
+DEBIT_TYPES = ("Withdraw", "Transfer Out")
+
+ALLOW, HOLD, REJECT = "allow", "hold", "reject"
+
+
+def _paise(amount):
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+class Decision:
+    __slots__ = ("action", "reason", "new_payee", "reserved")
+
+    def __init__(self, action=ALLOW, reason="", new_payee=False, reserved=None):
+        self.action = action
+        self.reason = reason
+        self.new_payee = new_payee
+        self.reserved = reserved   # (acc, ts, paise, payee) counted by check()
+
+    @property
+    def allowed(self):
+        return self.action == ALLOW
+
+
+class RingWindow:
+    __slots__ = ("buckets", "width", "head", "count", "total", "counts", "sums")
+
+    def __init__(self, buckets, width):
+        self.buckets = buckets
+        self.width = width
+        self.head = 0          # newest bucket number seen
+        self.count = 0         # running totals over the live buckets
+        self.total = 0
+        self.counts = array("q", bytes(8 * buckets))
+        self.sums = array("q", bytes(8 * buckets))
+
+    def _advance(self, bucket):
+        if bucket <= self.head:
+            return
+        steps = min(bucket - self.head, self.buckets)
+        for k in range(1, steps + 1):
+            slot = (self.head + k) % self.buckets
+            self.count -= self.counts[slot]
+            self.total -= self.sums[slot]
+            self.counts[slot] = 0
+            self.sums[slot] = 0
+        self.head = bucket
+
+    def add(self, ts, paise):
+        bucket = int(ts // self.width)
+        self._advance(bucket)
+        if bucket <= self.head - self.buckets:
+            return  # older than the window
+        slot = bucket % self.buckets
+        self.counts[slot] += 1
+        self.sums[slot] += paise
+        self.count += 1
+        self.total += paise
+
+    def remove(self, ts, paise):
+        # Takes back an add() whose bucket is still in the window
+        bucket = int(ts // self.width)
+        if bucket <= self.head - self.buckets:
+            return
+        slot = bucket % self.buckets
+        self.counts[slot] -= 1
+        self.sums[slot] -= paise
+        self.count -= 1
+        self.total -= paise
+
+    def totals(self, now):
+        self._advance(int(now // self.width))
+        return self.count, self.total
+
+
+class VelocityEngine:
+    def __init__(self, limits=None, new_payee_hold=NEW_PAYEE_HOLD_AMOUNT, clock=time.time):
+        self.limits = {name: (count, _paise(amount)) for name, (count, amount) in (limits or LIMITS).items()}
+        self.new_payee_hold = _paise(new_payee_hold)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.windows = {}   # account_no -> [RingWindow per WINDOWS entry]
+        self.payees = {}    # account_no -> set of payee account numbers
+
+    def _windows(self, acc):
+        w = self.windows.get(acc)
+        if w is None:
+            w = self.windows[acc] = [RingWindow(n, width) for _, n, width in WINDOWS]
+        return w
+
+    def check(self, acc, op, amount, payee=None):
+        if op not in DEBIT_TYPES:
+            return Decision()
+        paise = _paise(amount)
+        now = self.clock()
+        with self.lock:
+            windows = self._windows(acc)
+            for (name, _, _), window in zip(WINDOWS, windows):
+                limit = self.limits.get(name)
+                if not limit:
+                    continue
+                count, total = window.totals(now)
+                if count + 1 > limit[0]:
+                    return Decision(REJECT, f"Too many debits in the last {name} (limit {limit[0]})")
+                if total + paise > limit[1]:
+                    return Decision(REJECT, f"Debit limit of ₹{limit[1] / 100:.2f} per {name} exceeded")
+            new_payee = payee is not None and payee not in self.payees.get(acc, ())
+            if new_payee and paise >= self.new_payee_hold:
+                return Decision(HOLD, f"First transfer to {payee} at or above ₹{self.new_payee_hold / 100:.2f}",
+                                True)
+            for window in windows:
+                window.add(now, paise)
+        return Decision(new_payee=new_payee, reserved=(acc, now, paise, payee))
+
+    def confirm(self, decision):
+        # The posting committed: the amount already counts, the payee is now known
+        if decision is None or decision.reserved is None:
+            return
+        acc, _, _, payee = decision.reserved
+        decision.reserved = None
+        if payee is not None:
+            with self.lock:
+                self.payees.setdefault(acc, set()).add(payee)
+
+    def release(self, decision):
+        # The posting rolled back: stop counting what check() reserved
+        if decision is None or decision.reserved is None:
+            return
+        acc, ts, paise, _ = decision.reserved
+        decision.reserved = None
+        with self.lock:
+            for window in self._windows(acc):
+                window.remove(ts, paise)
+
+    def record(self, acc, op, amount, payee=None, ts=None):
+        if op not in DEBIT_TYPES:
+            return
+        ts = self.clock() if ts is None else ts
+        paise = _paise(amount)
+        with self.lock:
+            for window in self._windows(acc):
+                window.add(ts, paise)
+            if payee is not None:
+                self.payees.setdefault(acc, set()).add(payee)
+
+    # -------------------- Startup --------------------
+    def rebuild(self, db, backend=None):
+        cur = db.cursor()
+        since = self.clock() - max(n * width for _, n, width in WINDOWS)
+        cur.execute("""
+            SELECT account_no, txn_type, amount, txn_date
+            FROM transactions
+            WHERE txn_date >= %s AND txn_type IN ('Withdraw', 'Transfer Out')
+            ORDER BY txn_date, txn_id
+        """, (storage.epoch_to_db_time(since, backend),))
+        with self.lock:
+            self.windows.clear()
+        loaded = 0
+        for acc, op, amount, txn_date in cur.fetchall():
+            self.record(acc, op, amount, ts=storage.db_time_to_epoch(txn_date, backend))
+            loaded += 1
+        cur.execute("SELECT account_no, payee_no FROM payees")
+        payees = {}
+        for acc, payee in cur.fetchall():
+            payees.setdefault(acc, set()).add(payee)
+        with self.lock:
+            self.payees = payees
+        return loaded
+
+
+def remember_payee(cur, acc, payee):
+    # IGNORE: two first transfers to the same payee may race here
+    cur.execute("INSERT IGNORE INTO payees(account_no, payee_no) VALUES (%s,%s)", (acc, payee))
+
+
+def hold_posting(cur, acc, op, amount, payee, reason):
+    # Pending until released or rejected (see held_postings.py)
+    cur.execute("""
+        INSERT INTO held_postings(account_no, txn_type, amount, payee, reason)
+        VALUES (%s,%s,%s,%s,%s)
+    """, (acc, op, amount, payee, reason[:100]))